@@ -1,17 +1,36 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Header
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.requests import Request as HTTPRequest
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import DeleteMany, UpdateOne, UpdateMany, ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 import os
+import re
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import Callable, List, Optional
 import uuid
+import base64
+import hashlib
+import io
+import csv
+import itertools
+import math
+from collections import Counter, OrderedDict, deque
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
@@ -30,9 +49,209 @@ MANAGER_REGISTER_PASSWORD = "hbt17975"
 
 security = HTTPBearer()
 
+# CPU-heavy work (Excel reports, thumbnails) runs in a process pool so it never blocks the event loop
+REPORTS_DIR = Path(os.environ.get('REPORTS_DIR', ROOT_DIR / 'reports'))
+PROCESS_WORKERS = int(os.environ.get('PROCESS_WORKERS', '2'))
+process_executor = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+background_tasks = set()
+
+# In-flight report jobs older than this are assumed lost (crash or restart) and are not reused;
+# reports without an end date are only reused within the same cache bucket
+REPORT_JOB_TIMEOUT_MINUTES = int(os.environ.get('REPORT_JOB_TIMEOUT_MINUTES', '30'))
+REPORT_OPEN_RANGE_CACHE_MINUTES = int(os.environ.get('REPORT_OPEN_RANGE_CACHE_MINUTES', '15'))
+
+# Uploads are streamed into GridFS in chunks and deduplicated by SHA-256
+UPLOAD_CHUNK_BYTES = 256 * 1024
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(25 * 1024 * 1024)))
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', '320'))
+
+# Vehicle imports are parsed, validated and written in chunks of this many rows
+VEHICLE_IMPORT_CHUNK_ROWS = int(os.environ.get('VEHICLE_IMPORT_CHUNK_ROWS', '1000'))
+
+# Coverage grid resolution around the stations' bounding box
+COVERAGE_CELL_KM = float(os.environ.get('COVERAGE_CELL_KM', '0.5'))
+COVERAGE_MARGIN_KM = float(os.environ.get('COVERAGE_MARGIN_KM', '5'))
+COVERAGE_MAX_CELLS = int(os.environ.get('COVERAGE_MAX_CELLS', '40000'))
+
+# Live vehicle positions: grid cell size for the in-memory index and history downsampling
+POSITION_GRID_CELL_DEG = float(os.environ.get('POSITION_GRID_CELL_DEG', '0.01'))
+POSITION_HISTORY_INTERVAL_SECONDS = int(os.environ.get('POSITION_HISTORY_INTERVAL_SECONDS', '60'))
+
+# Raw odometer points are dropped from their daily buckets after this many days
+ODOMETER_RAW_RETENTION_DAYS = int(os.environ.get('ODOMETER_RAW_RETENTION_DAYS', '90'))
+
+# Maintenance predictions use the km accrual rate over this window and are refreshed on this cadence
+MAINTENANCE_RATE_WINDOW_DAYS = int(os.environ.get('MAINTENANCE_RATE_WINDOW_DAYS', '30'))
+MAINTENANCE_REFRESH_SECONDS = int(os.environ.get('MAINTENANCE_REFRESH_SECONDS', '60'))
+
+# Open-fault counters on vehicles are rebuilt from the faults collection on this interval
+FAULT_COUNTER_RECONCILE_HOURS = float(os.environ.get('FAULT_COUNTER_RECONCILE_HOURS', '24'))
+
+# Assignment writes hold a per-vehicle and per-driver lock document for at most this long
+ASSIGNMENT_LOCK_SECONDS = int(os.environ.get('ASSIGNMENT_LOCK_SECONDS', '30'))
+ASSIGNMENT_LOCK_WAIT_SECONDS = 5.0
+# A roster left "applying" this long by a worker that died mid-apply may be applied again
+ROSTER_APPLY_LEASE_SECONDS = int(os.environ.get('ROSTER_APPLY_LEASE_SECONDS', '300'))
+
+# A new report this similar to an open fault on the same vehicle is linked to it instead of inserted
+DUPLICATE_FAULT_SIMILARITY = float(os.environ.get('DUPLICATE_FAULT_SIMILARITY', '0.6'))
+
+# Claimed faults leave the triage queue for this long unless the lease is renewed
+FAULT_LEASE_SECONDS = int(os.environ.get('FAULT_LEASE_SECONDS', '900'))
+
+# Read notifications expire after NOTIFICATION_READ_RETENTION_DAYS; unread ones older than
+# NOTIFICATION_ARCHIVE_DAYS move to the compressed archive in batches
+NOTIFICATION_READ_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_READ_RETENTION_DAYS', '30'))
+NOTIFICATION_ARCHIVE_DAYS = int(os.environ.get('NOTIFICATION_ARCHIVE_DAYS', '90'))
+NOTIFICATION_ARCHIVE_BATCH = 1000
+
+# Responses to requests carrying an Idempotency-Key are kept this long; recent ones are also cached in memory
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024'))
+# A request still in progress after this long is assumed to have crashed, and a retry may take it over
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '120'))
+
+# Dashboard snapshots are materialized on this interval and kept for the retention period
+DASHBOARD_SNAPSHOT_INTERVAL_HOURS = float(os.environ.get('DASHBOARD_SNAPSHOT_INTERVAL_HOURS', '24'))
+DASHBOARD_SNAPSHOT_RETENTION_DAYS = int(os.environ.get('DASHBOARD_SNAPSHOT_RETENTION_DAYS', '400'))
+
+# Derived fault analytics, cleared whenever faults or vehicles change
+analytics_cache = {}
+
+# Vehicles whose maintenance predictions need recomputing
+maintenance_dirty = set()
+
+class IdempotencyCache:
+    """Small LRU of completed idempotent responses in front of the idempotency_keys collection."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        created_at = entry['created_at'].replace(tzinfo=timezone.utc)
+        if created_at + timedelta(hours=IDEMPOTENCY_TTL_HOURS) < datetime.now(timezone.utc):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+
+def idempotency_user(request: HTTPRequest) -> Optional[str]:
+    """The user id in the request's bearer token, or None when it has no valid token."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]).get('user_id')
+    except jwt.PyJWTError:
+        return None
+
+class IdempotentRoute(APIRoute):
+    """POST and PUT routes that replay the stored response when an Idempotency-Key is sent again.
+
+    Keys are scoped to the caller's user id, method and path, so requests without a valid token
+    are not deduplicated. A retry with the same key gets the first response back without the
+    handler running again.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not self.methods & {"POST", "PUT"}:
+            return handler
+
+        async def idempotent_handler(request: HTTPRequest) -> Response:
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                return await handler(request)
+            if len(key) > 255:
+                raise HTTPException(status_code=400, detail="Idempotency-Key en fazla 255 karakter olabilir")
+            user_id = idempotency_user(request)
+            if user_id is None:
+                return await handler(request)
+            scope = f"{user_id}|{request.method}|{request.url.path}|{key}"
+            cache_key = hashlib.sha256(scope.encode()).hexdigest()
+            # The query string is always part of the fingerprint; multipart uploads are streamed, so
+            # only JSON bodies are
+            fingerprint = hashlib.sha256(request.url.query.encode())
+            if request.headers.get("content-type", "").startswith("application/json"):
+                fingerprint.update(b"\n" + await request.body())
+            fingerprint = fingerprint.hexdigest()
+
+            entry = idempotency_cache.get(cache_key) or await db.idempotency_keys.find_one({"key": cache_key}, {"_id": 0})
+            created_at = datetime.now(timezone.utc)
+            attempt = str(uuid.uuid4())
+            if entry:
+                if entry.get('fingerprint') != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key farklı bir istekle yeniden kullanıldı")
+                if entry['status'] == "completed":
+                    idempotency_cache.put(cache_key, entry)
+                    return Response(
+                        content=entry['body'],
+                        status_code=entry['status_code'],
+                        media_type=entry.get('media_type'),
+                        headers={"Idempotent-Replayed": "true"}
+                    )
+                started_at = entry.get('started_at', entry['created_at']).replace(tzinfo=timezone.utc)
+                if started_at + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS) > created_at:
+                    raise HTTPException(status_code=409, detail="Aynı istek hâlâ işleniyor")
+                # The earlier attempt's lease ran out; only one retry may take it over
+                taken = await db.idempotency_keys.update_one(
+                    {"key": cache_key, "status": "in_progress", "attempt": entry.get('attempt')},
+                    {"$set": {"attempt": attempt, "started_at": created_at}}
+                )
+                if not taken.modified_count:
+                    raise HTTPException(status_code=409, detail="Aynı istek hâlâ işleniyor")
+            else:
+                try:
+                    await db.idempotency_keys.insert_one({
+                        "key": cache_key, "status": "in_progress", "fingerprint": fingerprint, "attempt": attempt,
+                        "started_at": created_at, "created_at": created_at,
+                    })
+                except DuplicateKeyError:
+                    raise HTTPException(status_code=409, detail="Aynı istek hâlâ işleniyor")
+
+            # A record taken over by a later retry belongs to that retry, so writes are keyed by attempt
+            owned = {"key": cache_key, "attempt": attempt}
+            try:
+                response = await handler(request)
+            except BaseException:
+                # Failed attempts are not recorded, so the client may retry with the same key
+                await db.idempotency_keys.delete_one(owned)
+                raise
+            body = getattr(response, "body", None)
+            if body is None or response.status_code >= 500:
+                await db.idempotency_keys.delete_one(owned)
+                return response
+
+            entry = {
+                "key": cache_key,
+                "status": "completed",
+                "fingerprint": fingerprint,
+                "status_code": response.status_code,
+                "media_type": response.headers.get("content-type"),
+                "body": bytes(body),
+                "created_at": created_at,
+            }
+            if (await db.idempotency_keys.replace_one(owned, entry)).matched_count:
+                idempotency_cache.put(cache_key, entry)
+            return response
+
+        return idempotent_handler
+
 # Create the main app
 app = FastAPI()
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=IdempotentRoute)
 
 # Enums
 class UserRole(str, Enum):
@@ -65,6 +284,22 @@ class RequestStatus(str, Enum):
     APPROVED = "approved"
     REJECTED = "rejected"
 
+class RollupGranularity(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class ReportJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class RosterStatus(str, Enum):
+    PROPOSED = "proposed"
+    APPLYING = "applying"
+    APPLIED = "applied"
+
 # Models
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -76,6 +311,8 @@ class User(BaseModel):
     sicil_no: Optional[str] = None
     phone: Optional[str] = None
     photo_url: Optional[str] = None
+    certified_vehicle_types: Optional[List[VehicleType]] = None  # None: may drive any type
+    unread_notifications: int = 0
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class UserCreate(BaseModel):
@@ -126,6 +363,23 @@ class MaintenanceRecord(BaseModel):
     next_maintenance_date: Optional[str] = None
     next_maintenance_km: Optional[int] = None
 
+class VehicleEquipment(Equipment):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    vehicle_id: str
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class MaintenanceEvent(MaintenanceRecord):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    vehicle_id: str
+    station_id: Optional[str] = None
+    recorded_by: str
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class MaintenanceEventCreate(MaintenanceRecord):
+    vehicle_id: str
+
 class AccidentRecord(BaseModel):
     date: str
     location: str
@@ -133,6 +387,12 @@ class AccidentRecord(BaseModel):
     description: str
     photos: List[str] = []
 
+class VehicleAccident(AccidentRecord):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    vehicle_id: str
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
 class Vehicle(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -152,6 +412,8 @@ class Vehicle(BaseModel):
     last_oil_change_km: Optional[int] = None
     next_oil_change_date: Optional[str] = None
     next_oil_change_km: Optional[int] = None
+    last_inspection_date: Optional[str] = None
+    open_fault_count: int = 0
     equipment: List[Equipment] = []
     accident_records: List[AccidentRecord] = []
     photos: List[str] = []
@@ -224,6 +486,12 @@ class FaultTypeCreate(BaseModel):
     name: str
     description: Optional[str] = None
 
+class DuplicateReport(BaseModel):
+    reported_by: str
+    description: str
+    similarity: float
+    reported_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
 class Fault(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -233,9 +501,15 @@ class Fault(BaseModel):
     description: str
     status: FaultStatus = FaultStatus.PENDING
     priority: str = "normal"
+    priority_rank: int = 2
+    station_id: Optional[str] = None
     service_id: Optional[str] = None
     resolution_notes: Optional[str] = None
     resolved_at: Optional[str] = None
+    claimed_by: Optional[str] = None
+    lease_expires_at: Optional[str] = None
+    duplicate_count: int = 0
+    duplicate_reports: List[DuplicateReport] = []
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class FaultCreate(BaseModel):
@@ -251,6 +525,18 @@ class FaultUpdate(BaseModel):
     priority: Optional[str] = None
     service_id: Optional[str] = None
 
+class FaultBulkAction(str, Enum):
+    RESOLVE = "resolve"
+    REPRIORITIZE = "reprioritize"
+    REASSIGN = "reassign"
+
+class FaultBulkOperation(BaseModel):
+    fault_id: str
+    action: FaultBulkAction
+    priority: Optional[str] = None
+    service_id: Optional[str] = None
+    resolution_notes: Optional[str] = None
+
 class Request(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -305,6 +591,18 @@ class Notification(BaseModel):
     related_id: Optional[str] = None
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+class PositionReading(BaseModel):
+    vehicle_id: str
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    timestamp: str
+    km: Optional[int] = Field(default=None, ge=0)
+
+class OdometerReading(BaseModel):
+    vehicle_id: str
+    timestamp: str
+    km: int = Field(ge=0)
+
 class DashboardStats(BaseModel):
     total_vehicles: int
     active_vehicles: int
@@ -335,6 +633,59 @@ class FaultReportConfigUpdate(BaseModel):
     include_resolution: Optional[bool] = None
     date_format: Optional[str] = None
 
+class FaultReportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    requested_by: str
+    config_version: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    cache_bucket: Optional[str] = None
+    status: ReportJobStatus = ReportJobStatus.PENDING
+    row_count: Optional[int] = None
+    file_name: Optional[str] = None
+    error: Optional[str] = None
+    completed_at: Optional[str] = None
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class FaultReportJobCreate(BaseModel):
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+class CertificationUpdate(BaseModel):
+    certified_vehicle_types: Optional[List[VehicleType]] = None
+
+class RosterRequest(BaseModel):
+    start_date: str
+    end_date: str
+    station_ids: Optional[List[str]] = None
+    allow_cross_station: bool = False
+    mission_type: str = "Vardiya"
+
+class RosterEntry(BaseModel):
+    driver_id: str
+    driver_name: str
+    vehicle_id: str
+    plate: str
+    vehicle_type: str
+    station_id: str
+    cost: float
+
+class Roster(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_by: str
+    start_date: str
+    end_date: str
+    mission_type: str
+    status: RosterStatus = RosterStatus.PROPOSED
+    entries: List[RosterEntry] = []
+    unassigned_driver_ids: List[str] = []
+    unassigned_vehicle_ids: List[str] = []
+    solve_ms: float = 0
+    applied_at: Optional[str] = None
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
 # Helper functions
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -368,6 +719,1127 @@ async def require_manager(user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Bu işlem için amir yetkisi gereklidir")
     return user
 
+def spawn_background_task(coro):
+    # Keep a reference so the task isn't garbage collected before it finishes
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def format_report_date(value: Optional[str], date_format: str) -> str:
+    if not value:
+        return ""
+    pattern = date_format.replace('dd', '%d').replace('mm', '%m').replace('yyyy', '%Y')
+    try:
+        return datetime.fromisoformat(value).strftime(pattern)
+    except ValueError:
+        return value
+
+def report_date_filter(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """created_at bounds for a report; a date-only end date covers that whole day."""
+    bounds = {}
+    if start_date:
+        bounds['$gte'] = start_date
+    if end_date:
+        if len(end_date) == 10:
+            bounds['$lt'] = (datetime.fromisoformat(end_date) + timedelta(days=1)).date().isoformat()
+        else:
+            bounds['$lte'] = end_date
+    return bounds
+
+def report_cache_bucket(end_date: Optional[str], now: datetime) -> Optional[str]:
+    """Open-ended reports grow as faults arrive, so they are only cached per time bucket."""
+    if end_date:
+        return None
+    span = REPORT_OPEN_RANGE_CACHE_MINUTES * 60
+    return datetime.fromtimestamp(now.timestamp() // span * span, tz=timezone.utc).isoformat()
+
+def build_fault_report(path: str, config: dict, faults: list, lookups: dict) -> int:
+    """Join faults with their related documents and write them to an xlsx file.
+
+    Runs inside the report process pool, so it only receives plain dicts.
+    """
+    from openpyxl import Workbook
+
+    date_format = config.get('date_format') or "dd/mm/yyyy"
+    users = lookups['users']
+    vehicles = lookups['vehicles']
+    stations = lookups['stations']
+    services = lookups['services']
+    fault_types = lookups['fault_types']
+
+    header = ["Tarih", "Arıza Tipi", "Açıklama", "Öncelik", "Durum"]
+    if config.get('include_vehicle_info'):
+        header += ["Plaka", "Marka", "Model", "Araç Tipi"]
+    if config.get('include_station_info'):
+        header += ["İstasyon"]
+    if config.get('include_driver_info'):
+        header += ["Bildiren", "Sicil No"]
+    if config.get('include_service_info'):
+        header += ["Servis"]
+    if config.get('include_resolution'):
+        header += ["Çözüm Notu", "Çözüm Tarihi"]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Arızalar")
+    sheet.append(header)
+
+    for fault in faults:
+        vehicle = vehicles.get(fault.get('vehicle_id'), {})
+        fault_type = fault_types.get(fault.get('fault_type_id'), {})
+        row = [
+            format_report_date(fault.get('created_at'), date_format),
+            fault_type.get('name', ''),
+            fault.get('description', ''),
+            fault.get('priority', ''),
+            fault.get('status', ''),
+        ]
+        if config.get('include_vehicle_info'):
+            row += [vehicle.get('plate', ''), vehicle.get('brand', ''), vehicle.get('model', ''), vehicle.get('vehicle_type', '')]
+        if config.get('include_station_info'):
+            row += [stations.get(vehicle.get('station_id'), {}).get('name', '')]
+        if config.get('include_driver_info'):
+            reporter = users.get(fault.get('reported_by'), {})
+            row += [reporter.get('name', ''), reporter.get('sicil_no') or '']
+        if config.get('include_service_info'):
+            row += [services.get(fault.get('service_id'), {}).get('name', '')]
+        if config.get('include_resolution'):
+            row += [fault.get('resolution_notes') or '', format_report_date(fault.get('resolved_at'), date_format)]
+        sheet.append(row)
+
+    workbook.save(path)
+    return len(faults)
+
+ROLLUP_KEY_FIELDS = [
+    ("granularity", 1), ("bucket", 1), ("station_id", 1), ("vehicle_type", 1), ("fault_type_id", 1), ("priority", 1)
+]
+
+def rollup_bucket(moment: datetime, granularity: RollupGranularity) -> str:
+    day = moment.astimezone(timezone.utc).date()
+    if granularity == RollupGranularity.WEEK:
+        day = day - timedelta(days=day.weekday())
+    elif granularity == RollupGranularity.MONTH:
+        day = day.replace(day=1)
+    return day.isoformat()
+
+def rollup_key(fault: dict, vehicle: Optional[dict], granularity: RollupGranularity, moment: datetime) -> dict:
+    vehicle = vehicle or {}
+    return {
+        "granularity": granularity.value,
+        "bucket": rollup_bucket(moment, granularity),
+        "station_id": vehicle.get('station_id'),
+        "vehicle_type": vehicle.get('vehicle_type'),
+        "fault_type_id": fault.get('fault_type_id'),
+        "priority": (fault.get('priority') or "normal").lower(),
+    }
+
+def fault_rollup_operations(fault: dict, vehicle: Optional[dict], metric: str, moment: datetime, delta: int = 1) -> list:
+    return [
+        UpdateOne(rollup_key(fault, vehicle, granularity, moment), {"$inc": {metric: delta}}, upsert=True)
+        for granularity in RollupGranularity
+    ]
+
+def fault_rollup_events(fault: dict) -> list:
+    """The (metric, moment) pairs a fault contributes to the rollups."""
+    events = [("created", datetime.fromisoformat(fault['created_at']))]
+    if fault.get('status') == FaultStatus.RESOLVED and fault.get('resolved_at'):
+        events.append(("resolved", datetime.fromisoformat(fault['resolved_at'])))
+    return events
+
+def fault_rollup_move_operations(before: dict, after: dict, vehicle: Optional[dict]) -> list:
+    """Move a fault's rollup counts out of its old priority buckets and into the new ones."""
+    return [
+        operation
+        for metric, moment in fault_rollup_events(before)
+        for operation in (
+            fault_rollup_operations(before, vehicle, metric, moment, delta=-1)
+            + fault_rollup_operations(after, vehicle, metric, moment)
+        )
+    ]
+
+async def record_fault_rollup(fault: dict, vehicle: Optional[dict], metric: str, moment: datetime):
+    """Increment the day/week/month rollup buckets for a fault event (created or resolved)."""
+    await db.fault_rollups.bulk_write(fault_rollup_operations(fault, vehicle, metric, moment), ordered=False)
+
+def invalidate_fault_analytics():
+    analytics_cache.clear()
+
+# Triage order: lower rank is handled first
+PRIORITY_RANKS = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+PRIORITY_ALIASES = {
+    "acil": "urgent", "critical": "urgent", "kritik": "urgent",
+    "yüksek": "high", "yuksek": "high",
+    "düşük": "low", "dusuk": "low",
+}
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """Map free-form priority text onto the canonical levels, defaulting to normal."""
+    value = (priority or "").strip().lower()
+    value = PRIORITY_ALIASES.get(value, value)
+    return value if value in PRIORITY_RANKS else "normal"
+
+def queue_filter(now: str, station_id: Optional[str] = None) -> dict:
+    """Pending faults that are unclaimed or whose lease has run out."""
+    query = {
+        "status": FaultStatus.PENDING.value,
+        "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lte": now}}],
+    }
+    if station_id:
+        query['station_id'] = station_id
+    return query
+
+def frame_records(frame: pd.DataFrame, key: str, value: str) -> list:
+    frame = frame.replace({np.nan: None})
+    return [{key: row[0], value: row[1], "count": int(row[2])} for row in frame.itertuples(index=False)]
+
+def compute_reliability(faults: list, vehicles: list) -> dict:
+    """MTTR, MTBF and fault rates computed column-wise over the whole fleet."""
+    fault_df = pd.DataFrame(faults, columns=[
+        "vehicle_id", "fault_type_id", "service_id", "status", "created_at", "resolved_at"
+    ])
+    vehicle_df = pd.DataFrame(vehicles, columns=["id", "plate", "vehicle_type", "current_km"])
+    fault_df['created_at'] = pd.to_datetime(fault_df['created_at'], utc=True, format="ISO8601")
+    fault_df['resolved_at'] = pd.to_datetime(fault_df['resolved_at'], utc=True, format="ISO8601")
+    fault_df = fault_df.merge(
+        vehicle_df[['id', 'vehicle_type']], left_on='vehicle_id', right_on='id', how='left'
+    )
+
+    # Mean time to repair, in hours
+    resolved = fault_df[(fault_df['status'] == FaultStatus.RESOLVED.value) & fault_df['resolved_at'].notna()].copy()
+    resolved['repair_hours'] = (resolved['resolved_at'] - resolved['created_at']).dt.total_seconds() / 3600
+    mttr_by_service = resolved.groupby('service_id', dropna=False)['repair_hours'].agg(['mean', 'count']).reset_index()
+    mttr_by_fault_type = resolved.groupby('fault_type_id', dropna=False)['repair_hours'].agg(['mean', 'count']).reset_index()
+
+    # Mean time between failures, in hours, from the gaps between consecutive faults per vehicle
+    ordered = fault_df.sort_values(['vehicle_id', 'created_at'])
+    ordered['gap_hours'] = ordered.groupby('vehicle_id')['created_at'].diff().dt.total_seconds() / 3600
+    gaps = ordered[ordered['gap_hours'].notna()]
+    mtbf_by_vehicle = gaps.groupby('vehicle_id')['gap_hours'].agg(['mean', 'count']).reset_index()
+    mtbf_by_type = gaps.groupby('vehicle_type')['gap_hours'].agg(['mean', 'count']).reset_index()
+
+    # Faults per 1000 km for vehicles with a known odometer reading
+    fault_counts = fault_df.groupby('vehicle_id').size().rename('faults')
+    rated = vehicle_df.join(fault_counts, on='id').fillna({'faults': 0})
+    rated = rated[rated['current_km'].fillna(0) > 0]
+    rated['per_1000_km'] = rated['faults'] / rated['current_km'] * 1000
+    rate_by_type = rated.groupby('vehicle_type')[['faults', 'current_km']].sum()
+    rate_by_type['per_1000_km'] = rate_by_type['faults'] / rate_by_type['current_km'] * 1000
+
+    return {
+        "mttr_by_service": frame_records(mttr_by_service, "service_id", "mttr_hours"),
+        "mttr_by_fault_type": frame_records(mttr_by_fault_type, "fault_type_id", "mttr_hours"),
+        "mtbf_by_vehicle": frame_records(mtbf_by_vehicle, "vehicle_id", "mtbf_hours"),
+        "mtbf_by_vehicle_type": frame_records(mtbf_by_type, "vehicle_type", "mtbf_hours"),
+        "faults_per_1000_km_by_vehicle": [
+            {"vehicle_id": row.id, "plate": row.plate, "faults": int(row.faults), "per_1000_km": float(row.per_1000_km)}
+            for row in rated.itertuples(index=False)
+        ],
+        "faults_per_1000_km_by_vehicle_type": [
+            {"vehicle_type": vehicle_type, "faults": int(row.faults), "per_1000_km": float(row.per_1000_km)}
+            for vehicle_type, row in rate_by_type.iterrows()
+        ],
+    }
+
+def parse_window(start_date: Optional[str], end_date: Optional[str], default_days: int = 30):
+    try:
+        end = datetime.fromisoformat(end_date) if end_date else datetime.now(timezone.utc)
+        start = datetime.fromisoformat(start_date) if start_date else end - timedelta(days=default_days)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih biçimi")
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Başlangıç tarihi bitiş tarihinden önce olmalıdır")
+    return start, end
+
+async def set_vehicle_status(
+    vehicle_id: str,
+    new_status: VehicleStatus,
+    reason: str,
+    related_id: Optional[str] = None,
+    extra: Optional[dict] = None
+) -> Optional[dict]:
+    """Set a vehicle's status and append the transition to the status history."""
+    new_status = VehicleStatus(new_status).value
+    update = {"status": new_status, **(extra or {})}
+    previous = await db.vehicles.find_one_and_update(
+        {"id": vehicle_id},
+        {"$set": update},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not previous:
+        return None
+    vehicle = {**previous, **update}
+    station_index.apply_vehicle_change(previous, vehicle)
+    if previous.get('status') != new_status:
+        await record_status_transition(vehicle, previous.get('status'), reason, related_id)
+    return vehicle
+
+def derive_vehicle_status(status: Optional[str], open_faults: int, fault_reported: bool) -> Optional[str]:
+    """Python mirror of the status expression in open_fault_pipeline."""
+    if fault_reported or (open_faults and status == VehicleStatus.ACTIVE):
+        return VehicleStatus.FAULTY.value
+    if not open_faults and status == VehicleStatus.FAULTY:
+        return VehicleStatus.ACTIVE.value
+    return status
+
+def open_fault_pipeline(count_expr, fault_reported: bool) -> list:
+    """Update pipeline that stores the open-fault counter and derives the vehicle status from it."""
+    if fault_reported:
+        status_expr = VehicleStatus.FAULTY.value
+    else:
+        status_expr = {"$switch": {
+            "branches": [
+                {
+                    "case": {"$and": [{"$gt": [count_expr, 0]}, {"$eq": ["$status", VehicleStatus.ACTIVE.value]}]},
+                    "then": VehicleStatus.FAULTY.value,
+                },
+                {
+                    "case": {"$and": [{"$eq": [count_expr, 0]}, {"$eq": ["$status", VehicleStatus.FAULTY.value]}]},
+                    "then": VehicleStatus.ACTIVE.value,
+                },
+            ],
+            "default": "$status",
+        }}
+    return [{"$set": {"open_fault_count": count_expr, "status": status_expr}}]
+
+async def update_open_fault_count(
+    vehicle_id: str,
+    reason: str,
+    related_id: Optional[str] = None,
+    delta: int = 0
+) -> Optional[dict]:
+    """Shift a vehicle's open-fault counter and its status in one atomic update.
+
+    A newly reported fault always marks the vehicle faulty; otherwise a faulty vehicle becomes
+    active once its counter reaches zero.
+    """
+    count_expr = {"$max": [0, {"$add": [{"$ifNull": ["$open_fault_count", 0]}, delta]}]}
+    fault_reported = delta > 0
+    previous = await db.vehicles.find_one_and_update(
+        {"id": vehicle_id},
+        open_fault_pipeline(count_expr, fault_reported),
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not previous:
+        return None
+    open_faults = max(0, (previous.get('open_fault_count') or 0) + delta)
+    vehicle = {
+        **previous,
+        "open_fault_count": open_faults,
+        "status": derive_vehicle_status(previous.get('status'), open_faults, fault_reported),
+    }
+    station_index.apply_vehicle_change(previous, vehicle)
+    if previous.get('status') != vehicle['status']:
+        await record_status_transition(vehicle, previous.get('status'), reason, related_id)
+    return vehicle
+
+async def reconcile_open_fault_counts(vehicle_ids: Optional[list] = None) -> int:
+    """Rebuild open-fault counters (and the statuses derived from them) from the faults collection.
+
+    The counters are read before the faults are counted and each correction is conditional on the
+    counter being unchanged, so a fault reported or resolved meanwhile skips that vehicle until the
+    next run.
+    """
+    match = {"status": {"$ne": FaultStatus.RESOLVED.value}}
+    vehicle_query = {}
+    if vehicle_ids is not None:
+        match['vehicle_id'] = {"$in": vehicle_ids}
+        vehicle_query['id'] = {"$in": vehicle_ids}
+    counters = {
+        vehicle['id']: vehicle.get('open_fault_count')
+        for vehicle in await db.vehicles.find(vehicle_query, {"_id": 0, "id": 1, "open_fault_count": 1}).to_list(None)
+    }
+    open_counts = {
+        row['_id']: row['count'] for row in await db.faults.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$vehicle_id", "count": {"$sum": 1}}},
+        ]).to_list(None)
+    }
+    corrected = 0
+    for vehicle_id, counter in counters.items():
+        actual = open_counts.get(vehicle_id, 0)
+        if counter != actual:
+            previous = await db.vehicles.find_one_and_update(
+                {"id": vehicle_id, "open_fault_count": counter},
+                open_fault_pipeline({"$literal": actual}, False),
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
+            )
+            if not previous:
+                continue
+            vehicle = {
+                **previous,
+                "open_fault_count": actual,
+                "status": derive_vehicle_status(previous.get('status'), actual, False),
+            }
+            station_index.apply_vehicle_change(previous, vehicle)
+            if previous.get('status') != vehicle['status']:
+                await record_status_transition(vehicle, previous.get('status'), "reconcile")
+            corrected += 1
+    return corrected
+
+async def fault_counter_reconcile_loop():
+    while True:
+        try:
+            corrected = await reconcile_open_fault_counts()
+            if corrected:
+                logger.info("Corrected open-fault counters on %d vehicles", corrected)
+        except Exception:
+            logger.exception("Open-fault counter reconciliation failed")
+        await asyncio.sleep(FAULT_COUNTER_RECONCILE_HOURS * 3600)
+
+def status_transition_doc(vehicle: dict, previous_status: Optional[str], reason: str, related_id: Optional[str] = None) -> dict:
+    return {
+        "vehicle_id": vehicle['id'],
+        "changed_at": datetime.now(timezone.utc),
+        "plate": vehicle.get('plate'),
+        "station_id": vehicle.get('station_id'),
+        "vehicle_type": vehicle.get('vehicle_type'),
+        "status": vehicle['status'],
+        "previous_status": previous_status,
+        "reason": reason,
+        "related_id": related_id,
+    }
+
+async def record_status_transition(vehicle: dict, previous_status: Optional[str], reason: str, related_id: Optional[str] = None):
+    await db.vehicle_status_history.insert_one(status_transition_doc(vehicle, previous_status, reason, related_id))
+
+def compute_availability(
+    transitions: list,
+    initial_states: dict,
+    vehicles: list,
+    start: datetime,
+    end: datetime
+) -> dict:
+    """Share of time each vehicle spent active inside [start, end), rolled up by type and station.
+
+    Deleted vehicles are passed with a None status and contribute until their "deleted" transition,
+    which like any None status ends the observed period.
+    """
+    vehicle_df = pd.DataFrame(vehicles, columns=["id", "plate", "vehicle_type", "station_id", "status", "created_at"])
+    history = pd.DataFrame(transitions, columns=["vehicle_id", "changed_at", "status", "previous_status"])
+    history['changed_at'] = pd.to_datetime(history['changed_at'], utc=True)
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+
+    # State at the start of the window: the last transition before it, otherwise the status the
+    # first transition inside the window moved away from, otherwise the current status.
+    # A vehicle created inside the window (no previous status) is only observed from its creation.
+    opening = vehicle_df.set_index('id')['status'].astype(object)
+    opening_at = pd.Series(start_ts, index=opening.index)
+    first_in_window = history.drop_duplicates('vehicle_id').set_index('vehicle_id')['previous_status']
+    known = first_in_window.index.intersection(opening.index)
+    opening.loc[known] = first_in_window
+    known = known.union(pd.Index(initial_states).intersection(opening.index))
+    for vehicle_id, state in initial_states.items():
+        if vehicle_id in opening.index:
+            opening.loc[vehicle_id] = state
+
+    # With no history at all, the current status only holds from the vehicle's creation on
+    created_at = pd.to_datetime(vehicle_df.set_index('id')['created_at'], utc=True, format="ISO8601")
+    fallback = opening.index.difference(known)
+    opening_at.loc[fallback] = created_at.loc[fallback].fillna(start_ts).clip(lower=start_ts)
+    opening = opening[opening_at < end_ts].dropna()
+
+    segments = pd.concat([
+        pd.DataFrame({
+            "vehicle_id": opening.index,
+            "changed_at": opening_at.loc[opening.index].reset_index(drop=True),
+            "status": opening.values,
+        }),
+        history[['vehicle_id', 'changed_at', 'status']],
+    ], ignore_index=True).sort_values(['vehicle_id', 'changed_at'], kind='stable')
+    segments = segments[segments['vehicle_id'].isin(vehicle_df['id'])]
+    segments['ends_at'] = segments.groupby('vehicle_id')['changed_at'].shift(-1).fillna(end_ts)
+    segments = segments[segments['status'].notna()]
+    segments['seconds'] = (segments['ends_at'] - segments['changed_at']).dt.total_seconds()
+    segments['active_seconds'] = np.where(segments['status'] == VehicleStatus.ACTIVE.value, segments['seconds'], 0.0)
+
+    per_vehicle = segments.groupby('vehicle_id')[['seconds', 'active_seconds']].sum()
+    per_vehicle = per_vehicle.join(vehicle_df.set_index('id')[['plate', 'vehicle_type', 'station_id']])
+
+    def summarize(frame: pd.DataFrame, key: str) -> list:
+        grouped = frame.groupby(key)[['seconds', 'active_seconds']].sum()
+        return [
+            {key: index, "availability": float(row.active_seconds / row.seconds) if row.seconds else None}
+            for index, row in grouped.iterrows()
+        ]
+
+    total_seconds = per_vehicle['seconds'].sum()
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "fleet_availability": float(per_vehicle['active_seconds'].sum() / total_seconds) if total_seconds else None,
+        "by_vehicle": [
+            {
+                "vehicle_id": vehicle_id,
+                "plate": row.plate,
+                "availability": float(row.active_seconds / row.seconds) if row.seconds else None,
+            }
+            for vehicle_id, row in per_vehicle.iterrows()
+        ],
+        "by_vehicle_type": summarize(per_vehicle, 'vehicle_type'),
+        "by_station": summarize(per_vehicle, 'station_id'),
+    }
+
+def build_dashboard_stats(vehicles: list, pending_faults: int, total_stations: int, total_drivers: int) -> DashboardStats:
+    # Count vehicles with expiring documents (within 30 days)
+    thirty_days = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+    expiring_soon = sum(1 for v in vehicles if (
+        (v.get('insurance_expiry') and v['insurance_expiry'] <= thirty_days) or
+        (v.get('inspection_expiry') and v['inspection_expiry'] <= thirty_days) or
+        (v.get('kasko_expiry') and v['kasko_expiry'] <= thirty_days)
+    ))
+    
+    # Count vehicles with oil change due soon
+    oil_change_due_soon = sum(1 for v in vehicles if (
+        v.get('next_oil_change_date') and v['next_oil_change_date'] <= thirty_days
+    ))
+    
+    return DashboardStats(
+        total_vehicles=len(vehicles),
+        active_vehicles=sum(1 for v in vehicles if v.get('status') == VehicleStatus.ACTIVE),
+        faulty_vehicles=sum(1 for v in vehicles if v.get('status') == VehicleStatus.FAULTY),
+        accident_vehicles=sum(1 for v in vehicles if v.get('status') == VehicleStatus.ACCIDENT),
+        pending_faults=pending_faults,
+        expiring_soon=expiring_soon,
+        oil_change_due_soon=oil_change_due_soon,
+        total_stations=total_stations,
+        total_drivers=total_drivers
+    )
+
+DASHBOARD_VEHICLE_FIELDS = {
+    "_id": 0, "id": 1, "station_id": 1, "status": 1, "insurance_expiry": 1,
+    "inspection_expiry": 1, "kasko_expiry": 1, "next_oil_change_date": 1
+}
+
+EARTH_RADIUS_KM = 6371.0088
+VEHICLE_TYPE_INDEX = {vehicle_type.value: i for i, vehicle_type in enumerate(VehicleType)}
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class StationIndex:
+    """Station coordinates with active vehicle counts per type, held in memory for dispatch queries.
+
+    A city has at most a few hundred stations, so a vectorized scan over packed coordinate
+    arrays answers nearest-station queries in microseconds.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.positions = {}
+        self.coords = np.empty((0, 2))
+        self.active_counts = np.zeros((0, len(VehicleType)), dtype=np.int32)
+        self.listeners = []
+
+    def load(self, stations: list, vehicles: list):
+        located = [s for s in stations if s.get('latitude') is not None and s.get('longitude') is not None]
+        self.ids = [s['id'] for s in located]
+        self.names = [s['name'] for s in located]
+        self.positions = {station_id: i for i, station_id in enumerate(self.ids)}
+        self.coords = np.array([[s['latitude'], s['longitude']] for s in located], dtype=float).reshape(-1, 2)
+        self.active_counts = np.zeros((len(located), len(VehicleType)), dtype=np.int32)
+        for vehicle in vehicles:
+            self._adjust(vehicle, 1)
+        for listener in self.listeners:
+            listener.rebuild()
+
+    def add_station(self, station: dict):
+        if station.get('latitude') is None or station.get('longitude') is None:
+            return
+        self.positions[station['id']] = len(self.ids)
+        self.ids.append(station['id'])
+        self.names.append(station['name'])
+        self.coords = np.vstack([self.coords, [station['latitude'], station['longitude']]])
+        self.active_counts = np.vstack([self.active_counts, np.zeros(len(VehicleType), dtype=np.int32)])
+        for listener in self.listeners:
+            listener.rebuild()
+
+    def _adjust(self, vehicle: Optional[dict], delta: int):
+        if not vehicle or vehicle.get('status') != VehicleStatus.ACTIVE:
+            return
+        position = self.positions.get(vehicle.get('station_id'))
+        type_index = VEHICLE_TYPE_INDEX.get(vehicle.get('vehicle_type'))
+        if position is not None and type_index is not None:
+            self.active_counts[position, type_index] += delta
+            remaining = self.active_counts[position, type_index]
+            if (delta > 0 and remaining == 1) or (delta < 0 and remaining == 0):
+                for listener in self.listeners:
+                    listener.station_changed(position, type_index, remaining > 0)
+
+    def apply_vehicle_change(self, before: Optional[dict], after: Optional[dict]):
+        self._adjust(before, -1)
+        self._adjust(after, 1)
+
+    def nearest(self, latitude: float, longitude: float, vehicle_type: VehicleType, k: int) -> list:
+        column = self.active_counts[:, VEHICLE_TYPE_INDEX[VehicleType(vehicle_type).value]]
+        candidates = np.flatnonzero(column > 0)
+        if candidates.size == 0:
+            return []
+        distances = haversine_km(latitude, longitude, self.coords[candidates, 0], self.coords[candidates, 1])
+        k = min(k, candidates.size)
+        closest = np.argpartition(distances, k - 1)[:k]
+        closest = closest[np.argsort(distances[closest])]
+        return [
+            {
+                "station_id": self.ids[candidates[i]],
+                "station_name": self.names[candidates[i]],
+                "distance_km": round(float(distances[i]), 3),
+                "active_vehicles": int(column[candidates[i]]),
+            }
+            for i in closest
+        ]
+
+class CoverageGrid:
+    """Nearest operational station per vehicle type for every cell of a grid over the service area.
+
+    Cell-to-station distances are computed once per station layout; a vehicle status change only
+    touches the cells whose answer can change for that station and vehicle type.
+    """
+
+    def __init__(self, stations: StationIndex):
+        self.stations = stations
+        self.version = 0
+        self.rows = self.cols = 0
+        self.origin = (0.0, 0.0)
+        self.step = (0.0, 0.0)
+        self.distances = np.empty((0, 0), dtype=np.float32)
+        self.nearest = np.empty((len(VehicleType), 0), dtype=np.int32)
+        self.best = np.empty((len(VehicleType), 0), dtype=np.float32)
+        stations.listeners.append(self)
+
+    def rebuild(self):
+        coords = self.stations.coords
+        self.version += 1
+        if len(coords) == 0:
+            self.rows = self.cols = 0
+            self.distances = np.empty((0, 0), dtype=np.float32)
+            self.nearest = np.empty((len(VehicleType), 0), dtype=np.int32)
+            self.best = np.empty((len(VehicleType), 0), dtype=np.float32)
+            return
+
+        mid_lat = float(coords[:, 0].mean())
+        km_per_lat = 111.32
+        km_per_lon = km_per_lat * max(np.cos(np.radians(mid_lat)), 0.01)
+        south = coords[:, 0].min() - COVERAGE_MARGIN_KM / km_per_lat
+        north = coords[:, 0].max() + COVERAGE_MARGIN_KM / km_per_lat
+        west = coords[:, 1].min() - COVERAGE_MARGIN_KM / km_per_lon
+        east = coords[:, 1].max() + COVERAGE_MARGIN_KM / km_per_lon
+
+        # Coarsen the grid rather than exceed the cell budget for very large service areas
+        cell_km = COVERAGE_CELL_KM
+        height_km, width_km = (north - south) * km_per_lat, (east - west) * km_per_lon
+        while (height_km / cell_km) * (width_km / cell_km) > COVERAGE_MAX_CELLS:
+            cell_km *= 1.25
+        self.step = (cell_km / km_per_lat, cell_km / km_per_lon)
+        self.origin = (float(south), float(west))
+        self.rows = int(np.ceil((north - south) / self.step[0]))
+        self.cols = int(np.ceil((east - west) / self.step[1]))
+
+        cell_lats = south + (np.arange(self.rows) + 0.5) * self.step[0]
+        cell_lons = west + (np.arange(self.cols) + 0.5) * self.step[1]
+        grid_lats, grid_lons = [axis.ravel() for axis in np.meshgrid(cell_lats, cell_lons, indexing='ij')]
+        self.distances = np.stack([
+            haversine_km(lat, lon, grid_lats, grid_lons) for lat, lon in coords
+        ], axis=1).astype(np.float32)
+
+        cells = self.rows * self.cols
+        self.nearest = np.full((len(VehicleType), cells), -1, dtype=np.int32)
+        self.best = np.full((len(VehicleType), cells), np.inf, dtype=np.float32)
+        for type_index in range(len(VehicleType)):
+            self._recompute(type_index, np.arange(cells))
+
+    def _recompute(self, type_index: int, cells: np.ndarray):
+        available = np.flatnonzero(self.stations.active_counts[:, type_index] > 0)
+        if available.size == 0:
+            self.nearest[type_index, cells] = -1
+            self.best[type_index, cells] = np.inf
+            return
+        candidate_distances = self.distances[np.ix_(cells, available)]
+        closest = candidate_distances.argmin(axis=1)
+        self.nearest[type_index, cells] = available[closest]
+        self.best[type_index, cells] = candidate_distances[np.arange(cells.size), closest]
+
+    def station_changed(self, position: int, type_index: int, available: bool):
+        if position >= self.distances.shape[1]:
+            return
+        self.version += 1
+        if available:
+            station_distances = self.distances[:, position]
+            closer = station_distances < self.best[type_index]
+            self.nearest[type_index, closer] = position
+            self.best[type_index, closer] = station_distances[closer]
+        else:
+            affected = np.flatnonzero(self.nearest[type_index] == position)
+            if affected.size:
+                self._recompute(type_index, affected)
+
+    def payload(self, vehicle_type: VehicleType, max_km: float) -> dict:
+        type_index = VEHICLE_TYPE_INDEX[VehicleType(vehicle_type).value]
+        best = self.best[type_index]
+        # Station positions as uint16 (65535 = no operational station) and distances in 10 m steps
+        nearest = np.where(self.nearest[type_index] < 0, 65535, self.nearest[type_index]).astype('<u2')
+        distance = np.minimum(np.nan_to_num(best * 100, posinf=65535), 65535).astype('<u2')
+        return {
+            "version": self.version,
+            "vehicle_type": VehicleType(vehicle_type).value,
+            "rows": self.rows,
+            "cols": self.cols,
+            "origin": {"latitude": self.origin[0], "longitude": self.origin[1]},
+            "cell_size": {"latitude": self.step[0], "longitude": self.step[1]},
+            "stations": list(self.stations.ids),
+            "nearest": base64.b64encode(nearest.tobytes()).decode('ascii'),
+            "distance_10m": base64.b64encode(distance.tobytes()).decode('ascii'),
+            "uncovered_cells": int(np.count_nonzero(best > max_km)),
+        }
+
+class VehiclePositionStore:
+    """Latest known position per vehicle in packed arrays, bucketed in a uniform lat/lon grid."""
+
+    def __init__(self, cell_deg: float):
+        self.cell_deg = cell_deg
+        self.slots = {}
+        self.vehicle_ids = []
+        self.latitudes = np.zeros(64)
+        self.longitudes = np.zeros(64)
+        self.timestamps = np.zeros(64)
+        self.kms = np.full(64, np.nan)
+        self.cell_of = []
+        self.cells = {}
+        # Timestamp of the last reading written to the history collection, per vehicle
+        self.persisted_at = {}
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        return (int(np.floor(latitude / self.cell_deg)), int(np.floor(longitude / self.cell_deg)))
+
+    def _grow(self):
+        size = len(self.latitudes) * 2
+        self.latitudes = np.resize(self.latitudes, size)
+        self.longitudes = np.resize(self.longitudes, size)
+        self.timestamps = np.resize(self.timestamps, size)
+        self.kms = np.concatenate([self.kms, np.full(size - len(self.kms), np.nan)])
+
+    def update(self, vehicle_id: str, latitude: float, longitude: float, timestamp: float, km: Optional[int]) -> bool:
+        """Store a reading if it is newer than the one held for the vehicle."""
+        slot = self.slots.get(vehicle_id)
+        if slot is None:
+            slot = len(self.vehicle_ids)
+            if slot == len(self.latitudes):
+                self._grow()
+            self.slots[vehicle_id] = slot
+            self.vehicle_ids.append(vehicle_id)
+            self.cell_of.append(None)
+        elif timestamp <= self.timestamps[slot]:
+            return False
+
+        cell = self._cell(latitude, longitude)
+        if self.cell_of[slot] != cell:
+            if self.cell_of[slot] is not None:
+                self.cells[self.cell_of[slot]].discard(slot)
+                if not self.cells[self.cell_of[slot]]:
+                    del self.cells[self.cell_of[slot]]
+            self.cells.setdefault(cell, set()).add(slot)
+            self.cell_of[slot] = cell
+        self.latitudes[slot] = latitude
+        self.longitudes[slot] = longitude
+        self.timestamps[slot] = timestamp
+        if km is not None:
+            self.kms[slot] = km
+        return True
+
+    def _slots_in_box(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        (row_min, col_min), (row_max, col_max) = self._cell(south, west), self._cell(north, east)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            cells = [cell for cell in self.cells if row_min <= cell[0] <= row_max and col_min <= cell[1] <= col_max]
+        else:
+            cells = [(row, col) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+        slots = [slot for cell in cells for slot in self.cells.get(cell, ())]
+        return np.array(slots, dtype=np.int64)
+
+    def _describe(self, slots: np.ndarray, distances: Optional[np.ndarray] = None) -> list:
+        results = []
+        for i, slot in enumerate(slots):
+            entry = {
+                "vehicle_id": self.vehicle_ids[slot],
+                "latitude": float(self.latitudes[slot]),
+                "longitude": float(self.longitudes[slot]),
+                "timestamp": datetime.fromtimestamp(self.timestamps[slot], timezone.utc).isoformat(),
+                "km": None if np.isnan(self.kms[slot]) else int(self.kms[slot]),
+            }
+            if distances is not None:
+                entry['distance_km'] = round(float(distances[i]), 3)
+            results.append(entry)
+        return results
+
+    def get(self, vehicle_ids: List[str]) -> list:
+        slots = np.array([self.slots[v] for v in vehicle_ids if v in self.slots], dtype=np.int64)
+        return self._describe(slots)
+
+    def within_box(self, south: float, west: float, north: float, east: float) -> list:
+        slots = self._slots_in_box(south, west, north, east)
+        if slots.size:
+            inside = (
+                (self.latitudes[slots] >= south) & (self.latitudes[slots] <= north) &
+                (self.longitudes[slots] >= west) & (self.longitudes[slots] <= east)
+            )
+            slots = slots[inside]
+        return self._describe(slots)
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float) -> list:
+        lat_span = radius_km / 111.32
+        lon_span = radius_km / (111.32 * max(np.cos(np.radians(latitude)), 0.01))
+        slots = self._slots_in_box(latitude - lat_span, longitude - lon_span, latitude + lat_span, longitude + lon_span)
+        if not slots.size:
+            return []
+        distances = haversine_km(latitude, longitude, self.latitudes[slots], self.longitudes[slots])
+        inside = distances <= radius_km
+        order = np.argsort(distances[inside])
+        return self._describe(slots[inside][order], distances[inside][order])
+
+def to_epoch(value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def assignment_interval(assignment: dict) -> tuple:
+    """An assignment's [start, end) in epoch seconds; open-ended assignments end at infinity."""
+    start = to_epoch(assignment['start_date'], 0.0)
+    end = to_epoch(assignment.get('end_date'), math.inf)
+    if assignment.get('end_date') and len(assignment['end_date']) == 10:
+        # A bare end date covers that whole day
+        end += 86400
+    return start, end
+
+def assignment_bounds(assignment: dict) -> dict:
+    """Parsed start and end times, stored next to the date strings so overlaps are indexed range queries."""
+    start, end = assignment_interval(assignment)
+    return {
+        "starts_at": datetime.fromtimestamp(start, timezone.utc),
+        "ends_at": None if end == math.inf else datetime.fromtimestamp(end, timezone.utc),
+    }
+
+def overlap_filter(starts_at: datetime, ends_at: Optional[datetime]) -> dict:
+    """Assignments whose stored bounds intersect [starts_at, ends_at); a None end is open-ended."""
+    return {
+        "starts_at": {"$type": "date"} if ends_at is None else {"$lt": ends_at},
+        "$or": [{"ends_at": None}, {"ends_at": {"$gt": starts_at}}],
+    }
+
+def compute_timelines(entities: dict, intervals: list, start: datetime, end: datetime) -> dict:
+    """Merge busy intervals per entity inside [start, end) and derive the free gaps between them.
+
+    `intervals` holds (entity_id, start, end, reason) tuples in epoch seconds; they are sorted once
+    and consumed in a single pass.
+    """
+    window_start, window_end = start.timestamp(), end.timestamp()
+
+    def stamp(seconds: float) -> str:
+        return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+    busy = {entity_id: [] for entity_id in entities}
+    for entity_id, interval_start, interval_end, reason in sorted(intervals, key=lambda item: (item[0], item[1])):
+        interval_start, interval_end = max(interval_start, window_start), min(interval_end, window_end)
+        if entity_id not in busy or interval_end <= interval_start:
+            continue
+        merged = busy[entity_id]
+        if merged and interval_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], interval_end)
+            merged[-1][2].append(reason)
+        else:
+            merged.append([interval_start, interval_end, [reason]])
+
+    timelines = {}
+    for entity_id, merged in busy.items():
+        free = []
+        cursor = window_start
+        for busy_start, busy_end, _ in merged:
+            if busy_start > cursor:
+                free.append({"start": stamp(cursor), "end": stamp(busy_start)})
+            cursor = busy_end
+        if cursor < window_end:
+            free.append({"start": stamp(cursor), "end": stamp(window_end)})
+        timelines[entity_id] = {
+            **entities[entity_id],
+            "busy": [
+                {"start": stamp(busy_start), "end": stamp(busy_end), "reasons": reasons}
+                for busy_start, busy_end, reasons in merged
+            ],
+            "free": free,
+            "busy_hours": round(sum(busy_end - busy_start for busy_start, busy_end, _ in merged) / 3600, 2),
+        }
+    return timelines
+
+# Roster costs: keeping a driver on their current vehicle is cheapest, working away from the home
+# station costs extra per km, and infeasible pairs are priced so no feasible pair is ever traded for one
+ROSTER_BASE_COST = 1.0
+ROSTER_CROSS_STATION_COST = 10.0
+ROSTER_INFEASIBLE_COST = 1e9
+
+def solve_roster(drivers: list, vehicles: list, stations: list, allow_cross_station: bool) -> tuple:
+    """Min-cost bipartite matching of drivers to vehicles.
+
+    Returns (pairs, unassigned driver ids, unassigned vehicle ids) where pairs are
+    (driver index, vehicle index, cost). Infeasible pairs carry a cost larger than any feasible
+    matching, so the solver maximises the number of matched drivers before minimising cost.
+    """
+    if not drivers or not vehicles:
+        return [], [d['id'] for d in drivers], [v['id'] for v in vehicles]
+
+    station_slot = {station['id']: i for i, station in enumerate(stations)}
+    coords = np.array(
+        [
+            [np.nan if station.get(axis) is None else station[axis] for axis in ('latitude', 'longitude')]
+            for station in stations
+        ] or [[np.nan, np.nan]],
+        dtype=float
+    )
+    driver_station = np.array([station_slot.get(d.get('station_id'), -1) for d in drivers])
+    vehicle_station = np.array([station_slot.get(v['station_id'], -1) for v in vehicles])
+    vehicle_type = np.array([VEHICLE_TYPE_INDEX[v['vehicle_type']] for v in vehicles])
+
+    certified = np.ones((len(drivers), len(VEHICLE_TYPE_INDEX)), dtype=bool)
+    for i, driver in enumerate(drivers):
+        if driver.get('certified_vehicle_types') is not None:
+            certified[i] = False
+            certified[i, [VEHICLE_TYPE_INDEX[t] for t in driver['certified_vehicle_types']]] = True
+
+    same_station = (driver_station[:, None] == vehicle_station[None, :]) & (driver_station[:, None] >= 0)
+    cost = np.full((len(drivers), len(vehicles)), ROSTER_BASE_COST)
+    if allow_cross_station:
+        distances = np.vstack([
+            haversine_km(*coords[slot], coords[vehicle_station, 0], coords[vehicle_station, 1]) if slot >= 0
+            else np.full(len(vehicles), np.nan)
+            for slot in driver_station
+        ])
+        cost = np.where(same_station, cost, cost + ROSTER_CROSS_STATION_COST + np.nan_to_num(distances))
+        feasible = certified[:, vehicle_type]
+    else:
+        feasible = certified[:, vehicle_type] & same_station
+
+    current_driver = np.array([v.get('assigned_driver_id') or '' for v in vehicles])
+    driver_ids = np.array([d['id'] for d in drivers])
+    cost = np.where(driver_ids[:, None] == current_driver[None, :], cost - ROSTER_BASE_COST, cost)
+    cost = np.where(feasible, cost, ROSTER_INFEASIBLE_COST)
+
+    rows, cols = linear_sum_assignment(cost)
+    pairs = [(int(r), int(c), float(cost[r, c])) for r, c in zip(rows, cols) if feasible[r, c]]
+    matched_drivers = {r for r, _, _ in pairs}
+    matched_vehicles = {c for _, c, _ in pairs}
+    return (
+        pairs,
+        [d['id'] for i, d in enumerate(drivers) if i not in matched_drivers],
+        [v['id'] for i, v in enumerate(vehicles) if i not in matched_vehicles],
+    )
+
+class PrefixTrie:
+    """Character trie mapping normalized keys to the ids stored under them."""
+
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+
+    def add(self, key: str, item_id: str):
+        node = self
+        for char in key:
+            node = node.children.setdefault(char, PrefixTrie())
+        node.ids.add(item_id)
+
+    def remove(self, key: str, item_id: str):
+        path = [self]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].ids.discard(item_id)
+        # Prune the branch back up to the first node that is still in use
+        for depth in range(len(key), 0, -1):
+            if path[depth].ids or path[depth].children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    def search(self, prefix: str, limit: int, accept: Optional[Callable[[str], bool]] = None) -> list:
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        # Breadth-first with sorted children yields keys ordered by (length, key): an exact match
+        # first, then shorter completions. The order is total, so limit/skip pages never overlap.
+        found = []
+        queue = deque([node])
+        while queue and len(found) < limit:
+            node = queue.popleft()
+            ids = node.ids if accept is None else [item_id for item_id in node.ids if accept(item_id)]
+            found.extend(sorted(ids)[:limit - len(found)])
+            queue.extend(node.children[char] for char in sorted(node.children))
+        return found
+
+class AutocompleteIndex:
+    """Prefix lookup of one field (plate, sicil number) kept in memory and updated on writes.
+
+    Items may carry a scope (a vehicle's station) so searches can be limited to one scope.
+    """
+
+    def __init__(self):
+        self.trie = PrefixTrie()
+        self.labels = {}
+        self.scopes = {}
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        return "".join(fold_turkish(str(value)).split())
+
+    def load(self, items: list):
+        self.trie, self.labels, self.scopes = PrefixTrie(), {}, {}
+        for item in items:
+            self.upsert(*item)
+
+    def upsert(self, item_id: str, label: Optional[str], scope: Optional[str] = None):
+        if label and scope is not None:
+            self.scopes[item_id] = scope
+        else:
+            self.scopes.pop(item_id, None)
+        previous = self.labels.get(item_id)
+        if previous == label:
+            return
+        if previous is not None:
+            self.trie.remove(self.normalize(previous), item_id)
+            del self.labels[item_id]
+        if label:
+            self.trie.add(self.normalize(label), item_id)
+            self.labels[item_id] = label
+
+    def remove(self, item_id: str):
+        self.upsert(item_id, None)
+
+    def search(self, prefix: str, limit: int, scope: Optional[str] = None) -> list:
+        key = self.normalize(prefix)
+        if not key:
+            return []
+        accept = None if scope is None else (lambda item_id: self.scopes.get(item_id) == scope)
+        return [{"id": item_id, "label": self.labels[item_id]} for item_id in self.trie.search(key, limit, accept)]
+
+class DuplicateFaultIndex:
+    """Character shingles of every open fault's description, grouped by vehicle.
+
+    A vehicle rarely has more than a handful of open faults, so a new report is compared against
+    all of them with Jaccard similarity.
+    """
+
+    def __init__(self):
+        self.vehicles = {}
+
+    @staticmethod
+    def shingles(text: str) -> frozenset:
+        normalized = " ".join(re.findall(r"\w+", fold_turkish(text or "")))
+        if not normalized:
+            return frozenset()
+        padded = f" {normalized} "
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def load(self, faults: list):
+        self.vehicles = {}
+        for fault in faults:
+            self.add(fault)
+
+    def add(self, fault: dict):
+        self.vehicles.setdefault(fault['vehicle_id'], {})[fault['id']] = (
+            fault.get('fault_type_id'), self.shingles(fault.get('description'))
+        )
+
+    def remove(self, vehicle_id: str, fault_id: str):
+        faults = self.vehicles.get(vehicle_id)
+        if faults:
+            faults.pop(fault_id, None)
+            if not faults:
+                del self.vehicles[vehicle_id]
+
+    def find(self, vehicle_id: str, fault_type_id: Optional[str], description: str) -> Optional[tuple]:
+        """The most similar open fault on the vehicle as (fault_id, similarity), if above the threshold."""
+        candidate = self.shingles(description)
+        if not candidate:
+            return None
+        best = None
+        for fault_id, (existing_type, existing) in self.vehicles.get(vehicle_id, {}).items():
+            if fault_type_id and existing_type and fault_type_id != existing_type:
+                continue
+            similarity = len(candidate & existing) / len(candidate | existing)
+            if similarity >= DUPLICATE_FAULT_SIMILARITY and (best is None or similarity > best[1]):
+                best = (fault_id, similarity)
+        return best
+
+station_index = StationIndex()
+coverage_grid = CoverageGrid(station_index)
+duplicate_faults = DuplicateFaultIndex()
+plate_autocomplete = AutocompleteIndex()
+sicil_autocomplete = AutocompleteIndex()
+position_store = VehiclePositionStore(POSITION_GRID_CELL_DEG)
+
+def station_location(station: dict) -> Optional[dict]:
+    if station.get('latitude') is None or station.get('longitude') is None:
+        return None
+    return {"type": "Point", "coordinates": [station['longitude'], station['latitude']]}
+
+thumbnail_client = None
+
+def build_thumbnail(file_id, size: int) -> bytes:
+    """Downscale a stored image to a JPEG thumbnail. Runs inside the process pool.
+
+    The original is read straight from GridFS through a seekable stream, so the upload is never
+    held in memory as a whole or pickled across to the worker.
+    """
+    global thumbnail_client
+    from PIL import Image
+    from gridfs import GridFSBucket
+    from pymongo import MongoClient
+
+    if thumbnail_client is None:
+        thumbnail_client = MongoClient(mongo_url)
+    bucket = GridFSBucket(thumbnail_client[os.environ['DB_NAME']], bucket_name="uploads")
+    with bucket.open_download_stream(file_id) as source, Image.open(source) as image:
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.convert("RGB").save(output, format="JPEG", quality=80)
+        return output.getvalue()
+
+def parse_range(range_header: Optional[str], length: int) -> Optional[tuple]:
+    """Parse a single 'bytes=start-end' range into inclusive offsets."""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else length - 1
+        else:
+            start = max(length - int(end_text), 0)
+            end = length - 1
+    except ValueError:
+        return None
+    if start > end or start >= length:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Geçersiz aralık",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, min(end, length - 1)
+
 # Routes
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
@@ -391,6 +1863,7 @@ async def register(user_data: UserCreate):
     doc['password'] = hashed_password
     
     await db.users.insert_one(doc)
+    sicil_autocomplete.upsert(user_obj.id, user_obj.sicil_no)
     
     # Create token
     token = create_token(user_obj.id, user_obj.role)
@@ -423,7 +1896,11 @@ async def get_me(user: dict = Depends(get_current_user)):
 async def create_station(station: StationCreate, user: dict = Depends(require_manager)):
     station_obj = Station(**station.model_dump())
     doc = station_obj.model_dump()
+    location = station_location(doc)
+    if location:
+        doc['location'] = location
     await db.stations.insert_one(doc)
+    station_index.add_station(doc)
     return station_obj
 
 @api_router.get("/stations", response_model=List[Station])
@@ -442,10 +1919,198 @@ async def get_station(station_id: str, user: dict = Depends(get_current_user)):
 @api_router.post("/vehicles", response_model=Vehicle)
 async def create_vehicle(vehicle: VehicleCreate, user: dict = Depends(require_manager)):
     vehicle_obj = Vehicle(**vehicle.model_dump())
-    doc = vehicle_obj.model_dump()
-    await db.vehicles.insert_one(doc)
+    vehicle_obj.plate = normalize_plate(vehicle_obj.plate)
+    doc = vehicle_obj.model_dump(exclude={'equipment', 'accident_records'})
+    try:
+        await db.vehicles.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Bu plakaya sahip bir araç zaten kayıtlı")
+    invalidate_fault_analytics()
+    station_index.apply_vehicle_change(None, doc)
+    plate_autocomplete.upsert(doc['id'], doc['plate'], doc['station_id'])
+    maintenance_dirty.add(doc['id'])
+    await record_status_transition(doc, None, "created")
     return vehicle_obj
 
+# Vehicle import
+TURKISH_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+def fold_turkish(text: str) -> str:
+    """Lowercase and strip Turkish diacritics so 'İSTASYON', 'istasyon' and 'Istasyon' compare equal."""
+    return text.replace("İ", "i").replace("I", "ı").lower().translate(TURKISH_FOLD)
+
+def search_text(*parts: Optional[str]) -> str:
+    """Folded copy of a document's free text, indexed next to the originals for accent-free matching."""
+    return fold_turkish(" ".join(part for part in parts if part))
+
+VEHICLE_IMPORT_COLUMNS = {
+    "plaka": "plate", "marka": "brand", "yil": "year", "model_yili": "year",
+    "arac_tipi": "vehicle_type", "tip": "vehicle_type", "tur": "vehicle_type",
+    "istasyon": "station", "istasyon_id": "station", "station_id": "station",
+    "durum": "status", "sigorta_bitis": "insurance_expiry", "muayene_bitis": "inspection_expiry",
+    "kasko_bitis": "kasko_expiry", "km": "current_km", "guncel_km": "current_km",
+    "son_yag_degisimi": "last_oil_change_date", "son_yag_degisim_km": "last_oil_change_km",
+    "notlar": "notes", "not": "notes",
+}
+VEHICLE_IMPORT_DATE_FIELDS = {
+    "insurance_expiry", "inspection_expiry", "kasko_expiry", "last_oil_change_date",
+    "next_oil_change_date", "last_inspection_date",
+}
+
+def import_column(header) -> Optional[str]:
+    key = fold_turkish(str(header or "")).strip().replace(" ", "_").replace("-", "_")
+    key = VEHICLE_IMPORT_COLUMNS.get(key, key)
+    return key if key in VehicleCreate.model_fields or key == "station" else None
+
+def import_cell(field: str, value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat() if field in VEHICLE_IMPORT_DATE_FIELDS else value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+def normalize_plate(plate) -> str:
+    return " ".join(str(plate).upper().split())
+
+def open_import_rows(file, filename: str):
+    """Iterate the rows of an uploaded XLSX or CSV without loading the whole sheet."""
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        return workbook.active.iter_rows(values_only=True)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    first_line = text.readline()
+    # Spreadsheets saved with a Turkish locale separate CSV columns with semicolons
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    return csv.reader(itertools.chain([first_line], text), delimiter=delimiter)
+
+async def import_vehicle_chunk(rows: list, stations: dict, seen_plates: set, errors: list) -> dict:
+    """Validate a chunk of parsed rows and upsert them by plate with one unordered bulk write.
+
+    Rows for new plates must be complete vehicles; rows for existing plates may update any subset of columns.
+    """
+    parsed = []
+    for line, data in rows:
+        if data.get('plate'):
+            data['plate'] = normalize_plate(data['plate'])
+        station = data.pop('station', None)
+        if station is not None:
+            station_id = stations.get(str(station)) or stations.get(fold_turkish(str(station)))
+            if not station_id:
+                errors.append({"row": line, "detail": f"İstasyon bulunamadı: {station}"})
+                continue
+            data['station_id'] = station_id
+        parsed.append((line, data))
+
+    existing = {}
+    plates = [data['plate'] for _, data in parsed if data.get('plate')]
+    async for vehicle in db.vehicles.find({"plate": {"$in": plates}}, {"_id": 0}):
+        existing.setdefault(vehicle['plate'], vehicle)
+
+    valid = []
+    for line, data in parsed:
+        try:
+            vehicle = (VehicleUpdate if data.get('plate') in existing else VehicleCreate)(**data)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            errors.append({"row": line, "detail": detail})
+            continue
+        if vehicle.plate in seen_plates:
+            errors.append({"row": line, "detail": f"Plaka dosyada tekrar ediyor: {vehicle.plate}"})
+            continue
+        seen_plates.add(vehicle.plate)
+        valid.append((line, vehicle))
+    if not valid:
+        return {"inserted": 0, "updated": 0}
+
+    operations, changes = [], []
+    for _, vehicle in valid:
+        fields = vehicle.model_dump(mode="json", exclude_unset=True)
+        before = existing.get(vehicle.plate)
+        if before:
+            after = {**before, **fields}
+        else:
+            after = Vehicle(**vehicle.model_dump()).model_dump(mode="json", exclude={'equipment', 'accident_records'})
+        insert_only = {k: v for k, v in after.items() if k not in fields}
+        operations.append(UpdateOne(
+            {"plate": vehicle.plate}, {"$set": fields, "$setOnInsert": insert_only}, upsert=True
+        ))
+        changes.append((before, after))
+    try:
+        await db.vehicles.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        failed = {error['index']: error.get('errmsg', "Yazma hatası") for error in e.details.get('writeErrors', [])}
+        for index, detail in failed.items():
+            errors.append({"row": valid[index][0], "detail": detail})
+        changes = [change for index, change in enumerate(changes) if index not in failed]
+    if changes:
+        invalidate_fault_analytics()
+
+    transitions = []
+    for before, after in changes:
+        station_index.apply_vehicle_change(before, after)
+        plate_autocomplete.upsert(after['id'], after['plate'], after.get('station_id'))
+        maintenance_dirty.add(after['id'])
+        if not before:
+            transitions.append(status_transition_doc(after, None, "created"))
+        elif before.get('status') != after['status']:
+            transitions.append(status_transition_doc(after, before.get('status'), "import"))
+    if transitions:
+        await db.vehicle_status_history.insert_many(transitions)
+    inserted = sum(1 for before, _ in changes if not before)
+    return {"inserted": inserted, "updated": len(changes) - inserted}
+
+@api_router.post("/vehicles/import")
+async def import_vehicles(file: UploadFile = File(...), user: dict = Depends(require_manager)):
+    """Create or update vehicles by plate from an XLSX or CSV sheet, reporting errors per row"""
+    filename = file.filename or ""
+    if not filename.lower().endswith((".xlsx", ".csv")):
+        raise HTTPException(status_code=400, detail="Yalnızca .xlsx veya .csv dosyaları içe aktarılabilir")
+
+    stations = {}
+    for station in await db.stations.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None):
+        stations[station['id']] = station['id']
+        stations[fold_turkish(station['name']).strip()] = station['id']
+
+    try:
+        rows = await asyncio.to_thread(open_import_rows, file.file, filename)
+        header = await asyncio.to_thread(next, rows, None)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Dosya okunamadı")
+    if not header:
+        raise HTTPException(status_code=400, detail="Dosya boş")
+    columns = [import_column(name) for name in header]
+    if "plate" not in columns:
+        raise HTTPException(status_code=400, detail="Plaka sütunu bulunamadı")
+
+    totals = {"rows": 0, "inserted": 0, "updated": 0}
+    errors, seen_plates = [], set()
+    line = 1
+    while True:
+        chunk = await asyncio.to_thread(lambda: list(itertools.islice(rows, VEHICLE_IMPORT_CHUNK_ROWS)))
+        if not chunk:
+            break
+        parsed = []
+        for values in chunk:
+            line += 1
+            data = {}
+            for field, value in zip(columns, values):
+                value = import_cell(field, value) if field else None
+                if value is not None:
+                    data[field] = value
+            if data:
+                parsed.append((line, data))
+        totals['rows'] += len(parsed)
+        result = await import_vehicle_chunk(parsed, stations, seen_plates, errors)
+        totals['inserted'] += result['inserted']
+        totals['updated'] += result['updated']
+
+    return {**totals, "error_count": len(errors), "errors": errors[:1000]}
+
 @api_router.get("/vehicles", response_model=List[Vehicle])
 async def get_vehicles(
     station_id: Optional[str] = None,
@@ -465,7 +2130,7 @@ async def get_vehicles(
     if user['role'] == 'driver' and user.get('station_id'):
         query['station_id'] = user['station_id']
     
-    vehicles = await db.vehicles.find(query, {"_id": 0}).to_list(1000)
+    vehicles = await db.vehicles.find(query, {"_id": 0, "equipment": 0, "accident_records": 0}).to_list(1000)
     return vehicles
 
 @api_router.get("/vehicles/{vehicle_id}", response_model=Vehicle)
@@ -473,6 +2138,12 @@ async def get_vehicle(vehicle_id: str, user: dict = Depends(get_current_user)):
     vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
     if not vehicle:
         raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    vehicle['equipment'] = await db.vehicle_equipment.find(
+        {"vehicle_id": vehicle_id}, {"_id": 0}
+    ).sort("created_at", 1).to_list(None)
+    vehicle['accident_records'] = await db.accident_records.find(
+        {"vehicle_id": vehicle_id}, {"_id": 0}
+    ).sort("date", 1).to_list(None)
     return vehicle
 
 @api_router.put("/vehicles/{vehicle_id}", response_model=Vehicle)
@@ -484,19 +2155,43 @@ async def update_vehicle(
     update_data = {k: v for k, v in vehicle_update.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="Güncellenecek veri bulunamadı")
+    if 'plate' in update_data:
+        update_data['plate'] = normalize_plate(update_data['plate'])
     
-    result = await db.vehicles.update_one({"id": vehicle_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    try:
+        previous = await db.vehicles.find_one_and_update(
+            {"id": vehicle_id},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Bu plakaya sahip bir araç zaten kayıtlı")
+    if not previous:
         raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    invalidate_fault_analytics()
     
-    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
+    vehicle = {**previous, **update_data}
+    station_index.apply_vehicle_change(previous, vehicle)
+    plate_autocomplete.upsert(vehicle_id, vehicle['plate'], vehicle.get('station_id'))
+    if update_data.keys() & MAINTENANCE_VEHICLE_FIELDS.keys():
+        await refresh_maintenance_predictions([vehicle_id])
+    if vehicle.get('status') != previous.get('status'):
+        await record_status_transition(vehicle, previous.get('status'), "manual")
     return vehicle
 
 @api_router.delete("/vehicles/{vehicle_id}")
 async def delete_vehicle(vehicle_id: str, user: dict = Depends(require_manager)):
-    result = await db.vehicles.delete_one({"id": vehicle_id})
-    if result.deleted_count == 0:
+    vehicle = await db.vehicles.find_one_and_delete({"id": vehicle_id}, projection={"_id": 0})
+    if not vehicle:
         raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    await db.vehicle_equipment.delete_many({"vehicle_id": vehicle_id})
+    await db.accident_records.delete_many({"vehicle_id": vehicle_id})
+    await record_status_transition({**vehicle, "status": None}, vehicle.get('status'), "deleted")
+    invalidate_fault_analytics()
+    station_index.apply_vehicle_change(vehicle, None)
+    plate_autocomplete.remove(vehicle_id)
+    await db.maintenance_predictions.delete_many({"vehicle_id": vehicle_id})
     return {"message": "Araç silindi"}
 
 @api_router.post("/vehicles/{vehicle_id}/equipment")
@@ -505,17 +2200,11 @@ async def add_vehicle_equipment(
     equipment: Equipment,
     user: dict = Depends(require_manager)
 ):
-    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
-    if not vehicle:
+    if not await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0, "id": 1}):
         raise HTTPException(status_code=404, detail="Araç bulunamadı")
     
-    equipment_list = vehicle.get('equipment', [])
-    equipment_list.append(equipment.model_dump())
-    
-    await db.vehicles.update_one(
-        {"id": vehicle_id},
-        {"$set": {"equipment": equipment_list}}
-    )
+    equipment_obj = VehicleEquipment(**equipment.model_dump(), vehicle_id=vehicle_id)
+    await db.vehicle_equipment.insert_one(equipment_obj.model_dump())
     return {"message": "Ekipman eklendi"}
 
 @api_router.post("/vehicles/{vehicle_id}/accident")
@@ -524,21 +2213,818 @@ async def add_accident_record(
     accident: AccidentRecord,
     user: dict = Depends(require_manager)
 ):
-    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Araç bulunamadı")
-    
-    accident_records = vehicle.get('accident_records', [])
-    accident_records.append(accident.model_dump())
-    
-    await db.vehicles.update_one(
-        {"id": vehicle_id},
-        {"$set": {
-            "accident_records": accident_records,
-            "status": "accident"
-        }}
-    )
-    return {"message": "Kaza kaydı eklendi"}
+    if not await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    
+    accident_obj = VehicleAccident(**accident.model_dump(), vehicle_id=vehicle_id)
+    await db.accident_records.insert_one(accident_obj.model_dump())
+    await set_vehicle_status(vehicle_id, VehicleStatus.ACCIDENT, "accident", accident_obj.id)
+    return {"message": "Kaza kaydı eklendi"}
+
+@api_router.get("/vehicles/{vehicle_id}/equipment", response_model=List[VehicleEquipment])
+async def get_vehicle_equipment(vehicle_id: str, user: dict = Depends(get_current_user)):
+    equipment = await db.vehicle_equipment.find({"vehicle_id": vehicle_id}, {"_id": 0}).sort("created_at", 1).to_list(None)
+    return equipment
+
+@api_router.get("/vehicles/{vehicle_id}/accidents", response_model=List[VehicleAccident])
+async def get_vehicle_accidents(vehicle_id: str, user: dict = Depends(get_current_user)):
+    accidents = await db.accident_records.find({"vehicle_id": vehicle_id}, {"_id": 0}).sort("date", -1).to_list(None)
+    return accidents
+
+@api_router.get("/equipment/serial/{serial_number}")
+async def find_equipment_by_serial(serial_number: str, user: dict = Depends(get_current_user)):
+    """Fleet-wide lookup of equipment by serial number, with the vehicle carrying it"""
+    equipment = await db.vehicle_equipment.find({"serial_number": serial_number}, {"_id": 0}).to_list(100)
+    vehicles = await fetch_by_ids(
+        db.vehicles, {e['vehicle_id'] for e in equipment}, {"plate": 1, "station_id": 1}
+    )
+    return [
+        {**item, "plate": vehicles.get(item['vehicle_id'], {}).get('plate'), "station_id": vehicles.get(item['vehicle_id'], {}).get('station_id')}
+        for item in equipment
+    ]
+
+async def migrate_fault_triage_fields() -> int:
+    """Give faults created before the triage queue a normalized priority, its rank and their station."""
+    faults = await db.faults.find(
+        {"priority_rank": {"$exists": False}}, {"_id": 0, "id": 1, "vehicle_id": 1, "priority": 1}
+    ).to_list(None)
+    if not faults:
+        return 0
+    vehicles = await db.vehicles.find(
+        {"id": {"$in": list({f['vehicle_id'] for f in faults})}}, {"_id": 0, "id": 1, "station_id": 1}
+    ).to_list(None)
+    stations = {v['id']: v.get('station_id') for v in vehicles}
+    operations = []
+    for fault in faults:
+        priority = normalize_priority(fault.get('priority'))
+        operations.append(UpdateOne({"id": fault['id']}, {"$set": {
+            "priority": priority,
+            "priority_rank": PRIORITY_RANKS[priority],
+            "station_id": stations.get(fault['vehicle_id']),
+        }}))
+    await db.faults.bulk_write(operations, ordered=False)
+    return len(operations)
+
+async def migrate_search_text() -> int:
+    """Fill the folded search_text field on faults and requests written before search existed."""
+    migrated = 0
+    for collection, fields in ((db.faults, ("description", "resolution_notes")), (db.requests, ("title", "description"))):
+        operations = []
+        async for doc in collection.find({"search_text": {"$exists": False}}, {"_id": 0, "id": 1, **{f: 1 for f in fields}}):
+            operations.append(UpdateOne(
+                {"id": doc['id']}, {"$set": {"search_text": search_text(*(doc.get(f) for f in fields))}}
+            ))
+            if len(operations) == 1000:
+                await collection.bulk_write(operations, ordered=False)
+                migrated += len(operations)
+                operations = []
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+    return migrated
+
+async def migrate_vehicle_plates() -> int:
+    """Normalize plates stored before imports and the vehicle forms normalized them."""
+    operations = []
+    async for vehicle in db.vehicles.find({"plate": {"$type": "string"}}, {"_id": 0, "id": 1, "plate": 1}):
+        plate = normalize_plate(vehicle['plate'])
+        if plate != vehicle['plate']:
+            operations.append(UpdateOne({"id": vehicle['id']}, {"$set": {"plate": plate}}))
+    if not operations:
+        return 0
+    try:
+        await db.vehicles.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        logger.error("Could not normalize %d plates: %s", len(e.details.get('writeErrors', [])), e.details.get('writeErrors'))
+        return e.details.get('nModified', 0)
+    return len(operations)
+
+async def migrate_assignment_bounds() -> int:
+    """Store parsed start and end times on assignments written before overlaps were queried on them."""
+    operations = []
+    async for assignment in db.assignments.find(
+        {"starts_at": {"$exists": False}}, {"_id": 0, "id": 1, "start_date": 1, "end_date": 1}
+    ):
+        try:
+            bounds = assignment_bounds(assignment)
+        except ValueError:
+            logger.warning("Skipping assignment %s with unparseable dates", assignment['id'])
+            continue
+        operations.append(UpdateOne({"id": assignment['id']}, {"$set": bounds}))
+    if operations:
+        await db.assignments.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def migrated_records(model, kind: str, vehicle_id: str, items: Optional[list]) -> tuple:
+    """Validate embedded records into collection documents, returning (documents, rejected items)."""
+    documents, rejected = [], []
+    for i, item in enumerate(items or []):
+        try:
+            documents.append(model(**{
+                **item, "vehicle_id": vehicle_id, "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{kind}/{vehicle_id}/{i}"))
+            }).model_dump())
+        except (ValidationError, TypeError) as e:
+            logger.warning("Skipping malformed %s record %d on vehicle %s: %s", kind, i, vehicle_id, e)
+            rejected.append(item)
+    return documents, rejected
+
+async def migrate_embedded_vehicle_arrays() -> int:
+    """Move equipment and accident records embedded in vehicle documents into their own collections.
+
+    Ids are derived from the vehicle id and array position, so a rerun after an interruption
+    upserts the same documents instead of duplicating them.
+    """
+    migrated = 0
+    cursor = db.vehicles.find(
+        {"$or": [{"equipment.0": {"$exists": True}}, {"accident_records.0": {"$exists": True}}]},
+        {"_id": 0, "id": 1, "equipment": 1, "accident_records": 1}
+    )
+    async for vehicle in cursor:
+        equipment, bad_equipment = migrated_records(VehicleEquipment, "equipment", vehicle['id'], vehicle.get('equipment'))
+        accidents, bad_accidents = migrated_records(VehicleAccident, "accident", vehicle['id'], vehicle.get('accident_records'))
+        if equipment:
+            await db.vehicle_equipment.bulk_write([
+                UpdateOne({"id": doc['id']}, {"$setOnInsert": doc}, upsert=True) for doc in equipment
+            ], ordered=False)
+        if accidents:
+            await db.accident_records.bulk_write([
+                UpdateOne({"id": doc['id']}, {"$setOnInsert": doc}, upsert=True) for doc in accidents
+            ], ordered=False)
+        # An array with malformed records stays embedded, so nothing is lost and the next startup
+        # retries it; the records already copied keep their position-derived ids
+        unset = {
+            field: "" for field, rejected in (("equipment", bad_equipment), ("accident_records", bad_accidents))
+            if not rejected
+        }
+        if unset:
+            await db.vehicles.update_one({"id": vehicle['id']}, {"$unset": unset})
+        migrated += 1
+    return migrated
+
+# Uploads
+def uploads_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name="uploads")
+
+async def store_upload(file: UploadFile, user: dict) -> dict:
+    """Stream an upload into GridFS chunk by chunk, hashing as it goes, and dedupe by content."""
+    bucket = uploads_bucket()
+    content_type = file.content_type or "application/octet-stream"
+    grid_in = bucket.open_upload_stream(
+        file.filename or "upload",
+        metadata={"content_type": content_type, "uploaded_by": user['id']}
+    )
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Dosya boyutu sınırı aşıldı")
+            digest.update(chunk)
+            await grid_in.write(chunk)
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    # Claim the hash on our file: the unique index lets exactly one of several concurrent
+    # identical uploads keep it, and the others fall back to that stored copy
+    sha256 = digest.hexdigest()
+    try:
+        await db["uploads.files"].update_one({"_id": grid_in._id}, {"$set": {"metadata.sha256": sha256}})
+    except DuplicateKeyError:
+        await bucket.delete(grid_in._id)
+        existing = await db["uploads.files"].find_one({"metadata.sha256": sha256}, {"metadata": 1, "length": 1})
+        return {"sha256": sha256, "size": existing['length'], "deduplicated": True, **existing['metadata']}
+
+    metadata = {"content_type": content_type, "uploaded_by": user['id'], "sha256": sha256, "thumbnail_id": None}
+    if content_type.startswith("image/"):
+        loop = asyncio.get_running_loop()
+        try:
+            thumbnail = await loop.run_in_executor(process_executor, build_thumbnail, grid_in._id, THUMBNAIL_SIZE)
+        except Exception:
+            logger.warning("Could not create a thumbnail for upload %s", sha256)
+        else:
+            metadata['thumbnail_id'] = await bucket.upload_from_stream(
+                f"{sha256}-thumbnail.jpg",
+                thumbnail,
+                metadata={"content_type": "image/jpeg", "thumbnail_of": sha256}
+            )
+    await db["uploads.files"].update_one({"_id": grid_in._id}, {"$set": {"metadata": metadata}})
+    return {"sha256": sha256, "size": size, "deduplicated": False, **metadata}
+
+def upload_response(stored: dict) -> dict:
+    return {
+        "sha256": stored['sha256'],
+        "size": stored['size'],
+        "content_type": stored['content_type'],
+        "deduplicated": stored['deduplicated'],
+        "url": f"/api/uploads/{stored['sha256']}",
+        "thumbnail_url": f"/api/uploads/{stored['sha256']}?thumbnail=true" if stored.get('thumbnail_id') else None,
+    }
+
+@api_router.post("/uploads")
+async def upload_file(file: UploadFile = File(...), user: dict = Depends(get_current_user)):
+    return upload_response(await store_upload(file, user))
+
+@api_router.get("/uploads/{sha256}")
+async def download_file(
+    sha256: str,
+    thumbnail: bool = False,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    user: dict = Depends(get_current_user)
+):
+    """Stream an upload (or its thumbnail), honouring single HTTP Range requests"""
+    stored = await db["uploads.files"].find_one({"metadata.sha256": sha256}, {"metadata": 1})
+    if not stored:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+    file_id = stored['_id']
+    etag = f'"{sha256}"'
+    if thumbnail:
+        file_id = stored['metadata'].get('thumbnail_id')
+        etag = f'"{sha256}-thumbnail"'
+        if not file_id:
+            raise HTTPException(status_code=404, detail="Küçük resim bulunamadı")
+
+    # Content-addressed, so a given URL never changes
+    headers = {
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    grid_out = await uploads_bucket().open_download_stream(file_id)
+    content_type = (grid_out.metadata or {}).get('content_type', "application/octet-stream")
+    byte_range = parse_range(range_header, grid_out.length)
+    start, end = byte_range or (0, grid_out.length - 1)
+    if byte_range:
+        headers['Content-Range'] = f"bytes {start}-{end}/{grid_out.length}"
+    headers['Content-Length'] = str(end - start + 1)
+
+    async def stream():
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(UPLOAD_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    return StreamingResponse(
+        stream(), status_code=206 if byte_range else 200, media_type=content_type, headers=headers
+    )
+
+@api_router.post("/vehicles/{vehicle_id}/photos")
+async def add_vehicle_photo(vehicle_id: str, file: UploadFile = File(...), user: dict = Depends(require_manager)):
+    if not await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    uploaded = upload_response(await store_upload(file, user))
+    await db.vehicles.update_one({"id": vehicle_id}, {"$addToSet": {"photos": uploaded['url']}})
+    return uploaded
+
+@api_router.post("/vehicles/{vehicle_id}/accidents/{accident_id}/photos")
+async def add_accident_photo(
+    vehicle_id: str,
+    accident_id: str,
+    file: UploadFile = File(...),
+    user: dict = Depends(require_manager)
+):
+    if not await db.accident_records.find_one({"id": accident_id, "vehicle_id": vehicle_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Kaza kaydı bulunamadı")
+    uploaded = upload_response(await store_upload(file, user))
+    await db.accident_records.update_one({"id": accident_id}, {"$addToSet": {"photos": uploaded['url']}})
+    return uploaded
+
+# Dispatch
+@api_router.get("/dispatch/nearest")
+async def get_nearest_stations(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    vehicle_type: VehicleType = Query(...),
+    k: int = Query(5, ge=1, le=50),
+    user: dict = Depends(get_current_user)
+):
+    """Closest stations that currently have an active vehicle of the requested type"""
+    return station_index.nearest(latitude, longitude, vehicle_type, k)
+
+@api_router.get("/dispatch/coverage")
+async def get_coverage_map(
+    vehicle_type: VehicleType = Query(...),
+    max_km: float = Query(5.0, gt=0),
+    user: dict = Depends(get_current_user)
+):
+    """Grid of nearest operational station and distance per cell, row-major from the south-west corner"""
+    return coverage_grid.payload(vehicle_type, max_km)
+
+# Maintenance predictions
+MAINTENANCE_VEHICLE_FIELDS = {
+    "_id": 0, "id": 1, "plate": 1, "station_id": 1, "current_km": 1, "next_oil_change_km": 1,
+    "next_oil_change_date": 1, "inspection_expiry": 1, "insurance_expiry": 1, "kasko_expiry": 1
+}
+
+def predict_maintenance(vehicles: list, km_rates: dict, today: datetime) -> list:
+    """Predicted due date per vehicle and maintenance item, computed column-wise over the fleet.
+
+    Oil changes are due at whichever comes first: the scheduled date or the day the vehicle is
+    expected to reach next_oil_change_km at its recent daily km rate.
+    """
+    df = pd.DataFrame(vehicles, columns=[
+        "id", "plate", "station_id", "current_km", "next_oil_change_km",
+        "next_oil_change_date", "inspection_expiry", "insurance_expiry", "kasko_expiry"
+    ])
+    if df.empty:
+        return []
+    today_ts = pd.Timestamp(today.date())
+    df['km_rate'] = df['id'].map(km_rates).astype(float)
+
+    km_left = pd.to_numeric(df['next_oil_change_km'], errors='coerce') - pd.to_numeric(df['current_km'], errors='coerce')
+    days_to_km = np.where(df['km_rate'] > 0, np.ceil(km_left.clip(lower=0) / df['km_rate']), np.nan)
+    due_by_km = today_ts + pd.to_timedelta(days_to_km, unit='D')
+    due_by_date = {
+        field: pd.to_datetime(df[field], errors='coerce', utc=True, format="mixed").dt.tz_localize(None).dt.normalize()
+        for field in ("next_oil_change_date", "inspection_expiry", "insurance_expiry", "kasko_expiry")
+    }
+    oil_change = pd.concat([due_by_date['next_oil_change_date'], pd.Series(due_by_km)], axis=1).min(axis=1)
+    oil_basis = np.where(
+        due_by_date['next_oil_change_date'].isna() | (pd.Series(due_by_km) < due_by_date['next_oil_change_date']),
+        "km", "date"
+    )
+
+    items = pd.concat([
+        pd.DataFrame({"vehicle_id": df['id'], "item": "oil_change", "due": oil_change, "basis": oil_basis}),
+        pd.DataFrame({"vehicle_id": df['id'], "item": "inspection", "due": due_by_date['inspection_expiry'], "basis": "date"}),
+        pd.DataFrame({"vehicle_id": df['id'], "item": "insurance", "due": due_by_date['insurance_expiry'], "basis": "date"}),
+        pd.DataFrame({"vehicle_id": df['id'], "item": "kasko", "due": due_by_date['kasko_expiry'], "basis": "date"}),
+    ], ignore_index=True).dropna(subset=['due'])
+    items = items.merge(df[['id', 'plate', 'station_id']], left_on='vehicle_id', right_on='id', how='left')
+    items['days_left'] = (items['due'] - today_ts).dt.days
+
+    refreshed_at = today.isoformat()
+    return [
+        {
+            "vehicle_id": row.vehicle_id,
+            "plate": row.plate,
+            "station_id": row.station_id,
+            "item": row.item,
+            "due_date": row.due.date().isoformat(),
+            "basis": row.basis,
+            "days_left": int(row.days_left),
+            "refreshed_at": refreshed_at,
+        }
+        for row in items.itertuples(index=False)
+    ]
+
+async def refresh_maintenance_predictions(vehicle_ids: Optional[List[str]] = None) -> int:
+    """Recompute predictions for the given vehicles, or for the whole fleet when None.
+
+    Rows are upserted by (vehicle_id, item) and only rows for items no longer due are deleted, so
+    overlapping full and partial refreshes never leave duplicate or missing rows behind.
+    """
+    vehicle_query = {} if vehicle_ids is None else {"id": {"$in": list(vehicle_ids)}}
+    vehicles = await db.vehicles.find(vehicle_query, MAINTENANCE_VEHICLE_FIELDS).to_list(None)
+    ids = [v['id'] for v in vehicles]
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=MAINTENANCE_RATE_WINDOW_DAYS)).date().isoformat()
+    usage = await db.odometer_readings.aggregate([
+        {"$match": {"vehicle_id": {"$in": ids}, "day": {"$gte": cutoff}}},
+        {"$group": {
+            "_id": "$vehicle_id",
+            "min_km": {"$min": "$min_km"},
+            "max_km": {"$max": "$max_km"},
+            "first_day": {"$min": "$day"},
+            "last_day": {"$max": "$day"}
+        }}
+    ]).to_list(None)
+    km_rates = {}
+    for row in usage:
+        span_days = (datetime.fromisoformat(row['last_day']) - datetime.fromisoformat(row['first_day'])).days
+        if span_days > 0:
+            km_rates[row['_id']] = (row['max_km'] - row['min_km']) / span_days
+
+    predictions = await asyncio.to_thread(predict_maintenance, vehicles, km_rates, datetime.now(timezone.utc))
+    operations = [
+        UpdateOne({"vehicle_id": p['vehicle_id'], "item": p['item']}, {"$set": p}, upsert=True)
+        for p in predictions
+    ]
+    due_items = {}
+    for prediction in predictions:
+        due_items.setdefault(prediction['vehicle_id'], []).append(prediction['item'])
+    operations.extend(
+        DeleteMany({"vehicle_id": vehicle_id, "item": {"$nin": due_items.get(vehicle_id, [])}})
+        for vehicle_id in ids
+    )
+    # Rows of vehicles that were deleted, or requested but no longer exist
+    stale = {"vehicle_id": {"$nin": ids}}
+    if vehicle_ids is not None:
+        stale['vehicle_id']['$in'] = list(vehicle_ids)
+    operations.append(DeleteMany(stale))
+    try:
+        await db.maintenance_predictions.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent refresh upserting the same row first is fine; anything else is not
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+    return len(predictions)
+
+async def maintenance_prediction_loop():
+    last_full_refresh = None
+    while True:
+        try:
+            today = datetime.now(timezone.utc).date()
+            if last_full_refresh != today:
+                # days_left and km rates drift daily, so rebuild everything once a day
+                maintenance_dirty.clear()
+                await refresh_maintenance_predictions()
+                last_full_refresh = today
+            elif maintenance_dirty:
+                vehicle_ids = list(maintenance_dirty)
+                maintenance_dirty.clear()
+                await refresh_maintenance_predictions(vehicle_ids)
+        except Exception:
+            logger.exception("Maintenance prediction refresh failed")
+        await asyncio.sleep(MAINTENANCE_REFRESH_SECONDS)
+
+@api_router.get("/maintenance/calendar")
+async def get_maintenance_calendar(
+    end_date: Optional[str] = None,
+    station_id: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Predicted maintenance due up to end_date (overdue first), grouped by station and week"""
+    try:
+        end = datetime.fromisoformat(end_date).date() if end_date else (datetime.now(timezone.utc) + timedelta(days=60)).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih biçimi")
+    if user['role'] == 'driver' and user.get('station_id'):
+        station_id = user['station_id']
+    query = {"due_date": {"$lte": end.isoformat()}}
+    if station_id:
+        query['station_id'] = station_id
+    predictions = await db.maintenance_predictions.find(query, {"_id": 0}).sort("due_date", 1).to_list(None)
+
+    today = datetime.now(timezone.utc).date()
+    this_week = today - timedelta(days=today.weekday())
+    groups = {}
+    for prediction in predictions:
+        due = datetime.fromisoformat(prediction['due_date']).date()
+        # Overdue items are batched into the current week's visit
+        week = max(due - timedelta(days=due.weekday()), this_week)
+        group = groups.setdefault((week.isoformat(), prediction['station_id']), {
+            "week": week.isoformat(),
+            "station_id": prediction['station_id'],
+            "overdue": 0,
+            "items": []
+        })
+        group['overdue'] += prediction['days_left'] < 0
+        group['items'].append(prediction)
+    return sorted(groups.values(), key=lambda g: (g['week'], -g['overdue'], g['station_id'] or ""))
+
+# Maintenance history
+def encode_cursor(*values: str) -> str:
+    return base64.urlsafe_b64encode("|".join(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, parts: int) -> List[str]:
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split("|")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+    if len(values) != parts:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+    return values
+
+def maintenance_vehicle_update(event: dict) -> Optional[UpdateOne]:
+    """Guarded update that copies an event onto the vehicle's last_*/next_* fields.
+
+    The filter only matches while the vehicle has no newer event of the same type, so the
+    denormalized fields always reflect the newest event even when batches arrive out of order.
+    """
+    if event['type'] == "oil_change":
+        guard_field = "last_oil_change_date"
+        fields = {
+            "last_oil_change_date": event['date'],
+            "last_oil_change_km": event['km'],
+            "next_oil_change_date": event.get('next_maintenance_date'),
+            "next_oil_change_km": event.get('next_maintenance_km'),
+        }
+    elif event['type'] == "inspection":
+        guard_field = "last_inspection_date"
+        fields = {"last_inspection_date": event['date'], "inspection_expiry": event.get('next_maintenance_date')}
+    else:
+        return None
+    return UpdateOne(
+        {"id": event['vehicle_id'], "$or": [{guard_field: None}, {guard_field: {"$lte": event['date']}}]},
+        {"$set": {k: v for k, v in fields.items() if v is not None}}
+    )
+
+async def record_maintenance_events(events: List[dict]):
+    """Store maintenance events, then copy the newest ones onto their vehicles.
+
+    The event insert and the vehicle update are separate writes, not a transaction (that would
+    need a replica set). If the second write fails the events are still the record;
+    the vehicle's last_*/next_* fields catch up with the next event of the same type, since the
+    guarded update always applies the newest date it sees.
+    """
+    await db.maintenance_records.insert_many([dict(event) for event in events], ordered=False)
+
+    newest = {}
+    for event in events:
+        key = (event['vehicle_id'], event['type'])
+        if key not in newest or event['date'] >= newest[key]['date']:
+            newest[key] = event
+    updates = [update for update in map(maintenance_vehicle_update, newest.values()) if update]
+    latest_km = {}
+    for event in events:
+        latest_km[event['vehicle_id']] = max(event['km'], latest_km.get(event['vehicle_id'], 0))
+
+    if updates:
+        await db.vehicles.bulk_write(updates, ordered=False)
+    await raise_current_km(latest_km)
+    await refresh_maintenance_predictions(list(latest_km))
+
+async def paginate_maintenance(query: dict, cursor: Optional[str], limit: int) -> dict:
+    if cursor:
+        date, event_id = decode_cursor(cursor, parts=2)
+        query = {**query, "$or": [{"date": {"$lt": date}}, {"date": date, "id": {"$lt": event_id}}]}
+    events = await db.maintenance_records.find(query, {"_id": 0}).sort(
+        [("date", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_cursor(events[-1]['date'], events[-1]['id'])
+    return {"items": events, "next_cursor": next_cursor}
+
+@api_router.post("/vehicles/{vehicle_id}/maintenance", response_model=MaintenanceEvent)
+async def add_maintenance_record(
+    vehicle_id: str,
+    record: MaintenanceRecord,
+    user: dict = Depends(require_manager)
+):
+    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0, "station_id": 1})
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    event = MaintenanceEvent(
+        **record.model_dump(), vehicle_id=vehicle_id, station_id=vehicle.get('station_id'), recorded_by=user['id']
+    )
+    await record_maintenance_events([event.model_dump()])
+    return event
+
+@api_router.post("/maintenance/records/bulk")
+async def add_maintenance_records_bulk(records: List[MaintenanceEventCreate], user: dict = Depends(require_manager)):
+    """Record a service day's maintenance for many vehicles at once"""
+    vehicle_ids = {record.vehicle_id for record in records}
+    stations = {
+        v['id']: v.get('station_id') for v in await db.vehicles.find(
+            {"id": {"$in": list(vehicle_ids)}}, {"_id": 0, "id": 1, "station_id": 1}
+        ).to_list(None)
+    }
+    events = []
+    errors = []
+    for index, record in enumerate(records):
+        if record.vehicle_id not in stations:
+            errors.append({"index": index, "detail": "Araç bulunamadı"})
+            continue
+        events.append(MaintenanceEvent(
+            **record.model_dump(), station_id=stations[record.vehicle_id], recorded_by=user['id']
+        ).model_dump())
+    if events:
+        await record_maintenance_events(events)
+    return {"inserted": len(events), "errors": errors}
+
+@api_router.get("/vehicles/{vehicle_id}/maintenance")
+async def get_vehicle_maintenance(
+    vehicle_id: str,
+    type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user: dict = Depends(get_current_user)
+):
+    query = {"vehicle_id": vehicle_id}
+    if type:
+        query['type'] = type
+    return await paginate_maintenance(query, cursor, limit)
+
+@api_router.get("/stations/{station_id}/maintenance")
+async def get_station_maintenance(
+    station_id: str,
+    type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user: dict = Depends(get_current_user)
+):
+    query = {"station_id": station_id}
+    if type:
+        query['type'] = type
+    return await paginate_maintenance(query, cursor, limit)
+
+# Telemetry
+async def store_odometer_readings(readings: list):
+    """Append (vehicle_id, moment, km) readings to per-vehicle daily bucket documents.
+
+    Each bucket keeps its raw points plus running min/max, so daily usage can be read
+    without touching the points themselves.
+    """
+    buckets = {}
+    for vehicle_id, moment, km in readings:
+        key = (vehicle_id, moment.astimezone(timezone.utc).date().isoformat())
+        buckets.setdefault(key, []).append((moment, km))
+    if not buckets:
+        return
+    await db.odometer_readings.bulk_write([
+        UpdateOne(
+            {"vehicle_id": vehicle_id, "day": day},
+            {
+                "$push": {"readings": {"$each": [{"timestamp": moment, "km": km} for moment, km in points]}},
+                "$inc": {"count": len(points)},
+                "$min": {"min_km": min(km for _, km in points), "first_at": min(m for m, _ in points)},
+                "$max": {"max_km": max(km for _, km in points), "last_at": max(m for m, _ in points)},
+            },
+            upsert=True
+        )
+        for (vehicle_id, day), points in buckets.items()
+    ], ordered=False)
+
+async def raise_current_km(latest_km: dict):
+    if not latest_km:
+        return
+    # One write per vehicle per batch; $max keeps odometers from moving backwards
+    await db.vehicles.bulk_write([
+        UpdateOne({"id": vehicle_id}, {"$max": {"current_km": km}})
+        for vehicle_id, km in latest_km.items()
+    ], ordered=False)
+    invalidate_fault_analytics()
+    maintenance_dirty.update(latest_km)
+
+async def compact_odometer_buckets() -> int:
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ODOMETER_RAW_RETENTION_DAYS)).date().isoformat()
+    result = await db.odometer_readings.update_many(
+        {"day": {"$lt": cutoff}, "readings": {"$exists": True}},
+        {"$unset": {"readings": ""}}
+    )
+    return result.modified_count
+
+async def odometer_retention_loop():
+    while True:
+        try:
+            await compact_odometer_buckets()
+        except Exception:
+            logger.exception("Odometer retention job failed")
+        await asyncio.sleep(86400)
+
+async def known_vehicle_ids(vehicle_ids: set) -> set:
+    """The subset of telemetry vehicle ids that belong to stored vehicles."""
+    return {
+        v['id'] for v in await db.vehicles.find({"id": {"$in": list(vehicle_ids)}}, {"_id": 0, "id": 1}).to_list(None)
+    }
+
+@api_router.post("/telemetry/odometer")
+async def ingest_odometer(readings: List[OdometerReading], user: dict = Depends(get_current_user)):
+    # Unknown vehicles would otherwise get bucket documents and be queued for maintenance refreshes
+    known_ids = await known_vehicle_ids({reading.vehicle_id for reading in readings})
+    points = []
+    latest_km = {}
+    for reading in readings:
+        if reading.vehicle_id not in known_ids:
+            continue
+        try:
+            moment = datetime.fromisoformat(reading.timestamp)
+        except ValueError:
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        points.append((reading.vehicle_id, moment, reading.km))
+        latest_km[reading.vehicle_id] = max(reading.km, latest_km.get(reading.vehicle_id, 0))
+    await store_odometer_readings(points)
+    await raise_current_km(latest_km)
+    return {"received": len(readings), "accepted": len(points)}
+
+@api_router.get("/vehicles/{vehicle_id}/odometer")
+async def get_vehicle_odometer(
+    vehicle_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_readings: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    """Daily km usage for a vehicle, read from its bucket documents"""
+    start, end = parse_window(start_date, end_date, default_days=90)
+    projection = {"_id": 0, "day": 1, "count": 1, "min_km": 1, "max_km": 1}
+    if include_readings:
+        projection['readings'] = 1
+    buckets = await db.odometer_readings.find(
+        {"vehicle_id": vehicle_id, "day": {"$gte": start.date().isoformat(), "$lte": end.date().isoformat()}},
+        projection
+    ).sort("day", 1).to_list(None)
+
+    days = []
+    previous_max = None
+    for bucket in buckets:
+        # Usage since the previous day's last reading, so driving between buckets isn't lost
+        baseline = previous_max if previous_max is not None else bucket['min_km']
+        entry = {
+            "date": bucket['day'],
+            "min_km": bucket['min_km'],
+            "max_km": bucket['max_km'],
+            "km_delta": max(bucket['max_km'] - baseline, 0),
+            "readings": bucket['count'],
+        }
+        if include_readings:
+            entry['points'] = [
+                {"timestamp": p['timestamp'].replace(tzinfo=timezone.utc).isoformat(), "km": p['km']}
+                for p in bucket.get('readings', [])
+            ]
+        days.append(entry)
+        previous_max = bucket['max_km']
+
+    daily_usage_rate = None
+    if len(buckets) >= 2:
+        span_days = (datetime.fromisoformat(buckets[-1]['day']) - datetime.fromisoformat(buckets[0]['day'])).days
+        daily_usage_rate = (buckets[-1]['max_km'] - buckets[0]['min_km']) / max(span_days, 1)
+
+    return {"vehicle_id": vehicle_id, "daily_usage_rate": daily_usage_rate, "days": days}
+
+@api_router.post("/telemetry/positions")
+async def ingest_positions(readings: List[PositionReading], user: dict = Depends(get_current_user)):
+    """Batched GPS readings: updates the live position index, stores downsampled history and odometers"""
+    # Order by the parsed instant: raw strings with different UTC offsets do not sort chronologically
+    parsed = []
+    for reading in readings:
+        try:
+            moment = datetime.fromisoformat(reading.timestamp)
+        except ValueError:
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        parsed.append((moment.timestamp(), moment, reading))
+    parsed.sort(key=lambda item: item[0])
+
+    # Only known vehicles enter the in-memory index, so unknown ids cannot grow it without bound
+    known_ids = await known_vehicle_ids({reading.vehicle_id for _, _, reading in parsed})
+
+    history = []
+    persisted = {}
+    latest_km = {}
+    odometer_points = []
+    accepted = 0
+    for epoch, moment, reading in parsed:
+        if reading.vehicle_id not in known_ids:
+            continue
+        if not position_store.update(reading.vehicle_id, reading.latitude, reading.longitude, epoch, reading.km):
+            continue
+        accepted += 1
+        if reading.km is not None:
+            latest_km[reading.vehicle_id] = max(reading.km, latest_km.get(reading.vehicle_id, 0))
+
+        # Keep one history point per vehicle per interval
+        persisted_at = persisted.get(reading.vehicle_id, position_store.persisted_at.get(reading.vehicle_id))
+        if persisted_at is None or epoch - persisted_at >= POSITION_HISTORY_INTERVAL_SECONDS:
+            persisted[reading.vehicle_id] = epoch
+            if reading.km is not None:
+                odometer_points.append((reading.vehicle_id, moment, reading.km))
+            history.append({
+                "vehicle_id": reading.vehicle_id,
+                "timestamp": moment,
+                "location": {"type": "Point", "coordinates": [reading.longitude, reading.latitude]},
+                "km": reading.km,
+            })
+
+    if history:
+        await db.vehicle_positions.insert_many(history, ordered=False)
+        # Advance the downsampling clock only once the points are stored, so a failed insert is retried
+        position_store.persisted_at.update(persisted)
+    await store_odometer_readings(odometer_points)
+    await raise_current_km(latest_km)
+
+    return {"received": len(readings), "accepted": accepted, "persisted": len(history)}
+
+@api_router.get("/telemetry/positions")
+async def get_positions(vehicle_ids: Optional[str] = None, user: dict = Depends(get_current_user)):
+    if vehicle_ids:
+        return position_store.get(vehicle_ids.split(','))
+    return position_store.get(position_store.vehicle_ids)
+
+@api_router.get("/telemetry/positions/nearby")
+async def get_positions_nearby(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=200),
+    user: dict = Depends(get_current_user)
+):
+    return position_store.within_radius(latitude, longitude, radius_km)
+
+@api_router.get("/telemetry/positions/within")
+async def get_positions_within(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    user: dict = Depends(get_current_user)
+):
+    return position_store.within_box(south, west, north, east)
 
 # Services
 @api_router.post("/services", response_model=Service)
@@ -583,31 +3069,53 @@ async def delete_fault_type(fault_type_id: str, user: dict = Depends(require_man
 # Faults
 @api_router.post("/faults", response_model=Fault)
 async def create_fault(fault: FaultCreate, user: dict = Depends(get_current_user)):
+    # A near-duplicate of an open fault on the same vehicle is attached to it, without a new
+    # fault, counter change or manager notifications
+    duplicate = duplicate_faults.find(fault.vehicle_id, fault.fault_type_id, fault.description)
+    if duplicate:
+        fault_id, similarity = duplicate
+        report = DuplicateReport(reported_by=user['id'], description=fault.description, similarity=round(similarity, 3))
+        existing = await db.faults.find_one_and_update(
+            {"id": fault_id, "status": {"$ne": FaultStatus.RESOLVED.value}},
+            {"$push": {"duplicate_reports": report.model_dump()}, "$inc": {"duplicate_count": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if existing:
+            return existing
+        duplicate_faults.remove(fault.vehicle_id, fault_id)
+
     fault_data = fault.model_dump()
     fault_data['reported_by'] = user['id']
+    fault_data['priority'] = normalize_priority(fault.priority)
+    fault_data['priority_rank'] = PRIORITY_RANKS[fault_data['priority']]
     fault_obj = Fault(**fault_data)
+    
+    vehicle = await db.vehicles.find_one({"id": fault.vehicle_id}, {"_id": 0})
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Araç bulunamadı")
+    fault_obj.station_id = vehicle.get('station_id')
     doc = fault_obj.model_dump()
+    doc['search_text'] = search_text(doc['description'])
     await db.faults.insert_one(doc)
-    
-    # Update vehicle status
-    await db.vehicles.update_one(
-        {"id": fault.vehicle_id},
-        {"$set": {"status": "faulty"}}
-    )
+    # Count the open fault only once it is stored, which also marks the vehicle faulty
+    vehicle = await update_open_fault_count(fault.vehicle_id, "fault", fault_obj.id, delta=1) or vehicle
+    duplicate_faults.add(doc)
+    await record_fault_rollup(doc, vehicle, "created", datetime.fromisoformat(fault_obj.created_at))
+    invalidate_fault_analytics()
     
     # Create notification for managers
-    managers = await db.users.find({"role": "manager"}, {"_id": 0}).to_list(1000)
-    vehicle = await db.vehicles.find_one({"id": fault.vehicle_id}, {"_id": 0})
-    
-    for manager in managers:
-        notif = Notification(
+    managers = await db.users.find({"role": "manager"}, {"_id": 0, "id": 1}).to_list(1000)
+    await send_notifications([
+        Notification(
             user_id=manager['id'],
             title="Yeni Arıza Bildirimi",
             message=f"{vehicle.get('plate', 'Bilinmeyen')} plakalı araçta {user['name']} tarafından arıza bildirildi",
             type="fault",
             related_id=fault_obj.id
         )
-        await db.notifications.insert_one(notif.model_dump())
+        for manager in managers
+    ])
     
     return fault_obj
 
@@ -636,6 +3144,88 @@ async def get_faults(
     faults = await db.faults.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return faults
 
+@api_router.get("/faults/queue", response_model=List[Fault])
+async def get_fault_queue(
+    station_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user: dict = Depends(require_manager)
+):
+    """Claimable pending faults in triage order: priority first, then oldest"""
+    now = datetime.now(timezone.utc).isoformat()
+    return await db.faults.find(queue_filter(now, station_id), {"_id": 0}).sort(
+        [("priority_rank", 1), ("created_at", 1)]
+    ).to_list(limit)
+
+@api_router.get("/faults/queue/depth")
+async def get_fault_queue_depth(user: dict = Depends(require_manager)):
+    """Pending faults per station, split into queued and currently leased"""
+    now = datetime.now(timezone.utc).isoformat()
+    rows = await db.faults.aggregate([
+        {"$match": {"status": FaultStatus.PENDING.value}},
+        {"$group": {
+            "_id": "$station_id",
+            "pending": {"$sum": 1},
+            "leased": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$lease_expires_at", ""]}, now]}, 1, 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    return [
+        {"station_id": row['_id'], "queued": row['pending'] - row['leased'], "leased": row['leased']}
+        for row in rows
+    ]
+
+@api_router.post("/faults/queue/claim", response_model=Optional[Fault])
+async def claim_next_fault(
+    station_id: Optional[str] = None,
+    lease_seconds: int = Query(FAULT_LEASE_SECONDS, ge=30, le=86400),
+    user: dict = Depends(require_manager)
+):
+    """Atomically lease the next fault in the queue; expired leases are claimable again"""
+    now = datetime.now(timezone.utc)
+    fault = await db.faults.find_one_and_update(
+        queue_filter(now.isoformat(), station_id),
+        {"$set": {
+            "claimed_by": user['id'],
+            "lease_expires_at": (now + timedelta(seconds=lease_seconds)).isoformat(),
+        }},
+        sort=[("priority_rank", 1), ("created_at", 1)],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not fault:
+        return Response(status_code=204)
+    return fault
+
+@api_router.post("/faults/{fault_id}/lease", response_model=Fault)
+async def renew_fault_lease(
+    fault_id: str,
+    lease_seconds: int = Query(FAULT_LEASE_SECONDS, ge=30, le=86400),
+    user: dict = Depends(require_manager)
+):
+    now = datetime.now(timezone.utc)
+    fault = await db.faults.find_one_and_update(
+        {"id": fault_id, "claimed_by": user['id'], "lease_expires_at": {"$gt": now.isoformat()}},
+        {"$set": {"lease_expires_at": (now + timedelta(seconds=lease_seconds)).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not fault:
+        raise HTTPException(status_code=409, detail="Bu arıza üzerinde geçerli bir sahiplenmeniz yok")
+    return fault
+
+@api_router.delete("/faults/{fault_id}/lease", response_model=Fault)
+async def release_fault_lease(fault_id: str, user: dict = Depends(require_manager)):
+    """Return a claimed fault to the queue before its lease runs out"""
+    fault = await db.faults.find_one_and_update(
+        {"id": fault_id, "claimed_by": user['id']},
+        {"$set": {"claimed_by": None, "lease_expires_at": None}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not fault:
+        raise HTTPException(status_code=409, detail="Bu arıza üzerinde geçerli bir sahiplenmeniz yok")
+    return fault
+
 @api_router.put("/faults/{fault_id}", response_model=Fault)
 async def update_fault(
     fault_id: str,
@@ -648,22 +3238,174 @@ async def update_fault(
     
     if fault_update.status == FaultStatus.RESOLVED:
         update_data['resolved_at'] = datetime.now(timezone.utc).isoformat()
+    if fault_update.priority is not None:
+        update_data['priority'] = normalize_priority(fault_update.priority)
+        update_data['priority_rank'] = PRIORITY_RANKS[update_data['priority']]
     
-    result = await db.faults.update_one({"id": fault_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    previous = await db.faults.find_one_and_update(
+        {"id": fault_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not previous:
         raise HTTPException(status_code=404, detail="Arıza kaydı bulunamadı")
     
-    fault = await db.faults.find_one({"id": fault_id}, {"_id": 0})
+    fault = {**previous, **update_data}
+    invalidate_fault_analytics()
+    if fault_update.resolution_notes is not None:
+        await db.faults.update_one(
+            {"id": fault_id}, {"$set": {"search_text": search_text(fault['description'], fault['resolution_notes'])}}
+        )
     
-    # If resolved, update vehicle status back to active
-    if fault_update.status == FaultStatus.RESOLVED:
-        await db.vehicles.update_one(
-            {"id": fault['vehicle_id']},
-            {"$set": {"status": "active"}}
+    # The vehicle only returns to active once its last open fault is resolved
+    was_resolved = previous.get('status') == FaultStatus.RESOLVED
+    if fault_update.status == FaultStatus.RESOLVED and not was_resolved:
+        vehicle = await update_open_fault_count(fault['vehicle_id'], "fault_resolved", fault_id, delta=-1)
+        await record_fault_rollup(fault, vehicle, "resolved", datetime.fromisoformat(update_data['resolved_at']))
+        duplicate_faults.remove(fault['vehicle_id'], fault_id)
+    elif fault_update.status is not None and fault_update.status != FaultStatus.RESOLVED and was_resolved:
+        await update_open_fault_count(fault['vehicle_id'], "fault", fault_id, delta=1)
+        duplicate_faults.add(fault)
+    
+    # A priority change moves the fault's earlier counts to the new priority's series
+    if 'priority' in update_data and (previous.get('priority') or "normal").lower() != update_data['priority']:
+        vehicle = await db.vehicles.find_one({"id": fault['vehicle_id']}, {"_id": 0, "station_id": 1, "vehicle_type": 1})
+        await db.fault_rollups.bulk_write(
+            fault_rollup_move_operations(previous, {**previous, "priority": update_data['priority']}, vehicle), ordered=False
         )
     
     return fault
 
+@api_router.post("/faults/bulk")
+async def bulk_update_faults(operations: List[FaultBulkOperation], user: dict = Depends(require_manager)):
+    """Resolve, reprioritize or reassign many faults with one bulk write"""
+    if not operations:
+        raise HTTPException(status_code=400, detail="Güncellenecek veri bulunamadı")
+    if len(operations) > 1000:
+        raise HTTPException(status_code=400, detail="Tek istekte en fazla 1000 işlem yapılabilir")
+
+    fault_ids = list({op.fault_id for op in operations})
+    fault_projection = {"_id": 0, "search_text": 0, "duplicate_reports": 0}
+    faults = {
+        f['id']: f for f in await db.faults.find({"id": {"$in": fault_ids}}, fault_projection).to_list(None)
+    }
+    service_ids = list({op.service_id for op in operations if op.service_id})
+    services = {
+        s['id'] for s in await db.services.find({"id": {"$in": service_ids}}, {"_id": 0, "id": 1}).to_list(None)
+    }
+
+    now = datetime.now(timezone.utc)
+    # Every fault this request resolves carries this exact timestamp, which tells its writes apart from concurrent ones
+    resolved_at = now.isoformat()
+    results = [{"index": index, "fault_id": op.fault_id, "ok": False} for index, op in enumerate(operations)]
+    writes, written, seen = [], [], set()
+    for index, op in enumerate(operations):
+        if op.fault_id in seen:
+            results[index]['detail'] = "Aynı arıza için birden fazla işlem gönderildi"
+            continue
+        seen.add(op.fault_id)
+        fault = faults.get(op.fault_id)
+        if not fault:
+            results[index]['detail'] = "Arıza kaydı bulunamadı"
+            continue
+        if op.action == FaultBulkAction.RESOLVE:
+            if fault['status'] == FaultStatus.RESOLVED:
+                results[index]['detail'] = "Arıza zaten çözülmüş"
+                continue
+            update = {"status": FaultStatus.RESOLVED.value, "resolved_at": resolved_at}
+            if op.resolution_notes is not None:
+                update['resolution_notes'] = op.resolution_notes
+                update['search_text'] = search_text(fault['description'], op.resolution_notes)
+            # Guard against a concurrent resolve between the read above and this write
+            writes.append(UpdateOne({"id": op.fault_id, "status": {"$ne": FaultStatus.RESOLVED.value}}, {"$set": update}))
+        elif op.action == FaultBulkAction.REPRIORITIZE:
+            if op.priority is None:
+                results[index]['detail'] = "Öncelik belirtilmedi"
+                continue
+            priority = normalize_priority(op.priority)
+            writes.append(UpdateOne(
+                {"id": op.fault_id}, {"$set": {"priority": priority, "priority_rank": PRIORITY_RANKS[priority]}}
+            ))
+        else:
+            if op.service_id not in services:
+                results[index]['detail'] = "Servis bulunamadı"
+                continue
+            writes.append(UpdateOne({"id": op.fault_id}, {"$set": {"service_id": op.service_id}}))
+        written.append((index, op))
+
+    failed = {}
+    if writes:
+        try:
+            await db.faults.bulk_write(writes, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: error.get('errmsg', "Yazma hatası") for error in e.details.get('writeErrors', [])}
+
+    # Read the written faults back to see which writes matched and what they changed
+    stored = {
+        f['id']: f for f in await db.faults.find(
+            {"id": {"$in": [op.fault_id for _, op in written]}}, fault_projection
+        ).to_list(None)
+    } if written else {}
+    resolved, reprioritized = [], []
+    for position, (index, op) in enumerate(written):
+        current = stored.get(op.fault_id)
+        if position in failed:
+            results[index]['detail'] = failed[position]
+        elif not current:
+            results[index]['detail'] = "Arıza kaydı bulunamadı"
+        elif op.action == FaultBulkAction.RESOLVE and current.get('resolved_at') != resolved_at:
+            results[index]['detail'] = "Arıza zaten çözülmüş"
+        else:
+            results[index]['ok'] = True
+            before = faults[op.fault_id]
+            if op.action == FaultBulkAction.RESOLVE:
+                resolved.append(current)
+            elif op.action == FaultBulkAction.REPRIORITIZE and (before.get('priority') or "normal").lower() != current['priority']:
+                reprioritized.append((before, {**before, "priority": current['priority']}))
+
+    for fault in resolved:
+        duplicate_faults.remove(fault['vehicle_id'], fault['id'])
+    resolved_per_vehicle = {}
+    for fault in resolved:
+        resolved_per_vehicle[fault['vehicle_id']] = resolved_per_vehicle.get(fault['vehicle_id'], 0) + 1
+    vehicles = {}
+    for vehicle_id, count in resolved_per_vehicle.items():
+        vehicle = await update_open_fault_count(vehicle_id, "fault_resolved", delta=-count)
+        if vehicle:
+            vehicles[vehicle_id] = vehicle
+    # Reprioritized faults need their vehicle's station and type to find the buckets they move between
+    rollup_vehicles = dict(vehicles)
+    missing = list({before['vehicle_id'] for before, _ in reprioritized} - set(vehicles))
+    if missing:
+        for vehicle in await db.vehicles.find(
+            {"id": {"$in": missing}}, {"_id": 0, "id": 1, "station_id": 1, "vehicle_type": 1}
+        ).to_list(None):
+            rollup_vehicles[vehicle['id']] = vehicle
+    rollups = [
+        operation
+        for fault in resolved
+        for operation in fault_rollup_operations(fault, vehicles.get(fault['vehicle_id']), "resolved", now)
+    ] + [
+        operation
+        for before, after in reprioritized
+        for operation in fault_rollup_move_operations(before, after, rollup_vehicles.get(before['vehicle_id']))
+    ]
+    if rollups:
+        await db.fault_rollups.bulk_write(rollups, ordered=False)
+    invalidate_fault_analytics()
+
+    return {
+        "updated": sum(1 for result in results if result['ok']),
+        "results": results,
+        "vehicles": [{"vehicle_id": v['id'], "status": v['status']} for v in vehicles.values()],
+    }
+
+@api_router.post("/faults/counters/reconcile")
+async def reconcile_fault_counters(user: dict = Depends(require_manager)):
+    """Rebuild every vehicle's open-fault counter from the faults collection"""
+    return {"corrected": await reconcile_open_fault_counts()}
+
 @api_router.get("/faults/statistics/top-faults")
 async def get_top_faults(user: dict = Depends(require_manager)):
     """Get most common fault types"""
@@ -743,6 +3485,157 @@ async def get_top_fault_stations(user: dict = Depends(require_manager)):
     
     return top_stations
 
+async def rebuild_fault_rollups() -> int:
+    """Rebuild the rollup collection from the full fault history."""
+    vehicles = {
+        v['id']: v for v in await db.vehicles.find(
+            {}, {"_id": 0, "id": 1, "station_id": 1, "vehicle_type": 1}
+        ).to_list(None)
+    }
+    counters = {}
+    cursor = db.faults.find({}, {
+        "_id": 0, "vehicle_id": 1, "fault_type_id": 1, "priority": 1, "created_at": 1, "resolved_at": 1, "status": 1
+    })
+    async for fault in cursor:
+        vehicle = vehicles.get(fault['vehicle_id'])
+        for metric, moment in fault_rollup_events(fault):
+            for granularity in RollupGranularity:
+                key = tuple(rollup_key(fault, vehicle, granularity, moment).items())
+                bucket = counters.setdefault(key, {"created": 0, "resolved": 0})
+                bucket[metric] += 1
+
+    # Build the new buckets aside and swap them in with one rename, so readers and live $inc
+    # upserts never see a half-empty collection. Increments landing on the old collection during
+    # the scan are dropped with it; run the rebuild when fault traffic is low.
+    staging = db[f"fault_rollups_rebuild_{uuid.uuid4().hex}"]
+    await staging.create_index(ROLLUP_KEY_FIELDS, unique=True)
+    docs = [{**dict(key), **values} for key, values in counters.items()]
+    if docs:
+        await staging.insert_many(docs)
+    await staging.rename("fault_rollups", dropTarget=True)
+    return len(docs)
+
+@api_router.post("/faults/statistics/rollups/rebuild")
+async def rebuild_fault_statistics(user: dict = Depends(require_manager)):
+    buckets = await rebuild_fault_rollups()
+    return {"message": "Arıza istatistikleri yeniden oluşturuldu", "buckets": buckets}
+
+@api_router.get("/faults/statistics/timeseries")
+async def get_fault_timeseries(
+    granularity: RollupGranularity = RollupGranularity.WEEK,
+    group_by: Optional[str] = Query(None, pattern="^(station_id|vehicle_type|fault_type_id|priority)$"),
+    metric: str = Query("created", pattern="^(created|resolved)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    station_id: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    user: dict = Depends(require_manager)
+):
+    """Fault counts per time bucket, answered from the pre-aggregated rollups"""
+    match = {"granularity": granularity.value}
+    try:
+        if start_date or end_date:
+            match['bucket'] = {}
+            if start_date:
+                match['bucket']['$gte'] = rollup_bucket(datetime.fromisoformat(start_date), granularity)
+            if end_date:
+                match['bucket']['$lte'] = rollup_bucket(datetime.fromisoformat(end_date), granularity)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih biçimi")
+    if station_id:
+        match['station_id'] = station_id
+    if vehicle_type:
+        match['vehicle_type'] = vehicle_type
+
+    group_id = {"bucket": "$bucket"}
+    if group_by:
+        group_id['key'] = f"${group_by}"
+
+    rows = await db.fault_rollups.aggregate([
+        {"$match": match},
+        {"$group": {"_id": group_id, "count": {"$sum": f"${metric}"}}},
+        {"$sort": {"_id.bucket": 1}}
+    ]).to_list(None)
+
+    return [
+        {"bucket": row['_id']['bucket'], "key": row['_id'].get('key'), "count": row['count']}
+        for row in rows
+    ]
+
+# Analytics
+@api_router.get("/analytics/reliability")
+async def get_reliability_analytics(user: dict = Depends(require_manager)):
+    """Fleet reliability metrics (MTTR, MTBF, faults per 1000 km)"""
+    if 'reliability' not in analytics_cache:
+        faults = await db.faults.find({}, {
+            "_id": 0, "vehicle_id": 1, "fault_type_id": 1, "service_id": 1,
+            "status": 1, "created_at": 1, "resolved_at": 1
+        }).to_list(None)
+        vehicles = await db.vehicles.find(
+            {}, {"_id": 0, "id": 1, "plate": 1, "vehicle_type": 1, "current_km": 1}
+        ).to_list(None)
+        analytics_cache['reliability'] = await asyncio.to_thread(compute_reliability, faults, vehicles)
+    return analytics_cache['reliability']
+
+@api_router.get("/analytics/availability")
+async def get_availability_analytics(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    station_id: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    user: dict = Depends(require_manager)
+):
+    """Fraction of time vehicles were active in a window, per vehicle, vehicle type and station"""
+    start, end = parse_window(start_date, end_date)
+    vehicle_query = {}
+    if station_id:
+        vehicle_query['station_id'] = station_id
+    if vehicle_type:
+        vehicle_query['vehicle_type'] = vehicle_type
+    vehicles = await db.vehicles.find(
+        vehicle_query, {"_id": 0, "id": 1, "plate": 1, "vehicle_type": 1, "station_id": 1, "status": 1, "created_at": 1}
+    ).to_list(None)
+    # Vehicles deleted after the window opened still count for the time they were in service
+    deleted = await db.vehicle_status_history.find(
+        {**vehicle_query, "reason": "deleted", "changed_at": {"$gt": start}},
+        {"_id": 0, "vehicle_id": 1, "plate": 1, "vehicle_type": 1, "station_id": 1}
+    ).to_list(None)
+    vehicles += [
+        {"id": row['vehicle_id'], "plate": row.get('plate'), "vehicle_type": row.get('vehicle_type'),
+         "station_id": row.get('station_id'), "status": None, "created_at": None}
+        for row in deleted
+    ]
+    vehicle_ids = [v['id'] for v in vehicles]
+
+    transitions = await db.vehicle_status_history.find(
+        {"vehicle_id": {"$in": vehicle_ids}, "changed_at": {"$gt": start, "$lt": end}},
+        {"_id": 0, "vehicle_id": 1, "changed_at": 1, "status": 1, "previous_status": 1}
+    ).sort([("vehicle_id", 1), ("changed_at", 1)]).to_list(None)
+    opening = await db.vehicle_status_history.aggregate([
+        {"$match": {"vehicle_id": {"$in": vehicle_ids}, "changed_at": {"$lte": start}}},
+        {"$sort": {"vehicle_id": 1, "changed_at": 1}},
+        {"$group": {"_id": "$vehicle_id", "status": {"$last": "$status"}}}
+    ]).to_list(None)
+    initial_states = {row['_id']: row['status'] for row in opening}
+
+    return await asyncio.to_thread(compute_availability, transitions, initial_states, vehicles, start, end)
+
+@api_router.get("/vehicles/{vehicle_id}/status-history")
+async def get_vehicle_status_history(
+    vehicle_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    start, end = parse_window(start_date, end_date, default_days=365)
+    history = await db.vehicle_status_history.find(
+        {"vehicle_id": vehicle_id, "changed_at": {"$gte": start, "$lte": end}},
+        {"_id": 0}
+    ).sort("changed_at", 1).to_list(None)
+    for entry in history:
+        entry['changed_at'] = entry['changed_at'].replace(tzinfo=timezone.utc).isoformat()
+    return history
+
 # Fault Report Config
 @api_router.get("/fault-report-config")
 async def get_fault_report_config(user: dict = Depends(require_manager)):
@@ -772,6 +3665,135 @@ async def update_fault_report_config(
     updated_config = await db.fault_report_config.find_one({}, {"_id": 0})
     return updated_config
 
+# Fault Reports
+async def load_fault_report_config() -> dict:
+    config = await db.fault_report_config.find_one({}, {"_id": 0})
+    if not config:
+        default_config = FaultReportConfig()
+        config = default_config.model_dump()
+        await db.fault_report_config.insert_one(dict(config))
+    return config
+
+async def fetch_by_ids(collection, ids: set, projection: dict) -> dict:
+    if not ids:
+        return {}
+    docs = await collection.find({"id": {"$in": list(ids)}}, {"_id": 0, "id": 1, **projection}).to_list(None)
+    return {doc['id']: doc for doc in docs}
+
+async def run_fault_report_job(job: dict, config: dict):
+    await db.fault_report_jobs.update_one({"id": job['id']}, {"$set": {"status": ReportJobStatus.RUNNING}})
+    try:
+        query = {}
+        bounds = report_date_filter(job.get('start_date'), job.get('end_date'))
+        if bounds:
+            query['created_at'] = bounds
+
+        faults = await db.faults.find(query, {"_id": 0}).sort("created_at", 1).to_list(None)
+
+        vehicles = {}
+        if config.get('include_vehicle_info') or config.get('include_station_info'):
+            vehicles = await fetch_by_ids(
+                db.vehicles, {f['vehicle_id'] for f in faults},
+                {"plate": 1, "brand": 1, "model": 1, "vehicle_type": 1, "station_id": 1}
+            )
+        lookups = {
+            "vehicles": vehicles,
+            "fault_types": await fetch_by_ids(
+                db.fault_types, {f.get('fault_type_id') for f in faults} - {None}, {"name": 1}
+            ),
+            "stations": await fetch_by_ids(
+                db.stations, {v.get('station_id') for v in vehicles.values()} - {None}, {"name": 1}
+            ) if config.get('include_station_info') else {},
+            "users": await fetch_by_ids(
+                db.users, {f['reported_by'] for f in faults}, {"name": 1, "sicil_no": 1}
+            ) if config.get('include_driver_info') else {},
+            "services": await fetch_by_ids(
+                db.services, {f.get('service_id') for f in faults} - {None}, {"name": 1}
+            ) if config.get('include_service_info') else {},
+        }
+
+        REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+        file_name = f"ariza-raporu-{job['id']}.xlsx"
+        loop = asyncio.get_running_loop()
+        row_count = await loop.run_in_executor(
+            process_executor, build_fault_report, str(REPORTS_DIR / file_name), config, faults, lookups
+        )
+        await db.fault_report_jobs.update_one({"id": job['id']}, {"$set": {
+            "status": ReportJobStatus.COMPLETED,
+            "file_name": file_name,
+            "row_count": row_count,
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }})
+    except Exception as e:
+        logger.exception("Fault report job %s failed", job['id'])
+        await db.fault_report_jobs.update_one({"id": job['id']}, {"$set": {
+            "status": ReportJobStatus.FAILED,
+            "error": str(e),
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }})
+
+@api_router.post("/fault-reports", response_model=FaultReportJob)
+async def create_fault_report(job_request: FaultReportJobCreate, user: dict = Depends(require_manager)):
+    for value in (job_request.start_date, job_request.end_date):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Geçersiz tarih biçimi")
+    config = await load_fault_report_config()
+    now = datetime.now(timezone.utc)
+    cache_key = {
+        "config_version": config['updated_at'],
+        "start_date": job_request.start_date,
+        "end_date": job_request.end_date,
+        "cache_bucket": report_cache_bucket(job_request.end_date, now),
+    }
+
+    # Jobs still pending or running past the timeout were lost to a crash or restart
+    stale_before = (now - timedelta(minutes=REPORT_JOB_TIMEOUT_MINUTES)).isoformat()
+    await db.fault_report_jobs.update_many(
+        {**cache_key, "status": {"$in": [ReportJobStatus.PENDING, ReportJobStatus.RUNNING]}, "created_at": {"$lt": stale_before}},
+        {"$set": {"status": ReportJobStatus.FAILED, "error": "Rapor zaman aşımına uğradı", "completed_at": now.isoformat()}}
+    )
+
+    # Reuse a finished or in-flight report for the same config version and date range
+    existing = await db.fault_report_jobs.find_one(
+        {**cache_key, "status": {"$ne": ReportJobStatus.FAILED}},
+        {"_id": 0},
+        sort=[("created_at", -1)]
+    )
+    if existing and (existing['status'] != ReportJobStatus.COMPLETED or (REPORTS_DIR / existing['file_name']).exists()):
+        return existing
+
+    job_obj = FaultReportJob(requested_by=user['id'], **cache_key)
+    doc = job_obj.model_dump()
+    await db.fault_report_jobs.insert_one(dict(doc))
+    spawn_background_task(run_fault_report_job(doc, config))
+    return job_obj
+
+@api_router.get("/fault-reports/{job_id}", response_model=FaultReportJob)
+async def get_fault_report(job_id: str, user: dict = Depends(require_manager)):
+    job = await db.fault_report_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Rapor bulunamadı")
+    return job
+
+@api_router.get("/fault-reports/{job_id}/download")
+async def download_fault_report(job_id: str, user: dict = Depends(require_manager)):
+    job = await db.fault_report_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Rapor bulunamadı")
+    if job['status'] != ReportJobStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Rapor henüz hazır değil")
+    path = REPORTS_DIR / job['file_name']
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Rapor dosyası artık mevcut değil")
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=job['file_name']
+    )
+
 # Requests
 @api_router.post("/requests", response_model=Request)
 async def create_request(request: RequestCreate, user: dict = Depends(get_current_user)):
@@ -779,6 +3801,7 @@ async def create_request(request: RequestCreate, user: dict = Depends(get_curren
     request_data['requested_by'] = user['id']
     request_obj = Request(**request_data)
     doc = request_obj.model_dump()
+    doc['search_text'] = search_text(doc['title'], doc['description'])
     await db.requests.insert_one(doc)
     
     # Create notification for target manager
@@ -789,7 +3812,7 @@ async def create_request(request: RequestCreate, user: dict = Depends(get_curren
         type="request",
         related_id=request_obj.id
     )
-    await db.notifications.insert_one(notif.model_dump())
+    await send_notifications([notif])
     
     return request_obj
 
@@ -830,18 +3853,100 @@ async def update_request(
         type="request",
         related_id=request_id
     )
-    await db.notifications.insert_one(notif.model_dump())
+    await send_notifications([notif])
     
     return request_obj
 
 # Assignments
+async def acquire_assignment_lock(key: str, token: str):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ASSIGNMENT_LOCK_WAIT_SECONDS
+    while True:
+        now = datetime.now(timezone.utc)
+        lease = {"token": token, "expires_at": now + timedelta(seconds=ASSIGNMENT_LOCK_SECONDS)}
+        try:
+            await db.assignment_locks.insert_one({"key": key, **lease})
+            return
+        except DuplicateKeyError:
+            pass
+        # A holder that crashed keeps its lock only until the lease runs out
+        if await db.assignment_locks.find_one_and_update({"key": key, "expires_at": {"$lt": now}}, {"$set": lease}):
+            return
+        if loop.time() > deadline:
+            raise HTTPException(status_code=409, detail="Bu araç veya sürücü için başka bir görevlendirme işleniyor, tekrar deneyin")
+        await asyncio.sleep(0.05)
+
+@asynccontextmanager
+async def assignment_locks(assignments: list):
+    """Serialize assignment writes per vehicle and driver across all workers.
+
+    While the locks are held, an overlap check against Mongo followed by the insert cannot
+    interleave with another writer for the same vehicle or driver.
+    """
+    keys = sorted({f"vehicle:{a['vehicle_id']}" for a in assignments} | {f"driver:{a['driver_id']}" for a in assignments})
+    token = str(uuid.uuid4())
+    acquired = []
+    try:
+        for key in keys:
+            await acquire_assignment_lock(key, token)
+            acquired.append(key)
+        yield
+    finally:
+        if acquired:
+            await db.assignment_locks.delete_many({"key": {"$in": acquired}, "token": token})
+
+async def overlapping_assignments(assignment: dict, limit: int = 5) -> dict:
+    """Ids of stored assignments overlapping this one, for its vehicle and for its driver."""
+    overlap = overlap_filter(assignment['starts_at'], assignment['ends_at'])
+    return {
+        kind: [a['id'] for a in await db.assignments.find(
+            {f"{kind}_id": assignment[f"{kind}_id"], **overlap}, {"_id": 0, "id": 1}
+        ).to_list(limit)]
+        for kind in ("vehicle", "driver")
+    }
+
+async def assignment_conflicts(kind: str) -> list:
+    """Overlapping pairs for one vehicle or driver key, from a single scan sorted by key and start."""
+    field = f"{kind}_id"
+    report, key, active = [], None, []
+    async for assignment in db.assignments.find(
+        {"starts_at": {"$type": "date"}}, {"_id": 0, "id": 1, field: 1, "starts_at": 1, "ends_at": 1}
+    ).sort([(field, 1), ("starts_at", 1)]):
+        if assignment[field] != key:
+            key, active = assignment[field], []
+        start = assignment['starts_at']
+        active = [(end, other_id) for end, other_id in active if end is None or end > start]
+        report.extend({"kind": kind, "key": key, "assignment_ids": [other_id, assignment['id']]} for _, other_id in active)
+        active.append((assignment.get('ends_at'), assignment['id']))
+    return report
+
 @api_router.post("/assignments", response_model=Assignment)
 async def create_assignment(assignment: AssignmentCreate, user: dict = Depends(require_manager)):
     assignment_data = assignment.model_dump()
     assignment_data['assigned_by'] = user['id']
     assignment_obj = Assignment(**assignment_data)
     doc = assignment_obj.model_dump()
-    await db.assignments.insert_one(doc)
+    
+    try:
+        doc.update(assignment_bounds(doc))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih biçimi")
+    if doc['ends_at'] is not None and doc['ends_at'] <= doc['starts_at']:
+        raise HTTPException(status_code=400, detail="Bitiş tarihi başlangıç tarihinden sonra olmalı")
+    
+    async with assignment_locks([doc]):
+        overlapping = await overlapping_assignments(doc)
+        if overlapping['vehicle']:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Araç bu tarihlerde başka bir göreve atanmış ({overlapping['vehicle'][0]})"
+            )
+        if overlapping['driver']:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Sürücü bu tarihlerde başka bir göreve atanmış ({overlapping['driver'][0]})"
+            )
+        await db.assignments.insert_one(doc)
     
     # Create notification for driver
     driver = await db.users.find_one({"id": assignment.driver_id}, {"_id": 0})
@@ -853,7 +3958,7 @@ async def create_assignment(assignment: AssignmentCreate, user: dict = Depends(r
             type="assignment",
             related_id=assignment_obj.id
         )
-        await db.notifications.insert_one(notif.model_dump())
+        await send_notifications([notif])
     
     return assignment_obj
 
@@ -876,7 +3981,356 @@ async def get_assignments(
     assignments = await db.assignments.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return assignments
 
+@api_router.get("/assignments/conflicts")
+async def get_assignment_conflicts(user: dict = Depends(require_manager)):
+    """Every pair of overlapping assignments for the same vehicle or driver"""
+    return await assignment_conflicts("vehicle") + await assignment_conflicts("driver")
+
+@api_router.get("/availability")
+async def get_availability(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    station_id: Optional[str] = None,
+    user: dict = Depends(require_manager)
+):
+    """Free and busy timelines for drivers and vehicles from assignments and unresolved faults"""
+    now = datetime.now(timezone.utc)
+    start, end = parse_window(start_date or now.isoformat(), end_date or (now + timedelta(days=7)).isoformat())
+    vehicle_query = {"station_id": station_id} if station_id else {}
+    driver_query = {"role": UserRole.DRIVER.value, **vehicle_query}
+    vehicles = await db.vehicles.find(
+        vehicle_query, {"_id": 0, "id": 1, "plate": 1, "vehicle_type": 1, "station_id": 1}
+    ).to_list(None)
+    drivers = await db.users.find(
+        driver_query, {"_id": 0, "id": 1, "name": 1, "sicil_no": 1, "station_id": 1}
+    ).to_list(None)
+    vehicle_ids = [v['id'] for v in vehicles]
+    driver_ids = [d['id'] for d in drivers]
+
+    assignments = await db.assignments.find(
+        {"$and": [
+            {"$or": [{"vehicle_id": {"$in": vehicle_ids}}, {"driver_id": {"$in": driver_ids}}]},
+            overlap_filter(start, end),
+        ]},
+        {"_id": 0, "id": 1, "vehicle_id": 1, "driver_id": 1, "start_date": 1, "end_date": 1, "mission_type": 1}
+    ).to_list(None)
+    faults = await db.faults.find(
+        {
+            "vehicle_id": {"$in": vehicle_ids},
+            "created_at": {"$lt": end.isoformat()},
+            "$or": [{"status": {"$ne": FaultStatus.RESOLVED.value}}, {"resolved_at": {"$gt": start.isoformat()}}],
+        },
+        {"_id": 0, "id": 1, "vehicle_id": 1, "status": 1, "priority": 1, "created_at": 1, "resolved_at": 1}
+    ).to_list(None)
+
+    vehicle_intervals, driver_intervals = [], []
+    for assignment in assignments:
+        try:
+            interval_start, interval_end = assignment_interval(assignment)
+        except ValueError:
+            continue
+        reason = {"type": "assignment", "id": assignment['id'], "mission_type": assignment.get('mission_type')}
+        vehicle_intervals.append((assignment['vehicle_id'], interval_start, interval_end, reason))
+        driver_intervals.append((assignment['driver_id'], interval_start, interval_end, reason))
+    for fault in faults:
+        if fault['status'] == FaultStatus.RESOLVED.value:
+            interval_end = to_epoch(fault.get('resolved_at'), math.inf)
+        else:
+            interval_end = math.inf
+        reason = {"type": "fault", "id": fault['id'], "priority": fault.get('priority')}
+        vehicle_intervals.append((fault['vehicle_id'], to_epoch(fault['created_at'], 0.0), interval_end, reason))
+
+    vehicle_timelines = compute_timelines({v['id']: v for v in vehicles}, vehicle_intervals, start, end)
+    driver_timelines = compute_timelines({d['id']: d for d in drivers}, driver_intervals, start, end)
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "station_id": station_id,
+        "vehicles": list(vehicle_timelines.values()),
+        "drivers": list(driver_timelines.values()),
+    }
+
+# Rosters
+@api_router.post("/rosters", response_model=Roster)
+async def propose_roster(request: RosterRequest, user: dict = Depends(require_manager)):
+    """Propose a driver-to-vehicle roster for a shift window across the selected stations"""
+    start, end = parse_window(request.start_date, request.end_date)
+    station_query = {"id": {"$in": request.station_ids}} if request.station_ids else {}
+    stations = await db.stations.find(station_query, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}).to_list(None)
+    station_ids = [station['id'] for station in stations]
+
+    driver_query = {"role": UserRole.DRIVER.value}
+    if not request.allow_cross_station:
+        driver_query['station_id'] = {"$in": station_ids}
+    drivers = await db.users.find(
+        driver_query, {"_id": 0, "id": 1, "name": 1, "station_id": 1, "certified_vehicle_types": 1}
+    ).to_list(None)
+    vehicles = await db.vehicles.find(
+        {"station_id": {"$in": station_ids}, "status": VehicleStatus.ACTIVE.value},
+        {"_id": 0, "id": 1, "plate": 1, "vehicle_type": 1, "station_id": 1, "assigned_driver_id": 1}
+    ).to_list(None)
+
+    # Anyone already assigned during the window is unavailable
+    overlap = overlap_filter(start, end)
+    busy_drivers = set(await db.assignments.distinct(
+        "driver_id", {"driver_id": {"$in": [d['id'] for d in drivers]}, **overlap}
+    ))
+    busy_vehicles = set(await db.assignments.distinct(
+        "vehicle_id", {"vehicle_id": {"$in": [v['id'] for v in vehicles]}, **overlap}
+    ))
+    drivers = [d for d in drivers if d['id'] not in busy_drivers]
+    vehicles = [v for v in vehicles if v['id'] not in busy_vehicles]
+
+    started = datetime.now(timezone.utc)
+    pairs, unassigned_drivers, unassigned_vehicles = await asyncio.to_thread(
+        solve_roster, drivers, vehicles, stations, request.allow_cross_station
+    )
+    solve_ms = (datetime.now(timezone.utc) - started).total_seconds() * 1000
+
+    roster = Roster(
+        created_by=user['id'],
+        start_date=start.isoformat(),
+        end_date=end.isoformat(),
+        mission_type=request.mission_type,
+        entries=[
+            RosterEntry(
+                driver_id=drivers[d]['id'],
+                driver_name=drivers[d]['name'],
+                vehicle_id=vehicles[v]['id'],
+                plate=vehicles[v]['plate'],
+                vehicle_type=vehicles[v]['vehicle_type'],
+                station_id=vehicles[v]['station_id'],
+                cost=cost
+            )
+            for d, v, cost in pairs
+        ],
+        unassigned_driver_ids=unassigned_drivers,
+        unassigned_vehicle_ids=unassigned_vehicles,
+        solve_ms=round(solve_ms, 2)
+    )
+    await db.rosters.insert_one(roster.model_dump())
+    return roster
+
+@api_router.get("/rosters/{roster_id}", response_model=Roster)
+async def get_roster(roster_id: str, user: dict = Depends(require_manager)):
+    roster = await db.rosters.find_one({"id": roster_id}, {"_id": 0})
+    if not roster:
+        raise HTTPException(status_code=404, detail="Kadro planı bulunamadı")
+    return roster
+
+async def write_roster_assignments(roster: dict, assignments: list):
+    """Point vehicles at their rostered drivers and store the shift's assignments."""
+    if roster['entries']:
+        driver_ids = [entry['driver_id'] for entry in roster['entries']]
+        vehicle_ids = [entry['vehicle_id'] for entry in roster['entries']]
+        operations = [UpdateMany(
+            {"assigned_driver_id": {"$in": driver_ids}, "id": {"$nin": vehicle_ids}},
+            {"$set": {"assigned_driver_id": None}}
+        )]
+        operations.extend(
+            UpdateOne({"id": entry['vehicle_id']}, {"$set": {"assigned_driver_id": entry['driver_id']}})
+            for entry in roster['entries']
+        )
+        await db.vehicles.bulk_write(operations, ordered=False)
+        await db.assignments.insert_many(assignments)
+        await send_notifications([
+            Notification(
+                user_id=doc['driver_id'],
+                title="Yeni Görevlendirme",
+                message=f"{doc['mission_type']} görevine atandınız",
+                type="assignment",
+                related_id=doc['id']
+            )
+            for doc in assignments
+        ])
+
+@api_router.post("/rosters/{roster_id}/apply", response_model=Roster)
+async def apply_roster(roster_id: str, user: dict = Depends(require_manager)):
+    """Set assigned drivers with one bulk write and record the shift as assignments"""
+    # Claim the roster first, so concurrent applies cannot both write its assignments
+    now = datetime.now(timezone.utc)
+    token = str(uuid.uuid4())
+    roster = await db.rosters.find_one_and_update(
+        {"id": roster_id, "$or": [
+            {"status": RosterStatus.PROPOSED.value},
+            {"status": RosterStatus.APPLYING.value, "applying_at": {"$lt": now - timedelta(seconds=ROSTER_APPLY_LEASE_SECONDS)}},
+        ]},
+        {"$set": {"status": RosterStatus.APPLYING.value, "applying_at": now, "apply_token": token}},
+        projection={"_id": 0}
+    )
+    if not roster:
+        existing = await db.rosters.find_one({"id": roster_id}, {"_id": 0, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Kadro planı bulunamadı")
+        if existing['status'] == RosterStatus.APPLYING.value:
+            raise HTTPException(status_code=409, detail="Kadro planı şu anda uygulanıyor")
+        raise HTTPException(status_code=400, detail="Kadro planı zaten uygulandı")
+
+    stations = await db.stations.find(
+        {"id": {"$in": list({entry['station_id'] for entry in roster['entries']})}}, {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)
+    station_names = {station['id']: station['name'] for station in stations}
+    assignments = [
+        Assignment(
+            vehicle_id=entry['vehicle_id'],
+            driver_id=entry['driver_id'],
+            assigned_by=user['id'],
+            start_date=roster['start_date'],
+            end_date=roster['end_date'],
+            mission_type=roster['mission_type'],
+            location=station_names.get(entry['station_id'], entry['station_id']),
+            notes=f"Kadro planı {roster_id}"
+        ).model_dump()
+        for entry in roster['entries']
+    ]
+    for doc in assignments:
+        doc.update(assignment_bounds(doc))
+    try:
+        async with assignment_locks(assignments):
+            # Assignments made since the roster was proposed may now overlap it
+            for doc in assignments:
+                overlapping = await overlapping_assignments(doc, limit=1)
+                if overlapping['vehicle'] or overlapping['driver']:
+                    raise HTTPException(
+                        status_code=409, detail="Kadro planı mevcut görevlendirmelerle çakışıyor, yeniden oluşturun"
+                    )
+            await write_roster_assignments(roster, assignments)
+    except BaseException:
+        # Hand the roster back so it can be applied again; if part of it was written, the overlap
+        # check then asks for a new proposal
+        await db.rosters.update_one(
+            {"id": roster_id, "apply_token": token}, {"$set": {"status": RosterStatus.PROPOSED.value}}
+        )
+        raise
+
+    applied_at = datetime.now(timezone.utc).isoformat()
+    await db.rosters.update_one(
+        {"id": roster_id}, {"$set": {"status": RosterStatus.APPLIED.value, "applied_at": applied_at}}
+    )
+    roster.update(status=RosterStatus.APPLIED.value, applied_at=applied_at)
+    return roster
+
+# Search
+async def text_search(collection, query: dict, text: str, projection: dict, skip: int, limit: int) -> dict:
+    """One page of a collection's text-index matches, best score first."""
+    folded = fold_turkish(text)
+    match = {
+        **query,
+        "$text": {"$search": text if folded == text else f"{text} {folded}", "$language": "turkish"},
+    }
+    items = await collection.find(
+        match, {"_id": 0, **projection, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"})]).skip(skip).limit(limit).to_list(limit)
+    return {"total": await collection.count_documents(match), "items": items}
+
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    types: Optional[str] = Query(None, pattern="^(vehicles|users|faults|requests)(,(vehicles|users|faults|requests))*$"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    user: dict = Depends(get_current_user)
+):
+    """Ranked, paginated matches for plates, sicil numbers, fault texts and requests"""
+    wanted = set(types.split(",")) if types else {"vehicles", "users", "faults", "requests"}
+    if user['role'] != UserRole.MANAGER:
+        wanted.discard("users")
+    # Drivers only see their own station's vehicles, as in GET /vehicles
+    station_id = user.get('station_id') if user['role'] == UserRole.DRIVER else None
+    skip = (page - 1) * limit
+    results = {}
+
+    if "vehicles" in wanted:
+        matches = plate_autocomplete.search(q, skip + limit, station_id)
+        vehicle_query = {"id": {"$in": [m['id'] for m in matches[skip:]]}}
+        if station_id:
+            vehicle_query['station_id'] = station_id
+        vehicles = {
+            v['id']: v for v in await db.vehicles.find(
+                vehicle_query,
+                {"_id": 0, "id": 1, "plate": 1, "brand": 1, "model": 1, "vehicle_type": 1, "station_id": 1, "status": 1}
+            ).to_list(None)
+        }
+        results['vehicles'] = {
+            "items": [vehicles[m['id']] for m in matches[skip:] if m['id'] in vehicles],
+            "has_more": len(matches) == skip + limit,
+        }
+    if "users" in wanted:
+        matches = sicil_autocomplete.search(q, skip + limit)
+        users = {
+            u['id']: u for u in await db.users.find(
+                {"id": {"$in": [m['id'] for m in matches[skip:]]}},
+                {"_id": 0, "id": 1, "name": 1, "sicil_no": 1, "role": 1, "station_id": 1}
+            ).to_list(None)
+        }
+        results['users'] = {
+            "items": [users[m['id']] for m in matches[skip:] if m['id'] in users],
+            "has_more": len(matches) == skip + limit,
+        }
+    if "faults" in wanted:
+        results['faults'] = await text_search(db.faults, {}, q, {
+            "id": 1, "vehicle_id": 1, "description": 1, "resolution_notes": 1, "status": 1,
+            "priority": 1, "created_at": 1,
+        }, skip, limit)
+    if "requests" in wanted:
+        # Same visibility as GET /requests
+        owner = {"target_manager_id": user['id']} if user['role'] == UserRole.MANAGER else {"requested_by": user['id']}
+        results['requests'] = await text_search(db.requests, owner, q, {
+            "id": 1, "title": 1, "description": 1, "status": 1, "created_at": 1,
+        }, skip, limit)
+
+    return {"query": q, "page": page, "limit": limit, "results": results}
+
+@api_router.get("/search/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=50),
+    field: str = Query("plate", pattern="^(plate|sicil_no)$"),
+    limit: int = Query(10, ge=1, le=50),
+    user: dict = Depends(get_current_user)
+):
+    if field == "sicil_no" and user['role'] != UserRole.MANAGER:
+        raise HTTPException(status_code=403, detail="Bu işlem için amir yetkisi gereklidir")
+    if field == "sicil_no":
+        return sicil_autocomplete.search(q, limit)
+    station_id = user.get('station_id') if user['role'] == UserRole.DRIVER else None
+    return plate_autocomplete.search(q, limit, station_id)
+
 # Notifications
+async def send_notifications(notifications: List[Notification]):
+    """Insert notifications and raise each recipient's unread counter by the number they received."""
+    if not notifications:
+        return
+    await db.notifications.insert_many([n.model_dump() for n in notifications])
+    counts = Counter(n.user_id for n in notifications)
+    await db.users.bulk_write([
+        UpdateOne({"id": user_id}, {"$inc": {"unread_notifications": count}})
+        for user_id, count in counts.items()
+    ], ordered=False)
+
+async def rebuild_unread_counters(user_ids: Optional[list] = None) -> int:
+    """Recount unread notifications for the given users (all users when omitted)."""
+    match = {"read": False}
+    user_query = {}
+    if user_ids is not None:
+        match['user_id'] = {"$in": user_ids}
+        user_query['id'] = {"$in": user_ids}
+    counts = {
+        row['_id']: row['count'] for row in await db.notifications.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        ]).to_list(None)
+    }
+    users = await db.users.find(user_query, {"_id": 0, "id": 1}).to_list(None)
+    if users:
+        await db.users.bulk_write([
+            UpdateOne({"id": u['id']}, {"$set": {"unread_notifications": counts.get(u['id'], 0)}}) for u in users
+        ], ordered=False)
+    return len(users)
+
+class NotificationReadRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    all: bool = False
+
 @api_router.get("/notifications", response_model=List[Notification])
 async def get_notifications(user: dict = Depends(get_current_user)):
     notifications = await db.notifications.find(
@@ -885,16 +4339,123 @@ async def get_notifications(user: dict = Depends(get_current_user)):
     ).sort("created_at", -1).to_list(100)
     return notifications
 
+@api_router.get("/notifications/archive", response_model=List[Notification])
+async def get_archived_notifications(
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    limit: int = Query(100, ge=1, le=1000),
+    user: dict = Depends(get_current_user)
+):
+    """Unread notifications moved to the archive, newest first"""
+    match = {"user_id": user['id']}
+    if month:
+        match['month'] = month
+    else:
+        # Only unwind the newest months that together hold enough notifications for the page
+        sizes = await db.notifications_archive.aggregate([
+            {"$match": match},
+            {"$project": {"_id": 0, "month": 1, "size": {"$size": "$notifications"}}},
+            {"$sort": {"month": -1}},
+        ]).to_list(None)
+        months, total = [], 0
+        for bucket in sizes:
+            if total >= limit:
+                break
+            months.append(bucket['month'])
+            total += bucket['size']
+        match['month'] = {"$in": months}
+    return await db.notifications_archive.aggregate([
+        {"$match": match},
+        {"$unwind": "$notifications"},
+        {"$replaceRoot": {"newRoot": "$notifications"}},
+        {"$sort": {"created_at": -1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0}},
+    ]).to_list(limit)
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_notification_count(user: dict = Depends(get_current_user)):
+    # The counter lives on the user document, which authentication has already loaded
+    return {"unread": max(user.get('unread_notifications') or 0, 0)}
+
+@api_router.put("/notifications/read")
+async def mark_notifications_read(request: NotificationReadRequest, user: dict = Depends(get_current_user)):
+    """Mark the given notifications, or all of them, as read with a single update"""
+    if not request.all and not request.ids:
+        raise HTTPException(status_code=400, detail="Okundu işaretlenecek bildirim seçilmedi")
+    query = {"user_id": user['id'], "read": False}
+    if not request.all:
+        query['id'] = {"$in": request.ids}
+    result = await db.notifications.update_many(query, {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}})
+    if result.modified_count:
+        await db.users.update_one({"id": user['id']}, {"$inc": {"unread_notifications": -result.modified_count}})
+    return {"marked": result.modified_count}
+
 @api_router.put("/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, user: dict = Depends(get_current_user)):
     result = await db.notifications.update_one(
-        {"id": notification_id, "user_id": user['id']},
-        {"$set": {"read": True}}
+        {"id": notification_id, "user_id": user['id'], "read": False},
+        {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}}
     )
-    if result.matched_count == 0:
+    if result.modified_count:
+        await db.users.update_one({"id": user['id']}, {"$inc": {"unread_notifications": -1}})
+    elif not await db.notifications.find_one({"id": notification_id, "user_id": user['id']}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Bildirim bulunamadı")
     return {"message": "Bildirim okundu olarak işaretlendi"}
 
+async def archive_old_notifications() -> int:
+    """Move unread notifications past the archive age into per-user monthly archive buckets.
+
+    Buckets are filled with $addToSet before the originals are deleted, so a batch interrupted
+    between the two steps is simply archived again on the next run without duplicates. A
+    notification read between the two steps stays in the hot collection and is pulled back out
+    of its bucket.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=NOTIFICATION_ARCHIVE_DAYS)).isoformat()
+    archived = 0
+    while True:
+        batch = await db.notifications.find(
+            {"read": False, "created_at": {"$lt": cutoff}}, {"_id": 0}
+        ).sort("created_at", 1).to_list(NOTIFICATION_ARCHIVE_BATCH)
+        if not batch:
+            return archived
+        buckets = {}
+        for notification in batch:
+            buckets.setdefault((notification['user_id'], notification['created_at'][:7]), []).append(notification)
+        await db.notifications_archive.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "month": month},
+                {"$addToSet": {"notifications": {"$each": notifications}}},
+                upsert=True
+            )
+            for (user_id, month), notifications in buckets.items()
+        ], ordered=False)
+        # Only still-unread ones leave the hot collection, so the unread counters drop by exactly that many
+        by_user = {}
+        for notification in batch:
+            by_user.setdefault(notification['user_id'], []).append(notification['id'])
+        for user_id, ids in by_user.items():
+            result = await db.notifications.delete_many({"id": {"$in": ids}, "read": False})
+            if result.deleted_count:
+                await db.users.update_one({"id": user_id}, {"$inc": {"unread_notifications": -result.deleted_count}})
+                archived += result.deleted_count
+            if result.deleted_count < len(ids):
+                kept = [n['id'] for n in await db.notifications.find(
+                    {"id": {"$in": ids}}, {"_id": 0, "id": 1}
+                ).to_list(None)]
+                await db.notifications_archive.update_many(
+                    {"user_id": user_id}, {"$pull": {"notifications": {"id": {"$in": kept}}}}
+                )
+
+async def notification_archive_loop():
+    while True:
+        try:
+            archived = await archive_old_notifications()
+            if archived:
+                logger.info("Archived %d old unread notifications", archived)
+        except Exception:
+            logger.exception("Notification archiving failed")
+        await asyncio.sleep(86400)
+
 # Dashboard
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(user: dict = Depends(get_current_user)):
@@ -902,40 +4463,88 @@ async def get_dashboard_stats(user: dict = Depends(get_current_user)):
     if user['role'] == 'driver' and user.get('station_id'):
         query['station_id'] = user['station_id']
     
-    total_vehicles = await db.vehicles.count_documents(query)
-    active_vehicles = await db.vehicles.count_documents({**query, "status": "active"})
-    faulty_vehicles = await db.vehicles.count_documents({**query, "status": "faulty"})
-    accident_vehicles = await db.vehicles.count_documents({**query, "status": "accident"})
+    vehicles = await db.vehicles.find(query, DASHBOARD_VEHICLE_FIELDS).to_list(None)
     pending_faults = await db.faults.count_documents({"status": "pending"})
-    
-    # Count vehicles with expiring documents (within 30 days)
-    thirty_days = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
-    expiring = await db.vehicles.find(query, {"_id": 0}).to_list(1000)
-    expiring_soon = sum(1 for v in expiring if (
-        (v.get('insurance_expiry') and v['insurance_expiry'] <= thirty_days) or
-        (v.get('inspection_expiry') and v['inspection_expiry'] <= thirty_days) or
-        (v.get('kasko_expiry') and v['kasko_expiry'] <= thirty_days)
-    ))
-    
-    # Count vehicles with oil change due soon
-    oil_change_due_soon = sum(1 for v in expiring if (
-        v.get('next_oil_change_date') and v['next_oil_change_date'] <= thirty_days
-    ))
-    
     total_stations = await db.stations.count_documents({})
     total_drivers = await db.users.count_documents({"role": "driver"})
     
-    return DashboardStats(
-        total_vehicles=total_vehicles,
-        active_vehicles=active_vehicles,
-        faulty_vehicles=faulty_vehicles,
-        accident_vehicles=accident_vehicles,
-        pending_faults=pending_faults,
-        expiring_soon=expiring_soon,
-        oil_change_due_soon=oil_change_due_soon,
-        total_stations=total_stations,
-        total_drivers=total_drivers
-    )
+    return build_dashboard_stats(vehicles, pending_faults, total_stations, total_drivers)
+
+def snapshot_period(moment: datetime) -> datetime:
+    interval = timedelta(hours=DASHBOARD_SNAPSHOT_INTERVAL_HOURS)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + ((moment - epoch) // interval) * interval
+
+async def take_dashboard_snapshot() -> int:
+    """Store one DashboardStats snapshot per station plus a global one for the current period."""
+    now = datetime.now(timezone.utc)
+    period = snapshot_period(now)
+    vehicles = await db.vehicles.find({}, DASHBOARD_VEHICLE_FIELDS).to_list(None)
+    station_ids = [s['id'] for s in await db.stations.find({}, {"_id": 0, "id": 1}).to_list(None)]
+    pending = await db.faults.find({"status": "pending"}, {"_id": 0, "vehicle_id": 1}).to_list(None)
+    drivers = await db.users.find({"role": "driver"}, {"_id": 0, "station_id": 1}).to_list(None)
+
+    vehicles_by_station = {}
+    for vehicle in vehicles:
+        vehicles_by_station.setdefault(vehicle.get('station_id'), []).append(vehicle)
+    station_of_vehicle = {v['id']: v.get('station_id') for v in vehicles}
+    pending_by_station = {}
+    for fault in pending:
+        station_id = station_of_vehicle.get(fault['vehicle_id'])
+        pending_by_station[station_id] = pending_by_station.get(station_id, 0) + 1
+    drivers_by_station = {}
+    for driver in drivers:
+        drivers_by_station[driver.get('station_id')] = drivers_by_station.get(driver.get('station_id'), 0) + 1
+
+    scopes = {"all": build_dashboard_stats(vehicles, len(pending), len(station_ids), len(drivers))}
+    for station_id in station_ids:
+        scopes[station_id] = build_dashboard_stats(
+            vehicles_by_station.get(station_id, []),
+            pending_by_station.get(station_id, 0),
+            1,
+            drivers_by_station.get(station_id, 0)
+        )
+
+    # Upsert on (scope, period) so several workers running the job don't duplicate snapshots
+    await db.dashboard_snapshots.bulk_write([
+        UpdateOne(
+            {"scope": scope, "period": period},
+            {"$set": {"taken_at": now, "stats": stats.model_dump()}},
+            upsert=True
+        )
+        for scope, stats in scopes.items()
+    ], ordered=False)
+    return len(scopes)
+
+async def dashboard_snapshot_loop():
+    interval = timedelta(hours=DASHBOARD_SNAPSHOT_INTERVAL_HOURS)
+    while True:
+        try:
+            await take_dashboard_snapshot()
+        except Exception:
+            logger.exception("Dashboard snapshot failed")
+        now = datetime.now(timezone.utc)
+        await asyncio.sleep((snapshot_period(now) + interval - now).total_seconds())
+
+@api_router.get("/dashboard/snapshots")
+async def get_dashboard_snapshots(
+    station_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Historical DashboardStats series for a station or the whole fleet"""
+    if user['role'] == 'driver' and user.get('station_id'):
+        station_id = user['station_id']
+    start, end = parse_window(start_date, end_date, default_days=90)
+    snapshots = await db.dashboard_snapshots.find(
+        {"scope": station_id or "all", "period": {"$gte": start, "$lte": end}},
+        {"_id": 0, "period": 1, "stats": 1}
+    ).sort("period", 1).to_list(None)
+    return [
+        {"date": snap['period'].replace(tzinfo=timezone.utc).isoformat(), **snap['stats']}
+        for snap in snapshots
+    ]
 
 # Get managers (for drivers to send requests)
 @api_router.get("/managers", response_model=List[User])
@@ -949,11 +4558,24 @@ async def get_users(user: dict = Depends(require_manager)):
     users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
     return users
 
+@api_router.put("/users/{user_id}/certifications", response_model=User)
+async def update_user_certifications(user_id: str, update: CertificationUpdate, user: dict = Depends(require_manager)):
+    updated = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": {"certified_vehicle_types": update.model_dump(mode="json")['certified_vehicle_types']}},
+        projection={"_id": 0, "password": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    return updated
+
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, user: dict = Depends(require_manager)):
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    sicil_autocomplete.remove(user_id)
     return {"message": "Kullanıcı silindi"}
 
 # Include router
@@ -973,6 +4595,192 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_unique_index(collection, field: str, **options):
+    """Create a unique index on field, replacing an older non-unique index on the same key."""
+    for name, index in (await collection.index_information()).items():
+        if index['key'] == [(field, 1)] and not index.get('unique'):
+            await collection.drop_index(name)
+    try:
+        await collection.create_index(field, unique=True, **options)
+    except OperationFailure as e:
+        logger.error("Could not create a unique index on %s.%s, resolve duplicates first: %s", collection.name, field, e)
+        await collection.create_index(field)
+
+@app.on_event("startup")
+async def create_indexes():
+    # Status history is append-only, so store it as a time-series collection where supported
+    try:
+        await db.create_collection(
+            "vehicle_status_history",
+            timeseries={"timeField": "changed_at", "metaField": "vehicle_id", "granularity": "minutes"}
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        logger.warning("Time-series collections unavailable, using a regular collection: %s", e)
+    await db.vehicle_status_history.create_index([("vehicle_id", 1), ("changed_at", 1)])
+    try:
+        await db.create_collection(
+            "vehicle_positions",
+            timeseries={"timeField": "timestamp", "metaField": "vehicle_id", "granularity": "seconds"}
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        logger.warning("Time-series collections unavailable, using a regular collection: %s", e)
+    await db.vehicle_positions.create_index([("vehicle_id", 1), ("timestamp", -1)])
+    await db.odometer_readings.create_index([("vehicle_id", 1), ("day", 1)], unique=True)
+    await db.odometer_readings.create_index("day")
+    await db.maintenance_predictions.create_index([("station_id", 1), ("due_date", 1)])
+    await db.maintenance_predictions.create_index([("due_date", 1)])
+    # Predictions are derived data, so duplicates left by older refreshes are dropped; the
+    # prediction loop rebuilds them all when it starts
+    try:
+        await db.maintenance_predictions.create_index([("vehicle_id", 1), ("item", 1)], unique=True)
+    except OperationFailure:
+        await db.maintenance_predictions.delete_many({})
+        await db.maintenance_predictions.create_index([("vehicle_id", 1), ("item", 1)], unique=True)
+    await db.vehicle_equipment.create_index("id", unique=True)
+    await db.vehicle_equipment.create_index("vehicle_id")
+    await db.vehicle_equipment.create_index("serial_number")
+    await db.accident_records.create_index("id", unique=True)
+    await db.accident_records.create_index([("vehicle_id", 1), ("date", -1)])
+    await ensure_unique_index(
+        db["uploads.files"], "metadata.sha256", partialFilterExpression={"metadata.sha256": {"$exists": True}}
+    )
+    await db.assignments.create_index([("vehicle_id", 1), ("starts_at", 1), ("ends_at", 1)])
+    await db.assignments.create_index([("driver_id", 1), ("starts_at", 1), ("ends_at", 1)])
+    await db.faults.create_index([("vehicle_id", 1), ("created_at", 1)])
+    await db.idempotency_keys.create_index("key", unique=True)
+    await db.assignment_locks.create_index("key", unique=True)
+    await db.assignment_locks.create_index("expires_at", expireAfterSeconds=0)
+
+    # Archived notifications are rarely read, so trade CPU for space with zstd block compression
+    try:
+        await db.create_collection(
+            "notifications_archive",
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        logger.warning("Could not create a compressed notification archive, using defaults: %s", e)
+    await db.notifications_archive.create_index([("user_id", 1), ("month", -1)], unique=True)
+    await db.notifications.create_index([("user_id", 1), ("created_at", -1)])
+    await db.notifications.create_index([("read", 1), ("created_at", 1)])
+    # Notifications read before read_at existed start their retention period now
+    await db.notifications.update_many(
+        {"read": True, "read_at": {"$exists": False}}, {"$set": {"read_at": datetime.now(timezone.utc)}}
+    )
+    await db.notifications.create_index("read_at", expireAfterSeconds=NOTIFICATION_READ_RETENTION_DAYS * 86400)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=int(IDEMPOTENCY_TTL_HOURS * 3600))
+    await db.faults.create_index(
+        [("description", "text"), ("resolution_notes", "text"), ("search_text", "text")],
+        weights={"description": 4, "resolution_notes": 2, "search_text": 1},
+        default_language="turkish",
+        name="faults_text"
+    )
+    await db.requests.create_index(
+        [("title", "text"), ("description", "text"), ("search_text", "text")],
+        weights={"title": 4, "description": 2, "search_text": 1},
+        default_language="turkish",
+        name="requests_text"
+    )
+    await db.faults.create_index([("status", 1), ("priority_rank", 1), ("created_at", 1)])
+    await db.faults.create_index([("status", 1), ("station_id", 1), ("priority_rank", 1), ("created_at", 1)])
+    await db.rosters.create_index("id", unique=True)
+    await db.maintenance_records.create_index([("vehicle_id", 1), ("date", -1), ("id", -1)])
+    await db.maintenance_records.create_index([("type", 1), ("date", -1)])
+    await db.maintenance_records.create_index([("station_id", 1), ("date", -1), ("id", -1)])
+    await db.fault_report_jobs.create_index([("config_version", 1), ("start_date", 1), ("end_date", 1), ("created_at", -1)])
+    await db.fault_rollups.create_index(ROLLUP_KEY_FIELDS, unique=True)
+
+    await db.dashboard_snapshots.create_index([("scope", 1), ("period", 1)], unique=True)
+
+    # GeoJSON points for stations created before locations were stored
+    await db.stations.update_many(
+        {"location": {"$exists": False}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}]
+    )
+    await db.stations.create_index([("location", "2dsphere")])
+    await db.dashboard_snapshots.create_index(
+        "taken_at", expireAfterSeconds=DASHBOARD_SNAPSHOT_RETENTION_DAYS * 86400
+    )
+
+    # Build the rollups from history the first time the service starts with existing faults
+    if not await db.fault_rollups.find_one({}) and await db.faults.find_one({}):
+        spawn_background_task(rebuild_fault_rollups())
+
+@app.on_event("startup")
+async def run_migrations():
+    migrated = await migrate_embedded_vehicle_arrays()
+    if migrated:
+        logger.info("Moved embedded equipment and accident records out of %d vehicles", migrated)
+    migrated = await migrate_fault_triage_fields()
+    if migrated:
+        logger.info("Added triage fields to %d faults", migrated)
+    migrated = await migrate_search_text()
+    if migrated:
+        logger.info("Added search text to %d faults and requests", migrated)
+    migrated = await migrate_assignment_bounds()
+    if migrated:
+        logger.info("Added parsed start and end times to %d assignments", migrated)
+    migrated = await migrate_vehicle_plates()
+    if migrated:
+        logger.info("Normalized the plates of %d vehicles", migrated)
+    # Plates can only be unique once they are normalized
+    await ensure_unique_index(db.vehicles, "plate")
+    missing = [u['id'] for u in await db.users.find(
+        {"unread_notifications": {"$exists": False}}, {"_id": 0, "id": 1}
+    ).to_list(None)]
+    if missing:
+        await rebuild_unread_counters(missing)
+        logger.info("Initialized unread notification counters for %d users", len(missing))
+
+@app.on_event("startup")
+async def load_memory_indexes():
+    stations = await db.stations.find({}, {"_id": 0, "id": 1, "name": 1, "latitude": 1, "longitude": 1}).to_list(None)
+    vehicles = await db.vehicles.find(
+        {"status": VehicleStatus.ACTIVE.value}, {"_id": 0, "station_id": 1, "vehicle_type": 1, "status": 1}
+    ).to_list(None)
+    station_index.load(stations, vehicles)
+
+    open_faults = await db.faults.find(
+        {"status": {"$ne": FaultStatus.RESOLVED.value}}, {"_id": 0, "id": 1, "vehicle_id": 1, "fault_type_id": 1, "description": 1}
+    ).to_list(None)
+    duplicate_faults.load(open_faults)
+
+    plates = await db.vehicles.find({}, {"_id": 0, "id": 1, "plate": 1, "station_id": 1}).to_list(None)
+    plate_autocomplete.load([(v['id'], v.get('plate'), v.get('station_id')) for v in plates])
+    sicil_numbers = await db.users.find({"sicil_no": {"$nin": [None, ""]}}, {"_id": 0, "id": 1, "sicil_no": 1}).to_list(None)
+    sicil_autocomplete.load([(u['id'], u['sicil_no']) for u in sicil_numbers])
+
+    latest_positions = await db.vehicle_positions.aggregate([
+        {"$sort": {"vehicle_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$vehicle_id",
+            "timestamp": {"$first": "$timestamp"},
+            "location": {"$first": "$location"},
+            "km": {"$first": "$km"}
+        }}
+    ]).to_list(None)
+    for position in latest_positions:
+        longitude, latitude = position['location']['coordinates']
+        epoch = position['timestamp'].replace(tzinfo=timezone.utc).timestamp()
+        position_store.update(position['_id'], latitude, longitude, epoch, position.get('km'))
+        position_store.persisted_at[position['_id']] = epoch
+
+@app.on_event("startup")
+async def start_scheduled_jobs():
+    spawn_background_task(dashboard_snapshot_loop())
+    spawn_background_task(odometer_retention_loop())
+    spawn_background_task(maintenance_prediction_loop())
+    spawn_background_task(fault_counter_reconcile_loop())
+    spawn_background_task(notification_archive_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(background_tasks):
+        task.cancel()
+    process_executor.shutdown(wait=False, cancel_futures=True)
     client.close()
@@ -0,0 +1,20 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'itfaiye_test')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory Mongo database patched in as server.db."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()['itfaiye_test']
+    monkeypatch.setattr(server, 'db', database)
+    return database
@@ -0,0 +1,32 @@
+import asyncio
+
+import server
+
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def test_reliability_metrics():
+    faults = [
+        {"vehicle_id": "v1", "fault_type_id": "ft1", "service_id": "s1", "status": "resolved",
+         "created_at": "2025-03-01T00:00:00+00:00", "resolved_at": "2025-03-01T04:00:00+00:00"},
+        {"vehicle_id": "v1", "fault_type_id": "ft1", "service_id": None, "status": "pending",
+         "created_at": "2025-03-03T00:00:00+00:00", "resolved_at": None},
+    ]
+    vehicles = [{"id": "v1", "plate": "06 ABC 1", "vehicle_type": "ladder", "current_km": 2000}]
+    result = server.compute_reliability(faults, vehicles)
+    assert result['mttr_by_service'] == [{"service_id": "s1", "mttr_hours": 4.0, "count": 1}]
+    assert result['mtbf_by_vehicle'] == [{"vehicle_id": "v1", "mtbf_hours": 48.0, "count": 1}]
+    assert result['faults_per_1000_km_by_vehicle'][0]['per_1000_km'] == 1.0
+
+
+def test_vehicle_writes_clear_cached_analytics(db):
+    vehicle = server.VehicleCreate(
+        plate="06 ABC 1", brand="Mercedes", model="Atego", year=2020, vehicle_type="ladder", station_id="s1"
+    )
+    server.analytics_cache['reliability'] = {"stale": True}
+    created = asyncio.run(server.create_vehicle(vehicle, user=MANAGER))
+    assert server.analytics_cache == {}
+
+    server.analytics_cache['reliability'] = {"stale": True}
+    asyncio.run(server.delete_vehicle(created.id, user=MANAGER))
+    assert server.analytics_cache == {}
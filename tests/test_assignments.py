@@ -0,0 +1,100 @@
+import asyncio
+import math
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def test_bare_end_date_covers_the_whole_day():
+    start, end = server.assignment_interval({"start_date": "2025-03-01", "end_date": "2025-03-01"})
+    assert end - start == 86400
+    assert server.assignment_interval({"start_date": "2025-03-01", "end_date": None})[1] == math.inf
+    assert server.assignment_bounds({"start_date": "2025-03-01", "end_date": None})['ends_at'] is None
+
+
+def assignment(**fields):
+    return server.AssignmentCreate(**{
+        "vehicle_id": "v1", "driver_id": "d1", "start_date": "2025-03-01T08:00:00+00:00",
+        "end_date": "2025-03-01T16:00:00+00:00", "mission_type": "Nöbet", "location": "Merkez", **fields
+    })
+
+
+def test_concurrent_requests_cannot_double_book(db):
+
+    async def book_twice():
+        await db.assignment_locks.create_index("key", unique=True)
+        return await asyncio.gather(
+            server.create_assignment(assignment(), user=MANAGER),
+            server.create_assignment(assignment(driver_id="d2"), user=MANAGER),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(book_twice())
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == 1 and errors[0].status_code == 409
+    assert asyncio.run(db.assignments.count_documents({})) == 1
+    assert asyncio.run(db.assignment_locks.count_documents({})) == 0
+
+
+def test_assignments_written_by_another_worker_are_seen(db):
+    other = {**assignment().model_dump(), "id": "other-worker", "driver_id": "d9"}
+    other.update(server.assignment_bounds(other))
+    asyncio.run(db.assignments.insert_one(other))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.create_assignment(assignment(), user=MANAGER))
+    assert error.value.status_code == 409
+
+
+def store(*assignments):
+    docs = []
+    for assignment_id, vehicle_id, driver_id, start, end in assignments:
+        doc = {"id": assignment_id, "vehicle_id": vehicle_id, "driver_id": driver_id, "start_date": start, "end_date": end}
+        docs.append({**doc, **server.assignment_bounds(doc)})
+    return docs
+
+
+def test_overlaps_are_half_open_and_open_ended(db):
+    asyncio.run(db.assignments.insert_many(store(
+        ("a", "v1", "d1", "2025-03-01T08:00:00+00:00", "2025-03-01T16:00:00+00:00"),
+        ("b", "v1", "d2", "2025-03-02T08:00:00+00:00", None),
+    )))
+
+    def overlapping(start, end, vehicle_id="v1", driver_id="d9"):
+        doc = {"vehicle_id": vehicle_id, "driver_id": driver_id, "start_date": start, "end_date": end}
+        return asyncio.run(server.overlapping_assignments({**doc, **server.assignment_bounds(doc)}))
+
+    assert overlapping("2025-03-01T16:00:00+00:00", "2025-03-02T08:00:00+00:00")['vehicle'] == []
+    assert overlapping("2025-03-01T15:00:00+00:00", "2025-03-01T17:00:00+00:00")['vehicle'] == ["a"]
+    assert overlapping("2025-04-01T00:00:00+00:00", "2025-04-02T00:00:00+00:00")['vehicle'] == ["b"]
+    assert sorted(overlapping("2025-02-01T00:00:00+00:00", None)['vehicle']) == ["a", "b"]
+    assert overlapping("2025-03-01T10:00:00+00:00", None, vehicle_id="v2", driver_id="d1") == {"vehicle": [], "driver": ["a"]}
+
+
+def test_conflicts_report_overlapping_pairs_per_key(db):
+    asyncio.run(db.assignments.insert_many(store(
+        ("a", "v1", "d1", "2025-03-01T00:00:00+00:00", "2025-03-10T00:00:00+00:00"),
+        ("b", "v1", "d2", "2025-03-02T00:00:00+00:00", "2025-03-03T00:00:00+00:00"),
+        ("c", "v1", "d3", "2025-03-09T00:00:00+00:00", None),
+        ("d", "v2", "d1", "2025-03-05T00:00:00+00:00", "2025-03-06T00:00:00+00:00"),
+        ("e", "v1", "d4", "2025-04-01T00:00:00+00:00", "2025-04-02T00:00:00+00:00"),
+    )))
+    conflicts = asyncio.run(server.get_assignment_conflicts(user=MANAGER))
+    pairs = {(c['kind'], c['key'], tuple(c['assignment_ids'])) for c in conflicts}
+    assert pairs == {
+        ("vehicle", "v1", ("a", "b")), ("vehicle", "v1", ("a", "c")), ("vehicle", "v1", ("c", "e")),
+        ("driver", "d1", ("a", "d")),
+    }
+
+
+def test_migration_stores_bounds_on_old_assignments(db):
+    asyncio.run(db.assignments.insert_many([
+        {"id": "a", "vehicle_id": "v1", "driver_id": "d1", "start_date": "2025-03-01", "end_date": "2025-03-01"},
+        {"id": "bad", "vehicle_id": "v1", "driver_id": "d1", "start_date": "dün", "end_date": None},
+    ]))
+    assert asyncio.run(server.migrate_assignment_bounds()) == 1
+    stored = asyncio.run(db.assignments.find_one({"id": "a"}))
+    assert (stored['ends_at'] - stored['starts_at']).total_seconds() == 86400
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+END = datetime(2025, 3, 11, tzinfo=timezone.utc)
+
+
+def vehicle(vehicle_id, status="active", created_at="2024-01-01T00:00:00+00:00"):
+    return {"id": vehicle_id, "plate": vehicle_id, "vehicle_type": "ladder", "station_id": "s1",
+            "status": status, "created_at": created_at}
+
+
+def availability(result):
+    return {row['vehicle_id']: row['availability'] for row in result['by_vehicle']}
+
+
+def test_transition_inside_window_splits_time():
+    transitions = [{"vehicle_id": "v1", "changed_at": datetime(2025, 3, 6, tzinfo=timezone.utc),
+                    "status": "maintenance", "previous_status": "active"}]
+    result = server.compute_availability(transitions, {}, [vehicle("v1", status="maintenance")], START, END)
+    assert availability(result) == {"v1": 0.5}
+
+
+def test_opening_state_comes_from_history_before_window():
+    result = server.compute_availability([], {"v1": "faulty"}, [vehicle("v1")], START, END)
+    assert availability(result) == {"v1": 0.0}
+
+
+def test_vehicle_created_after_window_is_not_counted():
+    result = server.compute_availability([], {}, [vehicle("v1", created_at="2025-04-01T00:00:00+00:00")], START, END)
+    assert result['by_vehicle'] == []
+    assert result['fleet_availability'] is None
+
+
+def test_vehicle_without_history_is_observed_from_creation():
+    fleet = [vehicle("v1", created_at="2025-03-06T00:00:00+00:00"), vehicle("v2", status="faulty")]
+    result = server.compute_availability([], {}, fleet, START, END)
+    assert availability(result) == {"v1": 1.0, "v2": 0.0}
+    assert result['fleet_availability'] == 5 / 15
+
+
+def test_deleted_vehicle_counts_until_deletion():
+    transitions = [{"vehicle_id": "v1", "changed_at": datetime(2025, 3, 6, tzinfo=timezone.utc),
+                    "status": None, "previous_status": "active"}]
+    deleted = {**vehicle("v1", status=None), "created_at": None}
+    fleet = [deleted, vehicle("v2", status="faulty")]
+    result = server.compute_availability(transitions, {}, fleet, START, END)
+    assert availability(result) == {"v1": 1.0, "v2": 0.0}
+    assert result['fleet_availability'] == 5 / 15
+
+
+def test_malformed_window_dates_are_rejected():
+    for start_date, end_date in (("dün", None), (None, "2025-13-01"), ("2025-03-10", "2025-03-01")):
+        with pytest.raises(HTTPException) as error:
+            server.parse_window(start_date, end_date)
+        assert error.value.status_code == 400
+    start, end = server.parse_window("2025-03-01", "2025-03-11T00:00:00+03:00")
+    assert start == START and end.tzinfo is not None
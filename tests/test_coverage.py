@@ -0,0 +1,47 @@
+import numpy as np
+
+import server
+
+STATIONS = [
+    {"id": "s1", "name": "Merkez", "latitude": 39.92, "longitude": 32.85},
+    {"id": "s2", "name": "Çankaya", "latitude": 39.88, "longitude": 32.86},
+]
+LADDER = server.VEHICLE_TYPE_INDEX["ladder"]
+
+
+def active(station_id):
+    return {"station_id": station_id, "vehicle_type": "ladder", "status": "active"}
+
+
+def build(vehicles):
+    stations = server.StationIndex()
+    grid = server.CoverageGrid(stations)
+    stations.load(STATIONS, vehicles)
+    return stations, grid
+
+
+def test_every_cell_points_at_its_nearest_operational_station():
+    _, grid = build([active("s1"), active("s2")])
+    assert grid.rows * grid.cols <= server.COVERAGE_MAX_CELLS
+    assert np.array_equal(grid.nearest[LADDER], grid.distances.argmin(axis=1))
+    assert np.all(grid.nearest[server.VEHICLE_TYPE_INDEX["tanker"]] == -1)
+
+
+def test_incremental_updates_match_a_full_rebuild():
+    stations, grid = build([active("s1"), active("s2")])
+    version = grid.version
+    stations.apply_vehicle_change(active("s2"), None)
+    assert grid.version == version + 1
+    assert np.all(grid.nearest[LADDER] == 0)
+
+    stations.apply_vehicle_change(None, active("s2"))
+    incremental = grid.nearest[LADDER].copy()
+    grid.rebuild()
+    assert np.array_equal(incremental, grid.nearest[LADDER])
+
+
+def test_payload_counts_uncovered_cells():
+    _, grid = build([])
+    payload = grid.payload("ladder", max_km=5)
+    assert payload['uncovered_cells'] == grid.rows * grid.cols
+    assert payload['stations'] == ["s1", "s2"]
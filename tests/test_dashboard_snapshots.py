@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def seed(db):
+    asyncio.run(db.stations.insert_many([{"id": "s1", "name": "Merkez"}, {"id": "s2", "name": "Kuzey"}]))
+    asyncio.run(db.vehicles.insert_many([
+        {"id": "v1", "station_id": "s1", "status": "active"},
+        {"id": "v2", "station_id": "s1", "status": "faulty"},
+        {"id": "v3", "station_id": "s2", "status": "accident"},
+    ]))
+    asyncio.run(db.faults.insert_many([
+        {"id": "f1", "vehicle_id": "v2", "status": "pending"},
+        {"id": "f2", "vehicle_id": "v3", "status": "resolved"},
+    ]))
+    asyncio.run(db.users.insert_many([
+        {"id": "d1", "role": "driver", "station_id": "s1"},
+        {"id": "d2", "role": "driver", "station_id": "s2"},
+        {"id": "d3", "role": "driver", "station_id": "s2"},
+    ]))
+
+
+def test_snapshot_period_floors_to_the_interval(monkeypatch):
+    monkeypatch.setattr(server, 'DASHBOARD_SNAPSHOT_INTERVAL_HOURS', 6)
+    moment = datetime(2025, 3, 1, 14, 35, tzinfo=timezone.utc)
+    assert server.snapshot_period(moment) == datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+    assert server.snapshot_period(datetime(2025, 3, 1, 12, tzinfo=timezone.utc)) == datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def test_snapshot_stores_station_and_fleet_scopes(db):
+    seed(db)
+    assert asyncio.run(server.take_dashboard_snapshot()) == 3
+    snapshots = {s['scope']: s['stats'] for s in asyncio.run(db.dashboard_snapshots.find({}).to_list(None))}
+    assert set(snapshots) == {"all", "s1", "s2"}
+    assert snapshots["all"] == {
+        "total_vehicles": 3, "active_vehicles": 1, "faulty_vehicles": 1, "accident_vehicles": 1,
+        "pending_faults": 1, "expiring_soon": 0, "oil_change_due_soon": 0, "total_stations": 2, "total_drivers": 3
+    }
+    assert (snapshots["s1"]['total_vehicles'], snapshots["s1"]['pending_faults'], snapshots["s1"]['total_drivers']) == (2, 1, 1)
+    assert (snapshots["s2"]['total_vehicles'], snapshots["s2"]['pending_faults'], snapshots["s2"]['total_drivers']) == (1, 0, 2)
+    assert snapshots["s2"]['total_stations'] == 1
+
+
+def test_rerunning_a_snapshot_upserts_the_period(db):
+    seed(db)
+    asyncio.run(server.take_dashboard_snapshot())
+    asyncio.run(db.faults.update_one({"id": "f1"}, {"$set": {"status": "resolved"}}))
+    asyncio.run(server.take_dashboard_snapshot())
+    assert asyncio.run(db.dashboard_snapshots.count_documents({})) == 3
+    latest = asyncio.run(db.dashboard_snapshots.find_one({"scope": "all"}))
+    assert latest['stats']['pending_faults'] == 0
+
+
+def test_snapshot_history_is_scoped_and_windowed(db):
+    now = datetime.now(timezone.utc)
+    periods = [server.snapshot_period(now - timedelta(days=days)) for days in (200, 10, 1)]
+    stats = server.DashboardStats(
+        total_vehicles=0, active_vehicles=0, faulty_vehicles=0, accident_vehicles=0, pending_faults=0,
+        expiring_soon=0, oil_change_due_soon=0, total_stations=1, total_drivers=0
+    ).model_dump()
+    asyncio.run(db.dashboard_snapshots.insert_many(
+        [{"scope": "s1", "period": p, "stats": {**stats, "total_vehicles": i}} for i, p in enumerate(periods)]
+        + [{"scope": "all", "period": periods[2], "stats": stats}]
+    ))
+    history = asyncio.run(server.get_dashboard_snapshots(station_id="s1", user=MANAGER))
+    assert [h['total_vehicles'] for h in history] == [1, 2]
+    assert history[0]['date'] == periods[1].isoformat()
+
+    driver = {"id": "d1", "role": "driver", "station_id": "s1"}
+    assert len(asyncio.run(server.get_dashboard_snapshots(station_id=None, user=driver))) == 2
+    assert len(asyncio.run(server.get_dashboard_snapshots(station_id=None, user=MANAGER))) == 1
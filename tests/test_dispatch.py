@@ -0,0 +1,34 @@
+import server
+
+STATIONS = [
+    {"id": "s1", "name": "Merkez", "latitude": 39.92, "longitude": 32.85},
+    {"id": "s2", "name": "Çankaya", "latitude": 39.88, "longitude": 32.86},
+    {"id": "s3", "name": "Keçiören", "latitude": 40.00, "longitude": 32.86},
+]
+
+
+def active(station_id, vehicle_type="ladder"):
+    return {"station_id": station_id, "vehicle_type": vehicle_type, "status": "active"}
+
+
+def test_haversine_distance():
+    distance = server.haversine_km(39.92, 32.85, server.np.array([39.93]), server.np.array([32.85]))
+    assert abs(distance[0] - 1.112) < 0.01
+
+
+def test_nearest_only_returns_stations_with_an_active_vehicle_of_the_type():
+    index = server.StationIndex()
+    index.load(STATIONS, [active("s1"), active("s3"), active("s2", "tanker")])
+    result = index.nearest(39.87, 32.86, "ladder", k=2)
+    assert [row['station_id'] for row in result] == ["s1", "s3"]
+    assert result[0]['distance_km'] < result[1]['distance_km']
+    assert index.nearest(39.87, 32.86, "rescue", k=2) == []
+
+
+def test_vehicle_changes_adjust_active_counts():
+    index = server.StationIndex()
+    index.load(STATIONS, [active("s1")])
+    index.apply_vehicle_change(active("s1"), {**active("s1"), "status": "maintenance"})
+    assert index.nearest(39.92, 32.85, "ladder", k=1) == []
+    index.apply_vehicle_change(None, active("s2"))
+    assert index.nearest(39.92, 32.85, "ladder", k=1)[0]['station_id'] == "s2"
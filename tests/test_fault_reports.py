@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+import server
+
+
+def test_date_only_end_covers_the_whole_day():
+    bounds = server.report_date_filter("2025-03-01", "2025-03-31")
+    assert bounds == {"$gte": "2025-03-01", "$lt": "2025-04-01"}
+    assert bounds['$gte'] <= "2025-03-31T23:59:59+00:00" < bounds['$lt']
+
+
+def test_full_timestamp_end_is_inclusive():
+    assert server.report_date_filter(None, "2025-03-31T12:00:00+00:00") == {"$lte": "2025-03-31T12:00:00+00:00"}
+    assert server.report_date_filter(None, None) == {}
+
+
+def test_open_ended_reports_are_bucketed_in_time():
+    now = datetime(2025, 3, 1, 10, 7, 30, tzinfo=timezone.utc)
+    bucket = server.report_cache_bucket(None, now)
+    assert bucket == server.report_cache_bucket(None, now.replace(minute=0, second=0))
+    assert bucket != server.report_cache_bucket(None, now.replace(hour=11))
+    assert server.report_cache_bucket("2025-03-01", now) is None
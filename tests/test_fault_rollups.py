@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+import server
+
+
+def fault(**fields):
+    return {
+        "vehicle_id": "v1", "fault_type_id": "ft1", "priority": "normal",
+        "created_at": "2025-03-05T10:00:00+00:00", "status": "pending", **fields
+    }
+
+
+def test_rollup_bucket_granularities():
+    moment = datetime(2025, 3, 5, 23, 30, tzinfo=timezone.utc)
+    assert server.rollup_bucket(moment, server.RollupGranularity.DAY) == "2025-03-05"
+    assert server.rollup_bucket(moment, server.RollupGranularity.WEEK) == "2025-03-03"
+    assert server.rollup_bucket(moment, server.RollupGranularity.MONTH) == "2025-03-01"
+
+
+def test_resolved_faults_contribute_both_events():
+    assert [metric for metric, _ in server.fault_rollup_events(fault())] == ["created"]
+    resolved = fault(status="resolved", resolved_at="2025-03-07T08:00:00+00:00")
+    assert [metric for metric, _ in server.fault_rollup_events(resolved)] == ["created", "resolved"]
+
+
+def test_priority_change_moves_counts_between_series():
+    before = fault(status="resolved", resolved_at="2025-03-07T08:00:00+00:00")
+    operations = server.fault_rollup_move_operations(before, {**before, "priority": "urgent"}, {"station_id": "s1"})
+    moves = {}
+    for operation in operations:
+        key, update = operation._filter, operation._doc["$inc"]
+        for metric, delta in update.items():
+            moves[(key['priority'], metric)] = moves.get((key['priority'], metric), 0) + delta
+    per_granularity = len(server.RollupGranularity)
+    assert moves == {
+        ("normal", "created"): -per_granularity, ("urgent", "created"): per_granularity,
+        ("normal", "resolved"): -per_granularity, ("urgent", "resolved"): per_granularity,
+    }
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+DRIVER = {"id": "d1", "role": "driver", "name": "Sürücü", "station_id": "s1"}
+
+
+@pytest.fixture
+def faults_db(db, monkeypatch):
+    monkeypatch.setattr(server, 'duplicate_faults', server.DuplicateFaultIndex())
+    monkeypatch.setattr(server, 'station_index', server.StationIndex())
+    return db
+
+
+def test_priority_aliases_are_normalized():
+    assert server.normalize_priority(" Acil ") == "urgent"
+    assert server.normalize_priority("yuksek") == "high"
+    assert server.normalize_priority("whenever") == "normal"
+    assert server.normalize_priority(None) == "normal"
+
+
+def test_fault_for_unknown_vehicle_is_404(faults_db):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.create_fault(server.FaultCreate(vehicle_id="missing", description="Fren arızası"), user=DRIVER))
+    assert error.value.status_code == 404
+    assert asyncio.run(faults_db.faults.count_documents({})) == 0
+
+
+def test_fault_counts_against_its_vehicle(faults_db):
+    asyncio.run(faults_db.vehicles.insert_one({"id": "v1", "plate": "06ABC01", "station_id": "s1", "status": "active"}))
+    fault = asyncio.run(server.create_fault(server.FaultCreate(vehicle_id="v1", description="Fren arızası"), user=DRIVER))
+    vehicle = asyncio.run(faults_db.vehicles.find_one({"id": "v1"}))
+    assert fault.station_id == "s1"
+    assert vehicle['open_fault_count'] == 1 and vehicle['status'] == "faulty"
+
+
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def seed_faults(database, *faults):
+    asyncio.run(database.vehicles.insert_one(
+        {"id": "v1", "plate": "06ABC01", "station_id": "s1", "vehicle_type": "ladder", "status": "faulty",
+         "open_fault_count": len(faults)}
+    ))
+    asyncio.run(database.faults.insert_many([
+        {"id": fault_id, "vehicle_id": "v1", "description": "Fren arızası", "status": status, "priority": "normal",
+         "created_at": "2026-10-01T08:00:00+00:00"}
+        for fault_id, status in faults
+    ]))
+
+
+def bucket_counts(database, granularity="day"):
+    rows = asyncio.run(database.fault_rollups.find({"granularity": granularity}).to_list(None))
+    return {row['priority']: (row.get('created', 0), row.get('resolved', 0)) for row in rows}
+
+
+def test_bulk_resolve_counts_only_matched_writes(faults_db):
+    seed_faults(faults_db, ("f1", "pending"), ("f2", "resolved"))
+    operations = [
+        server.FaultBulkOperation(fault_id="f1", action="resolve"),
+        server.FaultBulkOperation(fault_id="f1", action="resolve"),
+        server.FaultBulkOperation(fault_id="f2", action="resolve"),
+        server.FaultBulkOperation(fault_id="nope", action="resolve"),
+    ]
+    response = asyncio.run(server.bulk_update_faults(operations, user=MANAGER))
+    assert [result['ok'] for result in response['results']] == [True, False, False, False]
+    assert response['updated'] == 1
+    vehicle = asyncio.run(faults_db.vehicles.find_one({"id": "v1"}))
+    assert vehicle['open_fault_count'] == 1
+    assert sum(resolved for _, resolved in bucket_counts(faults_db).values()) == 1
+
+
+def test_bulk_reprioritize_moves_rollup_buckets(faults_db):
+    seed_faults(faults_db, ("f1", "pending"))
+    fault = asyncio.run(faults_db.faults.find_one({"id": "f1"}, {"_id": 0}))
+    asyncio.run(server.record_fault_rollup(fault, {"station_id": "s1", "vehicle_type": "ladder"}, "created",
+                                           server.datetime.fromisoformat(fault['created_at'])))
+    operations = [server.FaultBulkOperation(fault_id="f1", action="reprioritize", priority="acil")]
+    asyncio.run(server.bulk_update_faults(operations, user=MANAGER))
+    counts = bucket_counts(faults_db)
+    assert counts['normal'] == (0, 0) and counts['urgent'] == (1, 0)
+    assert asyncio.run(faults_db.faults.find_one({"id": "f1"}))['priority_rank'] == 0
+
+
+def test_failed_insert_leaves_the_counter_alone(faults_db, monkeypatch):
+    asyncio.run(faults_db.vehicles.insert_one({"id": "v1", "plate": "06ABC01", "station_id": "s1", "status": "active"}))
+
+    collection = type(faults_db.faults)
+    insert_one = collection.insert_one
+
+    def failing_insert(self, doc, *args, **kwargs):
+        if self.name == "faults":
+            raise server.OperationFailure("write failed")
+        return insert_one(self, doc, *args, **kwargs)
+
+    monkeypatch.setattr(collection, 'insert_one', failing_insert)
+    with pytest.raises(server.OperationFailure):
+        asyncio.run(server.create_fault(server.FaultCreate(vehicle_id="v1", description="Fren arızası"), user=DRIVER))
+    vehicle = asyncio.run(faults_db.vehicles.find_one({"id": "v1"}))
+    assert vehicle.get('open_fault_count') is None and vehicle['status'] == "active"
+
+
+def test_reconcile_corrects_counters_and_rederives_status(faults_db):
+    seed_faults(faults_db, ("f1", "pending"), ("f2", "resolved"))
+    asyncio.run(faults_db.vehicles.insert_many([
+        {"id": "v2", "status": "faulty", "open_fault_count": 1},
+        {"id": "v3", "status": "accident", "open_fault_count": 3},
+    ]))
+    assert asyncio.run(server.reconcile_open_fault_counts()) == 3
+    vehicles = {v['id']: v for v in asyncio.run(faults_db.vehicles.find().to_list(None))}
+    assert vehicles['v1']['open_fault_count'] == 1 and vehicles['v1']['status'] == "faulty"
+    assert vehicles['v2']['open_fault_count'] == 0 and vehicles['v2']['status'] == "active"
+    assert vehicles['v3']['open_fault_count'] == 0 and vehicles['v3']['status'] == "accident"
+    history = asyncio.run(faults_db.vehicle_status_history.find({}, {"_id": 0}).to_list(None))
+    assert [(h['vehicle_id'], h['status'], h['reason']) for h in history] == [("v2", "active", "reconcile")]
+
+
+def test_duplicate_index_matches_folded_similar_descriptions():
+    index = server.DuplicateFaultIndex()
+    index.load([
+        {"id": "f1", "vehicle_id": "v1", "fault_type_id": "t1", "description": "Sol ön fren balatası aşınmış"},
+        {"id": "f2", "vehicle_id": "v2", "fault_type_id": "t1", "description": "Sol ön fren balatası aşınmış"},
+    ])
+    assert index.find("v1", "t1", "sol on fren balatasi asinmis") == ("f1", 1.0)
+    fault_id, similarity = index.find("v1", None, "Sol ön fren balatası aşınmış, ses geliyor")
+    assert fault_id == "f1" and server.DUPLICATE_FAULT_SIMILARITY <= similarity < 1
+    assert index.find("v1", "t2", "Sol ön fren balatası aşınmış") is None
+    assert index.find("v1", "t1", "Motor hararet yapıyor") is None
+    assert index.find("v1", "t1", "!!!") is None
+    index.remove("v1", "f1")
+    assert "v1" not in index.vehicles and index.find("v2", "t1", "Sol ön fren balatası aşınmış")[0] == "f2"
+
+
+def test_duplicate_report_attaches_to_the_open_fault(faults_db):
+    asyncio.run(faults_db.vehicles.insert_one({"id": "v1", "plate": "06ABC01", "station_id": "s1", "status": "active"}))
+    report = server.FaultCreate(vehicle_id="v1", description="Sol ön fren balatası aşınmış")
+    first = asyncio.run(server.create_fault(report, user=DRIVER))
+    second = asyncio.run(server.create_fault(report, user={**DRIVER, "id": "d2"}))
+    assert second['id'] == first.id and second['duplicate_count'] == 1
+    assert asyncio.run(faults_db.faults.count_documents({})) == 1
+    assert asyncio.run(faults_db.vehicles.find_one({"id": "v1"}))['open_fault_count'] == 1
+
+
+def test_bulk_resolve_skips_faults_resolved_concurrently(faults_db, monkeypatch):
+    seed_faults(faults_db, ("f1", "pending"), ("f2", "pending"))
+    collection = type(faults_db.faults)
+    bulk_write = collection.bulk_write
+    calls = []
+
+    async def resolve_first(self, operations, *args, **kwargs):
+        if self.name == "faults":
+            calls.append(len(operations))
+            await self.update_one({"id": "f1"}, {"$set": {"status": "resolved", "resolved_at": "2026-10-02T00:00:00+00:00"}})
+        return await bulk_write(self, operations, *args, **kwargs)
+
+    monkeypatch.setattr(collection, 'bulk_write', resolve_first)
+    operations = [server.FaultBulkOperation(fault_id=f, action="resolve") for f in ("f1", "f2")]
+    response = asyncio.run(server.bulk_update_faults(operations, user=MANAGER))
+    assert calls == [2]
+    assert [result['ok'] for result in response['results']] == [False, True]
+    assert response['results'][0]['detail'] == "Arıza zaten çözülmüş"
+    assert asyncio.run(faults_db.vehicles.find_one({"id": "v1"}))['open_fault_count'] == 1
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+import server
+
+
+def token(user_id):
+    return {"Authorization": f"Bearer {server.create_token(user_id, 'manager')}"}
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(server, 'idempotency_cache', server.IdempotencyCache(16))
+    calls = []
+    router = APIRouter(route_class=server.IdempotentRoute)
+
+    @router.post("/items")
+    async def create_item(item: dict):
+        calls.append(item)
+        return {"call": len(calls), **item}
+
+    @router.post("/claim")
+    async def claim(station_id: str = "all"):
+        calls.append(station_id)
+        return {"call": len(calls), "station_id": station_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as test_client:
+        test_client.calls = calls
+        yield test_client
+
+
+def test_cache_evicts_least_recently_used_and_expired_entries():
+    cache = server.IdempotencyCache(2)
+    now = datetime.now(timezone.utc)
+    cache.put("a", {"created_at": now})
+    cache.put("b", {"created_at": now})
+    cache.get("a")
+    cache.put("c", {"created_at": now})
+    assert list(cache.entries) == ["a", "c"]
+    cache.put("old", {"created_at": now - timedelta(hours=server.IDEMPOTENCY_TTL_HOURS + 1)})
+    assert cache.get("old") is None
+
+
+def test_retry_replays_the_first_response(client):
+    headers = {**token("u1"), "Idempotency-Key": "k1"}
+    first = client.post("/items", json={"name": "a"}, headers=headers)
+    second = client.post("/items", json={"name": "a"}, headers=headers)
+    assert second.json() == first.json() == {"call": 1, "name": "a"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert client.post("/items", json={"name": "b"}, headers=headers).status_code == 422
+
+
+def test_keys_are_scoped_by_user_not_by_header(client):
+    first = client.post("/items", json={"name": "a"}, headers={**token("u1"), "Idempotency-Key": "k1"})
+    # Another user's identical key runs the handler again; requests without a token are never deduplicated
+    again = client.post("/items", json={"name": "a"}, headers={**token("u1"), "Idempotency-Key": "k1"})
+    other = client.post("/items", json={"name": "a"}, headers={**token("u2"), "Idempotency-Key": "k1"})
+    assert again.json() == first.json()
+    assert other.json()['call'] == 2
+    anonymous = [client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"}) for _ in range(2)]
+    assert [r.json()['call'] for r in anonymous] == [3, 4]
+
+
+def test_stale_in_progress_record_is_taken_over(client, db):
+    headers = {**token("u1"), "Idempotency-Key": "k1"}
+    client.post("/items", json={"name": "a"}, headers=headers)
+
+    def crash(started_at):
+        # Turn the stored response back into the record of an attempt that never finished
+        server.idempotency_cache.entries.clear()
+        return db.idempotency_keys.update_many(
+            {}, {"$set": {"status": "in_progress", "attempt": "crashed", "started_at": started_at}}
+        )
+
+    client.portal.call(crash, datetime.now(timezone.utc))
+    assert client.post("/items", json={"name": "a"}, headers=headers).status_code == 409
+
+    client.portal.call(crash, datetime.now(timezone.utc) - timedelta(seconds=server.IDEMPOTENCY_LEASE_SECONDS + 1))
+    retried = client.post("/items", json={"name": "a"}, headers=headers)
+    assert retried.status_code == 200 and retried.json()['call'] == 2
+    assert client.post("/items", json={"name": "a"}, headers=headers).json()['call'] == 2
+
+
+def test_query_string_is_part_of_the_fingerprint(client):
+    headers = {**token("u1"), "Idempotency-Key": "k1"}
+    first = client.post("/claim?station_id=A", headers=headers)
+    assert client.post("/claim?station_id=A", headers=headers).json() == first.json()
+    assert client.post("/claim?station_id=B", headers=headers).status_code == 422
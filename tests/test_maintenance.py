@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+TODAY = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def predictions(vehicles, km_rates=None):
+    return {
+        (row['vehicle_id'], row['item']): row
+        for row in server.predict_maintenance(vehicles, km_rates or {}, TODAY)
+    }
+
+
+def test_oil_change_due_by_km_rate_before_scheduled_date():
+    vehicle = {"id": "v1", "plate": "06 ABC 1", "current_km": 9000, "next_oil_change_km": 10000,
+               "next_oil_change_date": "2025-06-01"}
+    oil = predictions([vehicle], {"v1": 100.0})[("v1", "oil_change")]
+    assert (oil['due_date'], oil['basis'], oil['days_left']) == ("2025-03-11", "km", 10)
+
+
+def test_oil_change_falls_back_to_scheduled_date():
+    vehicle = {"id": "v1", "current_km": 9000, "next_oil_change_km": 10000, "next_oil_change_date": "2025-03-05"}
+    slow = predictions([vehicle], {"v1": 10.0})[("v1", "oil_change")]
+    unknown_rate = predictions([vehicle])[("v1", "oil_change")]
+    assert (slow['due_date'], slow['basis']) == ("2025-03-05", "date")
+    assert (unknown_rate['due_date'], unknown_rate['basis']) == ("2025-03-05", "date")
+
+
+def test_document_expiries_and_missing_dates():
+    vehicle = {"id": "v1", "inspection_expiry": "2025-02-20T00:00:00+00:00", "insurance_expiry": "geçersiz"}
+    result = predictions([vehicle])
+    assert set(result) == {("v1", "inspection")}
+    assert result[("v1", "inspection")]['days_left'] == -9
+    assert server.predict_maintenance([], {}, TODAY) == []
+
+
+def test_refresh_upserts_rows_and_drops_items_no_longer_due(db):
+    asyncio.run(db.maintenance_predictions.create_index([("vehicle_id", 1), ("item", 1)], unique=True))
+    asyncio.run(db.vehicles.insert_many([
+        {"id": "v1", "plate": "06 A 1", "station_id": "s1", "inspection_expiry": "2030-01-01", "kasko_expiry": "2030-02-01"},
+        {"id": "v2", "plate": "06 A 2", "station_id": "s1", "inspection_expiry": "2030-01-01"},
+    ]))
+    asyncio.run(db.maintenance_predictions.insert_one({"vehicle_id": "gone", "item": "kasko"}))
+
+    async def refresh_concurrently():
+        await asyncio.gather(server.refresh_maintenance_predictions(), server.refresh_maintenance_predictions(["v1"]))
+
+    def rows():
+        return sorted((p['vehicle_id'], p['item']) for p in asyncio.run(db.maintenance_predictions.find().to_list(None)))
+
+    asyncio.run(refresh_concurrently())
+    assert rows() == [("v1", "inspection"), ("v1", "kasko"), ("v2", "inspection")]
+
+    asyncio.run(db.vehicles.update_one({"id": "v1"}, {"$unset": {"kasko_expiry": ""}}))
+    asyncio.run(server.refresh_maintenance_predictions(["v1"]))
+    assert rows() == [("v1", "inspection"), ("v2", "inspection")]
+
+
+def test_calendar_rejects_malformed_end_date(db):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_maintenance_calendar(end_date="yarın", station_id=None, user={"id": "m1", "role": "manager"}))
+    assert error.value.status_code == 400
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+USER = {"id": "u1", "role": "driver", "name": "Sürücü"}
+
+
+def old_notification(notification_id, days=200, read=False):
+    created_at = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    return server.Notification(
+        id=notification_id, user_id="u1", title="Bildirim", message="Mesaj", type="fault", read=read, created_at=created_at
+    ).model_dump()
+
+
+def test_archive_moves_old_unread_notifications(db):
+    asyncio.run(db.users.insert_one({"id": "u1", "unread_notifications": 2}))
+    asyncio.run(db.notifications.insert_many([old_notification("n1"), old_notification("n2", days=1)]))
+    assert asyncio.run(server.archive_old_notifications()) == 1
+    assert [n['id'] for n in asyncio.run(db.notifications.find().to_list(None))] == ["n2"]
+    assert asyncio.run(db.users.find_one({"id": "u1"}))['unread_notifications'] == 1
+    archived = asyncio.run(server.get_archived_notifications(month=None, limit=10, user=USER))
+    assert [n['id'] for n in archived] == ["n1"]
+
+
+def test_notification_read_during_archiving_is_not_archived(db, monkeypatch):
+    asyncio.run(db.users.insert_one({"id": "u1", "unread_notifications": 2}))
+    asyncio.run(db.notifications.insert_many([old_notification("n1"), old_notification("n2")]))
+    collection = type(db.notifications)
+    bulk_write = collection.bulk_write
+
+    async def read_after_archiving(self, operations, *args, **kwargs):
+        result = await bulk_write(self, operations, *args, **kwargs)
+        if self.name == "notifications_archive":
+            await server.mark_notification_read("n1", user=USER)
+        return result
+
+    monkeypatch.setattr(collection, 'bulk_write', read_after_archiving)
+    assert asyncio.run(server.archive_old_notifications()) == 1
+    archived = asyncio.run(server.get_archived_notifications(month=None, limit=10, user=USER))
+    assert [n['id'] for n in archived] == ["n2"]
+    assert asyncio.run(db.notifications.find_one({"id": "n1"}))['read'] is True
+    assert asyncio.run(db.users.find_one({"id": "u1"}))['unread_notifications'] == 0
+
+
+def test_archive_listing_reads_only_the_newest_months_it_needs(db):
+    asyncio.run(db.notifications_archive.insert_many([
+        {"user_id": "u1", "month": month, "notifications": [
+            {**old_notification(f"{month}-{i}"), "created_at": f"{month}-0{i + 1}T00:00:00+00:00"} for i in range(3)
+        ]}
+        for month in ("2026-01", "2026-02", "2026-03")
+    ]))
+    archived = asyncio.run(server.get_archived_notifications(month=None, limit=4, user=USER))
+    assert [n['id'] for n in archived] == ["2026-03-2", "2026-03-1", "2026-03-0", "2026-02-2"]
+    archived = asyncio.run(server.get_archived_notifications(month="2026-01", limit=10, user=USER))
+    assert len(archived) == 3
+
+
+def notify(*user_ids):
+    return [server.Notification(user_id=user_id, title="Bildirim", message="Mesaj", type="fault") for user_id in user_ids]
+
+
+def unread(database, user_id="u1"):
+    return asyncio.run(database.users.find_one({"id": user_id})).get('unread_notifications')
+
+
+def test_unread_counter_follows_sends_and_reads(db):
+    asyncio.run(db.users.insert_many([{"id": "u1", "unread_notifications": 0}, {"id": "u2", "unread_notifications": 0}]))
+    asyncio.run(server.send_notifications(notify("u1", "u1", "u2", "u1")))
+    asyncio.run(server.send_notifications([]))
+    assert unread(db) == 3 and unread(db, "u2") == 1
+
+    ids = [n['id'] for n in asyncio.run(db.notifications.find({"user_id": "u1"}).to_list(None))]
+    assert asyncio.run(server.mark_notification_read(ids[0], user=USER))
+    # Reading the same notification again does not move the counter
+    asyncio.run(server.mark_notification_read(ids[0], user=USER))
+    marked = asyncio.run(server.mark_notifications_read(server.NotificationReadRequest(ids=ids[:2]), user=USER))
+    assert marked == {"marked": 1} and unread(db) == 1
+    assert asyncio.run(server.mark_notifications_read(server.NotificationReadRequest(all=True), user=USER)) == {"marked": 1}
+    assert unread(db) == 0 and unread(db, "u2") == 1
+    user = asyncio.run(db.users.find_one({"id": "u1"}, {"_id": 0}))
+    assert asyncio.run(server.get_unread_notification_count(user=user)) == {"unread": 0}
+
+
+def test_marking_unknown_or_nothing_is_rejected(db):
+    asyncio.run(db.users.insert_one({"id": "u1", "unread_notifications": 0}))
+    asyncio.run(server.send_notifications(notify("u2")))
+    other = asyncio.run(db.notifications.find_one({"user_id": "u2"}))['id']
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.mark_notification_read(other, user=USER))
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.mark_notifications_read(server.NotificationReadRequest(), user=USER))
+    assert error.value.status_code == 400
+
+
+def test_rebuild_recounts_unread_notifications(db):
+    asyncio.run(db.users.insert_many([{"id": "u1", "unread_notifications": 7}, {"id": "u2"}]))
+    asyncio.run(server.send_notifications(notify("u1", "u1")))
+    asyncio.run(db.users.update_one({"id": "u1"}, {"$set": {"unread_notifications": 7}}))
+    asyncio.run(server.rebuild_unread_counters())
+    assert unread(db) == 2 and unread(db, "u2") == 0
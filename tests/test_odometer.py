@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+
+USER = {"id": "u1", "role": "manager", "name": "Yönetici"}
+
+
+def moment(day, hour):
+    return datetime(2025, 3, day, hour, tzinfo=timezone.utc)
+
+
+def test_buckets_keep_daily_min_max_and_count(db):
+    asyncio.run(server.store_odometer_readings([
+        ("v1", moment(1, 8), 1000), ("v1", moment(1, 18), 1040), ("v1", moment(1, 12), 1020),
+        ("v1", moment(2, 9), 1050), ("v2", moment(1, 9), 500),
+    ]))
+    asyncio.run(server.store_odometer_readings([("v1", moment(1, 20), 1045)]))
+    bucket = asyncio.run(db.odometer_readings.find_one({"vehicle_id": "v1", "day": "2025-03-01"}))
+    assert (bucket['min_km'], bucket['max_km'], bucket['count']) == (1000, 1045, 4)
+    assert len(bucket['readings']) == 4
+    assert asyncio.run(db.odometer_readings.count_documents({})) == 3
+
+
+def test_daily_deltas_include_driving_between_days(db):
+    asyncio.run(server.store_odometer_readings([
+        ("v1", moment(1, 8), 1000), ("v1", moment(1, 18), 1040),
+        ("v1", moment(2, 9), 1060), ("v1", moment(2, 17), 1100),
+        ("v1", moment(4, 9), 1100),
+    ]))
+    usage = asyncio.run(server.get_vehicle_odometer(
+        "v1", start_date="2025-03-01", end_date="2025-03-05", include_readings=True, user=USER
+    ))
+    assert [(d['date'], d['km_delta']) for d in usage['days']] == [
+        ("2025-03-01", 40), ("2025-03-02", 60), ("2025-03-04", 0)
+    ]
+    assert usage['daily_usage_rate'] == 100 / 3
+    assert usage['days'][0]['points'][0] == {"timestamp": "2025-03-01T08:00:00+00:00", "km": 1000}
+
+
+def test_compaction_drops_raw_points_of_old_buckets(db):
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=server.ODOMETER_RAW_RETENTION_DAYS + 1)
+    asyncio.run(server.store_odometer_readings([("v1", old, 1000), ("v1", now, 2000)]))
+    assert asyncio.run(server.compact_odometer_buckets()) == 1
+    buckets = {b['day']: b for b in asyncio.run(db.odometer_readings.find().to_list(None))}
+    compacted = buckets[old.date().isoformat()]
+    assert 'readings' not in compacted and compacted['max_km'] == 1000 and compacted['count'] == 1
+    assert len(buckets[now.date().isoformat()]['readings']) == 1
+
+
+def test_readings_for_unknown_vehicles_are_ignored(db, monkeypatch):
+    monkeypatch.setattr(server, 'maintenance_dirty', set())
+    asyncio.run(db.vehicles.insert_one({"id": "v1", "current_km": 900}))
+    readings = [
+        server.OdometerReading(vehicle_id="v1", timestamp="2025-03-01T08:00:00+00:00", km=1000),
+        server.OdometerReading(vehicle_id="ghost", timestamp="2025-03-01T08:00:00+00:00", km=50),
+        server.OdometerReading(vehicle_id="v1", timestamp="not a date", km=5),
+    ]
+    assert asyncio.run(server.ingest_odometer(readings, user=USER)) == {"received": 3, "accepted": 1}
+    assert asyncio.run(db.odometer_readings.distinct("vehicle_id")) == ["v1"]
+    assert server.maintenance_dirty == {"v1"}
+    assert asyncio.run(db.vehicles.find_one({"id": "v1"}))['current_km'] == 1000
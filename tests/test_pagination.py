@@ -0,0 +1,26 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_cursor_round_trip():
+    cursor = server.encode_cursor("2025-03-01", "e|1")
+    with pytest.raises(HTTPException):
+        server.decode_cursor(cursor, parts=2)
+    cursor = server.encode_cursor("2025-03-01", "e1")
+    assert server.decode_cursor(cursor, parts=2) == ["2025-03-01", "e1"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "%%%",
+    "ğ",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    base64.urlsafe_b64encode(b"2025-03-01").decode(),
+])
+def test_malformed_cursors_are_rejected_with_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        server.decode_cursor(cursor, parts=2)
+    assert error.value.status_code == 400
@@ -0,0 +1,42 @@
+import asyncio
+
+import server
+
+
+def test_store_keeps_only_the_newest_reading():
+    store = server.VehiclePositionStore(cell_deg=0.01)
+    assert store.update("v1", 39.92, 32.85, 100.0, 1000)
+    assert not store.update("v1", 39.00, 32.00, 90.0, 900)
+    assert store.update("v1", 39.93, 32.86, 110.0, None)
+    [position] = store.get(["v1", "unknown"])
+    assert (position['latitude'], position['longitude'], position['km']) == (39.93, 32.86, 1000)
+
+
+def test_box_and_radius_queries_follow_cell_moves():
+    store = server.VehiclePositionStore(cell_deg=0.01)
+    for i in range(100):
+        store.update(f"v{i}", 39.90 + i * 0.001, 32.85, 1.0, None)
+    store.update("v0", 40.50, 33.50, 2.0, None)
+    inside = {row['vehicle_id'] for row in store.within_box(39.90, 32.80, 39.91, 32.90)}
+    assert inside == {f"v{i}" for i in range(1, 11)}
+    nearby = store.within_radius(40.50, 33.50, radius_km=1)
+    assert [row['vehicle_id'] for row in nearby] == ["v0"]
+    assert nearby[0]['distance_km'] == 0
+
+
+def test_ingest_orders_by_instant_and_ignores_unknown_vehicles(db, monkeypatch):
+    monkeypatch.setattr(server, 'position_store', server.VehiclePositionStore(cell_deg=0.01))
+    asyncio.run(db.vehicles.insert_one({"id": "v1", "current_km": 0}))
+    readings = [
+        # 10:30 local (+03:00) is 07:30 UTC, earlier than the 08:00 UTC reading despite sorting later as text
+        server.PositionReading(vehicle_id="v1", latitude=39.93, longitude=32.85, timestamp="2025-03-01T08:00:00+00:00"),
+        server.PositionReading(vehicle_id="v1", latitude=39.92, longitude=32.85, timestamp="2025-03-01T10:30:00+03:00"),
+        server.PositionReading(vehicle_id="ghost", latitude=39.92, longitude=32.85, timestamp="2025-03-01T08:00:00+00:00"),
+    ]
+    result = asyncio.run(server.ingest_positions(readings, user={"id": "u1"}))
+    assert result == {"received": 3, "accepted": 2, "persisted": 2}
+    [position] = server.position_store.get(["v1"])
+    assert position['latitude'] == 39.93
+    assert position['timestamp'] == "2025-03-01T08:00:00+00:00"
+    assert server.position_store.persisted_at["v1"] == server.to_epoch("2025-03-01T08:00:00+00:00", 0)
+    assert "ghost" not in server.position_store.slots
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+STATIONS = [
+    {"id": "s1", "latitude": 39.92, "longitude": 32.85},
+    {"id": "s2", "latitude": 39.95, "longitude": 32.90},
+]
+
+
+def driver(driver_id, station_id, certified=None):
+    return {"id": driver_id, "station_id": station_id, "certified_vehicle_types": certified}
+
+
+def vehicle(vehicle_id, station_id, vehicle_type="ladder", assigned=None):
+    return {"id": vehicle_id, "station_id": station_id, "vehicle_type": vehicle_type, "assigned_driver_id": assigned}
+
+
+def matches(drivers, vehicles, stations=STATIONS, cross=False):
+    pairs, free_drivers, free_vehicles = server.solve_roster(drivers, vehicles, stations, cross)
+    return {drivers[r]['id']: vehicles[c]['id'] for r, c, _ in pairs}, free_drivers, free_vehicles
+
+
+def test_certifications_and_stations_limit_the_matching():
+    drivers = [driver("d1", "s1", ["tanker"]), driver("d2", "s1"), driver("d3", "s2", ["ladder"])]
+    vehicles = [vehicle("v1", "s1"), vehicle("v2", "s1", "tanker"), vehicle("v3", "s2", "tanker")]
+    pairs, free_drivers, free_vehicles = matches(drivers, vehicles)
+    assert pairs == {"d1": "v2", "d2": "v1"}
+    assert free_drivers == ["d3"] and free_vehicles == ["v3"]
+
+
+def test_current_driver_is_kept_when_costs_tie():
+    drivers = [driver("d1", "s1"), driver("d2", "s1")]
+    vehicles = [vehicle("v1", "s1", assigned="d2"), vehicle("v2", "s1", assigned="d1")]
+    assert matches(drivers, vehicles)[0] == {"d1": "v2", "d2": "v1"}
+
+
+def test_cross_station_prefers_the_nearest_station_including_zero_coordinates():
+    stations = [{"id": "s0", "latitude": 0.0, "longitude": 0.0},
+                {"id": "near", "latitude": 0.01, "longitude": 0.0},
+                {"id": "far", "latitude": 1.0, "longitude": 1.0}]
+    drivers = [driver("d1", "s0")]
+    vehicles = [vehicle("v-far", "far"), vehicle("v-near", "near")]
+    pairs, _, _ = server.solve_roster(drivers, vehicles, stations, True)
+    assert vehicles[pairs[0][1]]['id'] == "v-near"
+    assert pairs[0][2] < server.ROSTER_BASE_COST + server.ROSTER_CROSS_STATION_COST + 5
+
+
+def test_registration_cannot_set_certifications():
+    assert "certified_vehicle_types" not in server.UserCreate.model_fields
+
+
+def proposed_roster():
+    return server.Roster(
+        created_by="m1", start_date="2025-03-01T08:00:00+00:00", end_date="2025-03-01T20:00:00+00:00",
+        mission_type="Vardiya",
+        entries=[server.RosterEntry(driver_id="d1", driver_name="Ali", vehicle_id="v1", plate="06 ABC 1",
+                                    vehicle_type="ladder", station_id="s1", cost=1.0)],
+    ).model_dump(mode="json")
+
+
+def test_concurrent_applies_write_the_roster_once(db):
+    roster = proposed_roster()
+
+    async def apply_twice():
+        await db.assignment_locks.create_index("key", unique=True)
+        await db.rosters.insert_one(roster)
+        return await asyncio.gather(
+            server.apply_roster(roster['id'], user=MANAGER),
+            server.apply_roster(roster['id'], user=MANAGER),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(apply_twice())
+    assert sum(isinstance(r, HTTPException) for r in results) == 1
+    assert asyncio.run(db.assignments.count_documents({})) == 1
+    assert asyncio.run(db.notifications.count_documents({})) == 1
+    assert asyncio.run(db.rosters.find_one({"id": roster['id']}))['status'] == "applied"
+
+
+def test_proposal_skips_drivers_and_vehicles_already_assigned(db):
+    asyncio.run(db.stations.insert_one({"id": "s1", "latitude": 39.92, "longitude": 32.85}))
+    asyncio.run(db.users.insert_many([
+        {"id": "d1", "name": "Ali", "role": "driver", "station_id": "s1"},
+        {"id": "d2", "name": "Veli", "role": "driver", "station_id": "s1"},
+    ]))
+    asyncio.run(db.vehicles.insert_many([
+        {"id": "v1", "plate": "06 A 1", "vehicle_type": "ladder", "station_id": "s1", "status": "active"},
+        {"id": "v2", "plate": "06 A 2", "vehicle_type": "ladder", "station_id": "s1", "status": "active"},
+    ]))
+    busy = {"id": "a1", "vehicle_id": "v1", "driver_id": "d1", "start_date": "2025-03-01T00:00:00+00:00", "end_date": None}
+    asyncio.run(db.assignments.insert_one({**busy, **server.assignment_bounds(busy)}))
+    request = server.RosterRequest(start_date="2025-03-02T08:00:00+00:00", end_date="2025-03-02T20:00:00+00:00")
+    roster = asyncio.run(server.propose_roster(request, user=MANAGER))
+    assert [(e.driver_id, e.vehicle_id) for e in roster.entries] == [("d2", "v2")]
+
+
+def test_failed_apply_returns_the_roster_to_proposed(db, monkeypatch):
+    roster = proposed_roster()
+    asyncio.run(db.rosters.insert_one(dict(roster)))
+
+    async def failing_write(roster, assignments):
+        raise server.OperationFailure("write failed")
+
+    monkeypatch.setattr(server, 'write_roster_assignments', failing_write)
+    with pytest.raises(server.OperationFailure):
+        asyncio.run(server.apply_roster(roster['id'], user=MANAGER))
+    assert asyncio.run(db.rosters.find_one({"id": roster['id']}))['status'] == "proposed"
+
+
+def test_roster_left_applying_by_a_dead_worker_can_be_applied_after_the_lease(db):
+    roster = proposed_roster()
+    started = datetime.now(timezone.utc)
+    asyncio.run(db.rosters.insert_one({**roster, "status": "applying", "applying_at": started}))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.apply_roster(roster['id'], user=MANAGER))
+    assert error.value.status_code == 409
+
+    stale = started - timedelta(seconds=server.ROSTER_APPLY_LEASE_SECONDS + 1)
+    asyncio.run(db.rosters.update_one({"id": roster['id']}, {"$set": {"applying_at": stale}}))
+    assert asyncio.run(server.apply_roster(roster['id'], user=MANAGER))['status'] == "applied"
+    assert asyncio.run(db.assignments.count_documents({})) == 1
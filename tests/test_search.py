@@ -0,0 +1,70 @@
+import asyncio
+
+import server
+
+DRIVER = {"id": "d1", "role": "driver", "name": "Sürücü", "station_id": "s1"}
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def test_trie_search_orders_by_length_then_key_and_prunes_on_remove():
+    trie = server.PrefixTrie()
+    for key, item_id in (("06abc", "a"), ("06abd", "b"), ("06x", "c"), ("34abc", "d")):
+        trie.add(key, item_id)
+    assert trie.search("06", 10) == ["c", "a", "b"]
+    assert trie.search("06", 2) == ["c", "a"]
+    assert trie.search("06", 10, accept=lambda item_id: item_id != "a") == ["c", "b"]
+    trie.remove("06x", "c")
+    assert "x" not in trie.children["0"].children["6"].children
+    assert trie.search("99", 10) == []
+
+
+def test_autocomplete_ranks_exact_matches_first_and_follows_relabels():
+    index = server.AutocompleteIndex()
+    index.load([("v1", "06 ABC 12"), ("v2", "06 ABC 1"), ("v3", "34 ŞİŞ 5")])
+    assert [m['id'] for m in index.search("06abc1", 10)] == ["v2", "v1"]
+    assert index.search("34 sis", 10) == [{"id": "v3", "label": "34 ŞİŞ 5"}]
+    index.upsert("v2", "35 ABC 1")
+    assert [m['id'] for m in index.search("06", 10)] == ["v1"]
+    index.remove("v1")
+    assert index.search("06", 10) == []
+
+
+def test_autocomplete_limits_results_to_a_scope():
+    index = server.AutocompleteIndex()
+    index.load([("v1", "06 ABC 1", "s1"), ("v2", "06 ABC 2", "s2"), ("v3", "06 ABC 3", "s1")])
+    assert [m['id'] for m in index.search("06", 10, "s1")] == ["v1", "v3"]
+    assert [m['id'] for m in index.search("06", 1, "s2")] == ["v2"]
+    index.upsert("v2", "06 ABC 2", "s1")
+    assert len(index.search("06", 10, "s1")) == 3
+
+
+def test_drivers_only_find_their_own_stations_vehicles(db, monkeypatch):
+    vehicles = [
+        {"id": "v1", "plate": "06 ABC 1", "station_id": "s1"},
+        {"id": "v2", "plate": "06 ABC 2", "station_id": "s2"},
+    ]
+    asyncio.run(db.vehicles.insert_many([dict(v) for v in vehicles]))
+    index = server.AutocompleteIndex()
+    index.load([(v['id'], v['plate'], v['station_id']) for v in vehicles])
+    monkeypatch.setattr(server, 'plate_autocomplete', index)
+
+    found = asyncio.run(server.search(q="06 ABC", types="vehicles", page=1, limit=20, user=DRIVER))
+    assert [v['id'] for v in found['results']['vehicles']['items']] == ["v1"]
+    found = asyncio.run(server.search(q="06 ABC", types="vehicles", page=1, limit=20, user=MANAGER))
+    assert len(found['results']['vehicles']['items']) == 2
+    assert [m['id'] for m in asyncio.run(server.autocomplete(q="06", field="plate", limit=10, user=DRIVER))] == ["v1"]
+
+
+def test_search_pages_walk_every_match_once(db, monkeypatch):
+    plates = ["06 A 1", "06 A 10", "06 A 11", "06 B 1", "06 B 2"]
+    vehicles = [{"id": f"v{i}", "plate": plate, "station_id": "s1"} for i, plate in enumerate(plates)]
+    asyncio.run(db.vehicles.insert_many([dict(v) for v in vehicles]))
+    index = server.AutocompleteIndex()
+    index.load([(v['id'], v['plate'], v['station_id']) for v in vehicles])
+    monkeypatch.setattr(server, 'plate_autocomplete', index)
+
+    seen = []
+    for page in range(1, 5):
+        found = asyncio.run(server.search(q="06", types="vehicles", page=page, limit=2, user=MANAGER))
+        seen.extend(v['plate'] for v in found['results']['vehicles']['items'])
+    assert seen == ["06 A 1", "06 B 1", "06 B 2", "06 A 10", "06 A 11"]
@@ -0,0 +1,67 @@
+import asyncio
+import math
+from datetime import datetime, timezone
+
+import server
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+END = datetime(2025, 3, 2, tzinfo=timezone.utc)
+MANAGER = {"id": "m1", "role": "manager", "name": "Yönetici"}
+
+
+def at(hour):
+    return START.timestamp() + hour * 3600
+
+
+def stamp(hour):
+    return datetime.fromtimestamp(at(hour), timezone.utc).isoformat()
+
+
+def test_overlapping_and_touching_intervals_are_merged():
+    intervals = [("v1", at(2), at(4), "a"), ("v1", at(1), at(3), "b"), ("v1", at(4), at(5), "c"), ("v1", at(8), at(9), "d")]
+    timeline = server.compute_timelines({"v1": {"id": "v1"}}, intervals, START, END)["v1"]
+    assert [(b['start'], b['end'], b['reasons']) for b in timeline['busy']] == [
+        (stamp(1), stamp(5), ["b", "a", "c"]), (stamp(8), stamp(9), ["d"])
+    ]
+    assert timeline['free'] == [
+        {"start": stamp(0), "end": stamp(1)}, {"start": stamp(5), "end": stamp(8)}, {"start": stamp(9), "end": stamp(24)}
+    ]
+    assert timeline['busy_hours'] == 5
+
+
+def test_intervals_are_clipped_to_the_window_and_may_be_open_ended():
+    intervals = [("v1", at(-5), at(2), "before"), ("v2", at(20), math.inf, "open"), ("v3", at(30), at(40), "after"),
+                 ("ghost", at(1), at(2), "unknown")]
+    entities = {v: {"id": v} for v in ("v1", "v2", "v3")}
+    timelines = server.compute_timelines(entities, intervals, START, END)
+    assert timelines["v1"]['busy'][0]['start'] == stamp(0) and timelines["v1"]['busy_hours'] == 2
+    assert timelines["v2"]['busy'][0]['end'] == stamp(24) and timelines["v2"]['free'] == [{"start": stamp(0), "end": stamp(20)}]
+    assert timelines["v3"]['busy'] == [] and timelines["v3"]['free'] == [{"start": stamp(0), "end": stamp(24)}]
+    assert "ghost" not in timelines
+
+
+def test_availability_combines_assignments_and_unresolved_faults(db):
+    asyncio.run(db.vehicles.insert_many([
+        {"id": "v1", "plate": "06 A 1", "vehicle_type": "ladder", "station_id": "s1"},
+        {"id": "v2", "plate": "06 A 2", "vehicle_type": "ladder", "station_id": "s1"},
+    ]))
+    asyncio.run(db.users.insert_one({"id": "d1", "name": "Ali", "role": "driver", "station_id": "s1"}))
+    assignments = [
+        {"id": "a1", "vehicle_id": "v1", "driver_id": "d1", "mission_type": "Nöbet",
+         "start_date": "2025-03-01T08:00:00+00:00", "end_date": "2025-03-01T16:00:00+00:00"},
+        {"id": "a2", "vehicle_id": "v1", "driver_id": "d1", "mission_type": "Nöbet",
+         "start_date": "2025-02-01T00:00:00+00:00", "end_date": "2025-02-02T00:00:00+00:00"},
+    ]
+    asyncio.run(db.assignments.insert_many([{**a, **server.assignment_bounds(a)} for a in assignments]))
+    asyncio.run(db.faults.insert_many([
+        {"id": "f1", "vehicle_id": "v2", "status": "pending", "created_at": "2025-03-01T20:00:00+00:00"},
+        {"id": "f2", "vehicle_id": "v2", "status": "resolved", "created_at": "2025-02-01T00:00:00+00:00",
+         "resolved_at": "2025-03-01T02:00:00+00:00"},
+    ]))
+    result = asyncio.run(server.get_availability(
+        start_date=START.isoformat(), end_date=END.isoformat(), station_id="s1", user=MANAGER
+    ))
+    vehicles = {v['id']: v for v in result['vehicles']}
+    assert [(b['start'], b['end']) for b in vehicles['v1']['busy']] == [(stamp(8), stamp(16))]
+    assert [(b['start'], b['end']) for b in vehicles['v2']['busy']] == [(stamp(0), stamp(2)), (stamp(20), stamp(24))]
+    assert result['drivers'][0]['busy_hours'] == 8
@@ -0,0 +1,50 @@
+import io
+
+import gridfs
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+import server
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-5", (95, 99)),
+    ("bytes=95-500", (95, 99)),
+    (None, None),
+    ("bytes=0-1,4-5", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert server.parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=9-3"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as error:
+        server.parse_range(header, 100)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": "bytes */100"}
+
+
+def test_thumbnail_reads_the_stored_file(monkeypatch):
+    original = io.BytesIO()
+    Image.new("RGB", (1200, 800), (200, 10, 10)).save(original, "PNG")
+    opened = []
+
+    class Bucket:
+        def __init__(self, database, bucket_name):
+            assert bucket_name == "uploads"
+
+        def open_download_stream(self, file_id):
+            opened.append(file_id)
+            return io.BytesIO(original.getvalue())
+
+    monkeypatch.setattr(gridfs, 'GridFSBucket', Bucket)
+    monkeypatch.setattr(server, 'thumbnail_client', {server.os.environ['DB_NAME']: None})
+    thumbnail = server.build_thumbnail("file-1", 320)
+    assert opened == ["file-1"]
+    assert Image.open(io.BytesIO(thumbnail)).size == (320, 213)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import server
+
+STATIONS = {"s1": "s1"}
+
+
+@pytest.fixture
+def import_db(db, monkeypatch):
+    monkeypatch.setattr(server, 'station_index', server.StationIndex())
+    monkeypatch.setattr(server, 'plate_autocomplete', server.AutocompleteIndex())
+    return db
+
+
+def import_rows(*rows):
+    errors = []
+    result = asyncio.run(server.import_vehicle_chunk(list(enumerate(rows, start=2)), STATIONS, set(), errors))
+    return result, errors
+
+
+def test_existing_plates_accept_partial_rows(import_db):
+    asyncio.run(import_db.vehicles.insert_one({
+        "id": "v1", "plate": "06 ABC 01", "brand": "Ford", "model": "Cargo", "year": 2015,
+        "vehicle_type": "ladder", "station_id": "s1", "status": "active", "current_km": 1000,
+    }))
+    result, errors = import_rows({"plate": "06 abc  01", "current_km": 2500}, {"plate": "34 XYZ 99", "current_km": 10})
+    assert result == {"inserted": 0, "updated": 1}
+    assert len(errors) == 1 and errors[0]['row'] == 3
+    vehicle = asyncio.run(import_db.vehicles.find_one({"id": "v1"}))
+    assert vehicle['current_km'] == 2500 and vehicle['brand'] == "Ford"
+
+
+def test_new_plates_are_inserted_normalized(import_db):
+    row = {"plate": "35 def 7", "brand": "Iveco", "model": "Eurocargo", "year": 2020,
+           "vehicle_type": "tanker", "station": "s1"}
+    result, errors = import_rows(row)
+    assert result == {"inserted": 1, "updated": 0} and not errors
+    assert asyncio.run(import_db.vehicles.find_one({"plate": "35 DEF 7"}))['station_id'] == "s1"
+
+
+def test_plate_migration_normalizes_stored_plates(import_db):
+    asyncio.run(import_db.vehicles.insert_many([
+        {"id": "v1", "plate": " 06 abc  01"}, {"id": "v2", "plate": "34 XYZ 99"}, {"id": "v3", "plate": None},
+    ]))
+    assert asyncio.run(server.migrate_vehicle_plates()) == 1
+    plates = {v['id']: v['plate'] for v in asyncio.run(import_db.vehicles.find().to_list(None))}
+    assert plates == {"v1": "06 ABC 01", "v2": "34 XYZ 99", "v3": None}
@@ -0,0 +1,34 @@
+import asyncio
+
+import server
+
+
+def test_migration_skips_malformed_embedded_records(db):
+    asyncio.run(db.vehicles.insert_one({
+        "id": "v1",
+        "equipment": [{"name": "Hortum", "serial_number": "H-1"}],
+        "accident_records": [
+            {"date": "2025-03-01", "location": "Ulus", "driver_id": "d1", "description": "Sürtme"},
+            {"date": "2025-03-02"},
+        ],
+    }))
+    assert asyncio.run(server.migrate_embedded_vehicle_arrays()) == 1
+
+    vehicle = asyncio.run(db.vehicles.find_one({"id": "v1"}))
+    assert "equipment" not in vehicle
+    assert len(vehicle['accident_records']) == 2
+    assert asyncio.run(db.vehicle_equipment.count_documents({"vehicle_id": "v1"})) == 1
+    assert asyncio.run(db.accident_records.count_documents({"vehicle_id": "v1"})) == 1
+
+    # A rerun upserts the same ids instead of duplicating the valid record
+    asyncio.run(server.migrate_embedded_vehicle_arrays())
+    assert asyncio.run(db.accident_records.count_documents({"vehicle_id": "v1"})) == 1
+
+
+def test_deleting_a_vehicle_removes_its_records(db):
+    asyncio.run(db.vehicles.insert_one({"id": "v1", "plate": "06 ABC 1", "status": "active"}))
+    asyncio.run(db.vehicle_equipment.insert_one({"id": "e1", "vehicle_id": "v1"}))
+    asyncio.run(db.accident_records.insert_one({"id": "a1", "vehicle_id": "v1"}))
+    asyncio.run(server.delete_vehicle("v1", user={"id": "m1", "role": "manager"}))
+    assert asyncio.run(db.vehicle_equipment.count_documents({})) == 0
+    assert asyncio.run(db.accident_records.count_documents({})) == 0